@@ -0,0 +1,56 @@
+"""
+===============================================================================
+Script: compression_benchmark.py
+Description:
+    Measures the compression ratio and the cost per measurement of the
+    deadband and swinging door filters on a day of 1 s samples of slowly
+    changing sensors (co2 in ppm as integers, humidity in % with noise),
+    with a 5 minute heartbeat.
+
+Usage:
+    $ python benchmarks/compression_benchmark.py
+
+Author: [Martin P]
+===============================================================================
+"""
+
+import math
+import random
+import time
+
+from iot_collector_service.measurement_batch import MeasurementBatch
+from iot_collector_service.measurement_compression import MeasurementCompressor
+
+SAMPLES = 86400
+MAX_INTERVAL = 300.0
+SERIES = {
+    # name: (measurement type id, deviation, signal)
+    "co2": (1, 10.0, lambda t: round(800 + 300 * math.sin(t / 7200) + random.gauss(0, 3))),
+    "humidity": (2, 0.5, lambda t: 45 + 10 * math.sin(t / 43200) + random.gauss(0, 0.1)),
+}
+
+
+def build_batch(measurement_type_id, signal):
+    batch = MeasurementBatch()
+    for t in range(SAMPLES):
+        batch.append(1, 1, measurement_type_id, signal(t), float(t), float(t))
+    return batch
+
+
+def run():
+    print(f"{'series':<10}{'compression':<15}{'stored':>8}{'ratio':>10}{'us/value':>10}")
+    for name, (measurement_type_id, deviation, signal) in SERIES.items():
+        batch = build_batch(measurement_type_id, signal)
+        for compression in ("deadband", "swinging_door"):
+            compressor = MeasurementCompressor([{"topic_id": 1, "measurement_type_id": measurement_type_id,
+                                                 "compression": compression, "deviation": deviation,
+                                                 "max_interval": MAX_INTERVAL}])
+            start = time.perf_counter()
+            stored = compressor.compress(batch)
+            duration = time.perf_counter() - start
+            print(f"{name:<10}{compression:<15}{len(stored):>8}{compressor.compression_ratio:>9.1f}:1"
+                  f"{duration / SAMPLES * 1e6:>10.2f}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,148 @@
+"""
+===============================================================================
+Script: fan_in_benchmark.py
+Description:
+    Measures the latency from a message arriving at one busy collector to the
+    message being picked up by the collection loop, while all other
+    collectors are idle. Compares the previous round-robin polling of each
+    collector queue (`get(timeout=0.1)` per collector) with the shared ingest
+    queue used by `DataCollectorService`.
+
+    In the shared mode every collector is a running `MqttDataCollector`
+    thread of a `DataCollectorService`, fed by an in-process client in
+    place of a broker connection. Latency is measured end to end, from the
+    message entering the client queue of the busy collector to
+    `DataCollectorService.get_data` returning it, so the idle collector
+    threads compete with it as they do in the service.
+
+Usage:
+    $ python benchmarks/fan_in_benchmark.py
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from queue import Queue, Empty
+from threading import Thread, Event
+import statistics
+import time
+
+from iot_collector_service.data_collector import MqttDataCollector
+from iot_collector_service.data_collector_service import DataCollectorService
+from iot_collector_service.collector_configuration import CollectorConfiguration
+
+COLLECTOR_COUNTS = [1, 100, 1000]
+POLL_TIMEOUT = 0.1
+ROUND_ROBIN_BUDGET = 30.0  # Seconds spent measuring round-robin polling per collector count
+
+
+def round_robin_consumer(queues, latencies, samples, stop_event):
+    while not stop_event.is_set():
+        for q in queues:
+            try:
+                sent = q.get(timeout=POLL_TIMEOUT)
+                latencies.append(time.perf_counter() - sent)
+                if len(latencies) >= samples:
+                    stop_event.set()
+                    return
+            except Empty:
+                pass
+
+
+class QueueClient:
+    """
+    In-process stand-in for the MQTT client of a collector: messages are put into its data queue directly.
+    """
+
+    def __init__(self):
+        self.data_queue = Queue(maxsize=10)
+
+    def mqtt_client_connect(self, usr, password, broker, port):
+        return 1
+
+    def mqtt_client_start(self):
+        pass
+
+    def mqtt_client_disconnect(self):
+        pass
+
+    def mqtt_client_subscribe(self, topic):
+        pass
+
+    def mqtt_client_unsubscribe(self, topic):
+        pass
+
+    def mqtt_get_data(self, timeout=None):
+        return self.data_queue.get(timeout=timeout)
+
+    def mqtt_publish_data(self, topic, data):
+        return True
+
+
+def start_collector_service(collector_count):
+    service = DataCollectorService()
+    for collector_id in range(collector_count):
+        collector = MqttDataCollector(QueueClient())
+        collector.set_configuration(CollectorConfiguration(collector_id, "", "", "localhost", 1883),
+                                    [{"topic": f"sensor/{collector_id}", "device_id": collector_id}], [])
+        service.add_collector(collector)
+    service.start_collection()
+    return service
+
+
+def shared_queue_consumer(service, latencies, samples, stop_event):
+    while not stop_event.is_set():
+        for packet in service.get_data(timeout=POLL_TIMEOUT):
+            latencies.append(time.perf_counter() - packet["data"])
+            if len(latencies) >= samples:
+                stop_event.set()
+
+
+def measure(consumer, consumer_args, busy_queue, samples, budget, topic=None):
+    latencies = []
+    stop_event = Event()
+    thread = Thread(target=consumer, args=consumer_args + (latencies, samples, stop_event))
+    thread.start()
+
+    start = time.monotonic()
+    while not stop_event.is_set() and time.monotonic() - start < budget:
+        sent = time.perf_counter()
+        busy_queue.put(sent if topic is None else {"topic": topic, "data": sent})
+        # Wait until the message is consumed before sending the next one
+        while not busy_queue.empty() and not stop_event.is_set() and time.monotonic() - start < budget:
+            time.sleep(0.001)
+        time.sleep(0.01)
+
+    stop_event.set()
+    thread.join()
+    return latencies
+
+
+def report(name, collector_count, latencies):
+    if not latencies:
+        print(f"{name:>12} | {collector_count:>10} | {'no message picked up within budget':>40}")
+        return
+    print(f"{name:>12} | {collector_count:>10} | {statistics.mean(latencies) * 1000:>12.2f} ms"
+          f" | {max(latencies) * 1000:>12.2f} ms | {len(latencies):>6}")
+
+
+def run():
+    print(f"{'mode':>12} | {'collectors':>10} | {'mean':>15} | {'max':>15} | {'msgs':>6}")
+    for collector_count in COLLECTOR_COUNTS:
+        # Previous implementation: one queue per collector, polled in turn
+        queues = [Queue(maxsize=10) for _ in range(collector_count)]
+        busy_queue = queues[collector_count // 2]
+        latencies = measure(round_robin_consumer, (queues,), busy_queue, 5, ROUND_ROBIN_BUDGET)
+        report("round-robin", collector_count, latencies)
+
+        # Shared ingest queue: every collector thread delivers to the queue of the collector service
+        service = start_collector_service(collector_count)
+        busy_collector = service.collectors_list[collector_count // 2]
+        latencies = measure(shared_queue_consumer, (service,), busy_collector.client.data_queue, 200,
+                            ROUND_ROBIN_BUDGET, topic=busy_collector.device_configuration[0]["topic"])
+        service.stop_collection()
+        report("shared", collector_count, latencies)
+
+
+if __name__ == '__main__':
+    run()
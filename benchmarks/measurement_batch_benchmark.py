@@ -0,0 +1,119 @@
+"""
+===============================================================================
+Script: measurement_batch_benchmark.py
+Description:
+    Measures the cost of converting packets into measurements, buffering
+    them in the writer and building the rows of the SQL batch: the previous
+    path (one dict per measurement, collected in lists) against the
+    column-wise `MeasurementBatch` filled by the ingest pipeline.
+
+    For each path it reports:
+    - time per packet,
+    - the number of garbage collections triggered under sustained load,
+    - memory held per buffered measurement (e.g. while the database is
+      behind and measurements wait for the writer).
+
+Usage:
+    $ python benchmarks/measurement_batch_benchmark.py
+
+Author: [Martin P]
+===============================================================================
+"""
+
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from iot_collector_service.ingest_pipeline import IngestPipeline
+from iot_collector_service.measurement_batch import MeasurementBatch
+from iot_collector_service.topic_router import TopicRouter
+
+PACKETS = 200000
+DRAIN_SIZE = 100  # Packets drained from the ingest queue at once
+FLUSH_SIZE = 500  # Measurements per SQL batch
+BACKLOG_PACKETS = 50000
+TOPICS = [{"topic": f"device/{i}/measurements", "topic_id": i, "device_id": i, "topic_type": 1} for i in range(100)]
+
+
+def build_packets(count):
+    # Same shape as SimDevice measurements in sim_configuration/sim_device_measurements.csv
+    packets = []
+    for i in range(count):
+        data = {"co2": random.randint(0, 3000),
+                "test measurement": random.uniform(0, 100),
+                "humidity": random.uniform(0, 80),
+                "timestamp": time.time()}
+        packets.append({"topic": f"device/{i % len(TOPICS)}/measurements", "data": json.dumps(data).encode()})
+    return packets
+
+
+def dict_path(pipeline, packets, keep):
+    # Previous implementation: one dict per measurement, buffered in a list, float conversion in the SQL service
+    buffered = []
+    for start in range(0, len(packets), DRAIN_SIZE):
+        for packet in packets[start:start + DRAIN_SIZE]:
+            route = pipeline.topic_router.get_route(packet["topic"])
+            data = pipeline.codec_registry.get_codec(packet["topic"]).decode(packet["data"])
+            received = time.time()
+            for m in data:
+                if m != "timestamp":
+                    buffered.append({"device_id": route.device_id,
+                                     "topic_id": route.topic_id,
+                                     "measurement_type_id": m,
+                                     "value": data[m],
+                                     "received": received})
+        if not keep and len(buffered) >= FLUSH_SIZE:
+            [(m["topic_id"], m["measurement_type_id"], float(m["value"])) for m in buffered]
+            buffered = []
+    return buffered
+
+
+def batch_path(pipeline, packets, keep):
+    buffered = MeasurementBatch()
+    for start in range(0, len(packets), DRAIN_SIZE):
+        batch = MeasurementBatch()
+        for packet in packets[start:start + DRAIN_SIZE]:
+            pipeline.process_packet(packet, batch)
+        buffered.extend(batch)
+        if not keep and len(buffered) >= FLUSH_SIZE:
+            list(buffered.rows("topic_id", "measurement_type_id", "value"))
+            buffered = MeasurementBatch()
+    return buffered
+
+
+def measure(name, fun, pipeline, packets, backlog):
+    collections = [0]
+
+    def count_collections(phase, info):
+        if phase == "start":
+            collections[0] += 1
+
+    gc.collect()
+    gc.callbacks.append(count_collections)
+    start = time.perf_counter()
+    fun(pipeline, packets, False)
+    duration = time.perf_counter() - start
+    gc.callbacks.remove(count_collections)
+
+    gc.collect()
+    tracemalloc.start()
+    buffered = fun(pipeline, backlog, True)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:>18} | {duration / len(packets) * 1e6:>8.2f} us/packet | {collections[0]:>6} collections | "
+          f"{held / len(buffered):>6.1f} B/buffered measurement")
+
+
+def run():
+    pipeline = IngestPipeline(TopicRouter(TOPICS))
+    packets = build_packets(PACKETS)
+    backlog = build_packets(BACKLOG_PACKETS)
+    measure("dict per value", dict_path, pipeline, packets, backlog)
+    measure("MeasurementBatch", batch_path, pipeline, packets, backlog)
+
+
+if __name__ == '__main__':
+    run()
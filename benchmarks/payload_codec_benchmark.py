@@ -0,0 +1,59 @@
+"""
+===============================================================================
+Script: payload_codec_benchmark.py
+Description:
+    Compares payload size and decode cost of the supported payload formats
+    for measurements like the ones published by `SimDevice`. Formats whose
+    optional package (msgpack, cbor2) is not installed are skipped.
+
+Usage:
+    $ python benchmarks/payload_codec_benchmark.py
+
+Author: [Martin P]
+===============================================================================
+"""
+
+import random
+import time
+
+from iot_collector_service.payload_codecs import create_codec
+
+MESSAGES = 100000
+
+# Same measurements as test_dev_1 in sim_configuration/sim_device_measurements.csv, plus a timestamp
+FORMATS = [("json", ""),
+           ("msgpack", ""),
+           ("cbor", ""),
+           ("struct", "<co2:H,test measurement:f,timestamp:d")]
+
+
+def build_data(count):
+    return [{"co2": random.randint(0, 3000),
+             "test measurement": random.uniform(0, 100),
+             "timestamp": time.time()} for _ in range(count)]
+
+
+def run():
+    data = build_data(MESSAGES)
+    print(f"{'format':>8} | {'bytes/msg':>9} | {'decode us/msg':>13}")
+    for payload_format, payload_layout in FORMATS:
+        try:
+            codec = create_codec(payload_format, payload_layout)
+        except ImportError as error:
+            print(f"{payload_format:>8} | skipped: {error}")
+            continue
+
+        payloads = [codec.encode(d) for d in data]
+        size = sum(len(p) for p in payloads) / MESSAGES
+
+        decode = codec.decode
+        start = time.perf_counter()
+        for payload in payloads:
+            decode(payload)
+        per_message = (time.perf_counter() - start) / MESSAGES
+
+        print(f"{payload_format:>8} | {size:>9.1f} | {per_message * 1e6:>13.2f}")
+
+
+if __name__ == '__main__':
+    run()
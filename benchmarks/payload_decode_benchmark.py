@@ -0,0 +1,70 @@
+"""
+===============================================================================
+Script: payload_decode_benchmark.py
+Description:
+    Measures the decode cost per message for payloads like the ones produced
+    by `SimDevice`: the previous path (payload decoded to str in the MQTT
+    callback, then `json.loads`) against bytes-native decoding with the
+    standard library and with orjson (when installed).
+
+Usage:
+    $ python benchmarks/payload_decode_benchmark.py
+
+Author: [Martin P]
+===============================================================================
+"""
+
+import json
+import random
+import time
+
+from iot_collector_service.payload_decoder import JsonPayloadDecoder, OrjsonPayloadDecoder, orjson
+
+MESSAGES = 200000
+
+
+def build_payloads(count):
+    # Same shape as SimDevice measurements in sim_configuration/sim_device_measurements.csv
+    payloads = []
+    for _ in range(count):
+        data = {"co2": random.randint(0, 3000),
+                "test measurement": random.uniform(0, 100),
+                "humidity": random.uniform(0, 80),
+                "timestamp": time.time()}
+        payloads.append(json.dumps(data).encode())
+    return payloads
+
+
+def str_path(payloads):
+    # Previous implementation: str in the MQTT callback, json.loads in the collection loop
+    for payload in payloads:
+        data = payload.decode()
+        json.loads(data)
+
+
+def decoder_path(decoder, payloads):
+    decode = decoder.decode
+    for payload in payloads:
+        decode(payload)
+
+
+def measure(name, fun, *args):
+    start = time.perf_counter()
+    fun(*args)
+    per_message = (time.perf_counter() - start) / MESSAGES
+    print(f"{name:>24} | {per_message * 1e6:>8.2f} us/msg | {1 / per_message:>10.0f} msg/s")
+
+
+def run():
+    payloads = build_payloads(MESSAGES)
+    print(f"payload example: {payloads[0]!r} ({len(payloads[0])} bytes)")
+    measure("str + json.loads", str_path, payloads)
+    measure("JsonPayloadDecoder", decoder_path, JsonPayloadDecoder(), payloads)
+    if orjson is not None:
+        measure("OrjsonPayloadDecoder", decoder_path, OrjsonPayloadDecoder(), payloads)
+    else:
+        print("orjson not installed, skipping")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,61 @@
+"""
+===============================================================================
+Script: rollup_benchmark.py
+Description:
+    Measures the cost per measurement of updating the window rollups and
+    the number of rollup rows a long range query reads instead of raw
+    measurements, for an hour of 1 s samples of 1000 series (100 topics
+    with 10 measurement types) handed over in batches of 500.
+
+Usage:
+    $ python benchmarks/rollup_benchmark.py
+
+Author: [Martin P]
+===============================================================================
+"""
+
+import random
+import time
+
+from iot_collector_service.measurement_batch import MeasurementBatch
+from iot_collector_service.measurement_rollup import MeasurementRollup
+
+SECONDS = 3600
+TOPICS = 100
+MEASUREMENT_TYPES = 10
+BATCH_SIZE = 500
+START = 1_699_999_200.0  # Aligned to the hour
+
+
+def build_batches():
+    batches = []
+    batch = MeasurementBatch()
+    for t in range(SECONDS):
+        for topic_id in range(TOPICS):
+            for measurement_type_id in range(MEASUREMENT_TYPES):
+                batch.append(1, topic_id, measurement_type_id, random.random(), START + t, START + t)
+                if len(batch) == BATCH_SIZE:
+                    batches.append(batch)
+                    batch = MeasurementBatch()
+    if len(batch):
+        batches.append(batch)
+    return batches
+
+
+def run():
+    batches = build_batches()
+    count = sum(len(batch) for batch in batches)
+    print(f"{'intervals':<12}{'us/value':>10}{'rollup rows':>14}{'raw rows':>12}")
+    for intervals in ((60,), (60, 3600)):
+        rollup = MeasurementRollup(sql_service=None, intervals=intervals)
+        start = time.perf_counter()
+        for batch in batches:
+            rollup.add(batch)
+        duration = time.perf_counter() - start
+        rows = rollup.close_windows(close_all=True)
+        print(f"{','.join(str(interval) for interval in intervals):<12}{duration / count * 1e6:>10.2f}"
+              f"{len(rows):>14}{count:>12}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,64 @@
+"""
+===============================================================================
+Script: sql_client_benchmark.py
+Description:
+    Measures the per-call overhead of `MySqlClient.execute_stored_procedure`
+    with a new cursor and a COMMIT on every call (previous implementation)
+    against statement reuse mode (reused cursors, no COMMIT on read-only
+    calls, tuple results on write paths).
+
+    Calls two cheap procedures of the service schema:
+    - read path:  GetServiceCommandVersion
+    - write path: ResetCmdFlagForDevice for a command id that does not exist
+
+    Needs a reachable MySQL server, configured in
+    ./configuration/sql_configuration.csv like the service itself.
+
+Usage:
+    $ python benchmarks/sql_client_benchmark.py
+
+Author: [Martin P]
+===============================================================================
+"""
+
+import statistics
+import time
+
+from iot_collector_service.sql_client import MySqlClient
+from iot_collector_service.sql_service import SQLService
+
+CALLS = 2000
+MISSING_COMMAND_ID = -1
+
+
+def measure(fun, calls):
+    durations = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fun()
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    return statistics.mean(durations), durations[int(len(durations) * 0.99)]
+
+
+def main():
+    print(f"{'mode':<18}{'path':<8}{'mean [us]':>12}{'p99 [us]':>12}")
+    for mode, statement_reuse in (("new cursor/commit", False), ("statement reuse", True)):
+        client = MySqlClient(statement_reuse=statement_reuse)
+        SQLService(sql_client=client).connect_service()
+        try:
+            paths = (
+                ("read", lambda: client.execute_stored_procedure("GetServiceCommandVersion", read_only=True)),
+                ("write", lambda: client.execute_stored_procedure("ResetCmdFlagForDevice", (MISSING_COMMAND_ID,),
+                                                                  dictionary=False)),
+            )
+            for path, fun in paths:
+                measure(fun, CALLS // 10)  # Warm up
+                mean, p99 = measure(fun, CALLS)
+                print(f"{mode:<18}{path:<8}{mean * 1e6:>12.1f}{p99 * 1e6:>12.1f}")
+        finally:
+            client.disconnect_sql()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+===============================================================================
+Script: topic_router_benchmark.py
+Description:
+    Compares the throughput of the per-message topic lookup used by the
+    measurement collection loop: a linear scan over the topic configuration
+    (previous implementation) against the hash-indexed `TopicRouter`.
+
+Usage:
+    $ python benchmarks/topic_router_benchmark.py
+
+Author: [Martin P]
+===============================================================================
+"""
+
+import random
+import time
+
+from iot_collector_service.topic_router import TopicRouter
+
+TOPIC_COUNTS = [10, 100, 1000, 10000]
+MESSAGES = 20000
+
+
+def build_topic_configuration(topic_count):
+    return [{"topic": f"site/room_{i}/device_{i}/data/measurements",
+             "topic_id": i,
+             "device_id": i // 4,
+             "topic_type": 1,
+             "iot_configuration": 1} for i in range(topic_count)]
+
+
+def linear_scan(topic_configuration, topics):
+    hits = 0
+    for topic in topics:
+        for i in topic_configuration:
+            if i["topic"] == topic:
+                if i["topic_type"] == 1:
+                    hits += 1
+    return hits
+
+
+def router_lookup(router, topics):
+    hits = 0
+    for topic in topics:
+        route = router.get_route(topic)
+        if route is not None and route.topic_type == 1:
+            hits += 1
+    return hits
+
+
+def run():
+    print(f"{'topics':>8} | {'scan msg/s':>14} | {'router msg/s':>14} | {'speedup':>8}")
+    for topic_count in TOPIC_COUNTS:
+        topic_configuration = build_topic_configuration(topic_count)
+        router = TopicRouter(topic_configuration)
+        topics = [random.choice(topic_configuration)["topic"] for _ in range(MESSAGES)]
+
+        # Keep the linear scan bounded for large configurations
+        scan_topics = topics[:max(100, MESSAGES * 10 // topic_count)]
+        start = time.perf_counter()
+        linear_scan(topic_configuration, scan_topics)
+        scan_rate = len(scan_topics) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        router_lookup(router, topics)
+        router_rate = len(topics) / (time.perf_counter() - start)
+
+        print(f"{topic_count:>8} | {scan_rate:>14.0f} | {router_rate:>14.0f} | {router_rate / scan_rate:>7.1f}x")
+
+
+if __name__ == '__main__':
+    run()
@@ -2,4 +2,4 @@
     File name: __init__py
     Date: 10.01.2023
 """
-from .__main__ import run_service
+from .service_main import run_service
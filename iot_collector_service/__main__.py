@@ -2,8 +2,7 @@
     File name: __main__.py
     Date: 10.01.2023
 """
-from .iot_service import IOTService
+from .service_main import main
 
-def run_service():
-    service = IOTService()
-    service.service_run()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,631 @@
+"""
+===============================================================================
+Module: async_iot_service.py
+Description:
+    This module implements the `AsyncIOTService` class, an asyncio based
+    runtime of the IoT data collection service. It provides the same
+    functionality as `IOTService` without the blocking service, collection
+    and per-collector threads:
+
+    - MQTT clients (one per broker) are driven by the event loop and
+      reconnect with backoff when the broker connection is lost. Broker
+      connections are opened in an executor, so an unreachable broker
+      never blocks the event loop.
+    - Received messages flow through one asyncio queue into the shared
+      `IngestPipeline`.
+    - Measurements are batched by `AsyncBatchMeasurementWriter`.
+    - Command polling runs as an event loop task. With leader election,
+      start, stop and configuration reloads are executed by every instance,
+      other commands only while holding the SQL lease.
+    - All SQL work goes through a bounded thread pool executor.
+    - Errors of a single message batch or command are logged and do not
+      stop the ingest or command task.
+    - Collection starts from the local configuration snapshot, when there is
+      one, and the configuration is refreshed once SQL is reachable.
+
+    Run with:
+        $ python -m iot_collector_service --async
+
+Dependencies:
+    - SQL Client (`MySqlClient`, `MySqlPoolClient`) and SQL Service (`SQLService`)
+    - MQTT Client (`AsyncMqttClientPaho`)
+    - TopicRouter, CodecRegistry, SchemaRegistry, MessageDeduplicator, MeasurementCompressor, IngestPipeline,
+      MeasurementBatch, AsyncBatchMeasurementWriter, MeasurementSpool, MeasurementRollup
+    - LeaderLease, CommandPoller, ConfigurationSnapshot, AsyncOutboundPublisher, ParameterCache
+    - Standard libraries: `asyncio`, `collections`, `concurrent.futures`, `threading`, `time`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from .iot_service import iIOTService, CONFIGURATION_SNAPSHOT_FILE, STATISTICS_LOG_INTERVAL
+from .mqtt_client import AsyncMqttClientPaho, shared_subscription_topic
+from .sql_client import MySqlClient, MySqlPoolClient
+from .sql_service import SQLService
+from .collector_configuration import CollectorConfiguration
+from .topic_router import TopicRouter
+from .ingest_pipeline import IngestPipeline
+from .payload_codecs import CodecRegistry
+from .payload_schema import SchemaRegistry
+from .message_dedupe import MessageDeduplicator
+from .measurement_compression import MeasurementCompressor
+from .measurement_writer import AsyncBatchMeasurementWriter
+from .measurement_rollup import MeasurementRollup, parse_rollup_intervals
+from .measurement_spool import MeasurementSpool, SpoolReplayer
+from .measurement_batch import MeasurementBatch
+from .configuration_snapshot import ConfigurationSnapshot, SNAPSHOT_PATH
+from .leader_election import LeaderLease
+from .parameter_cache import ParameterCache
+from .outbound_publisher import AsyncOutboundPublisher, group_parameter_packets
+from .command_poller import CommandPoller
+from .service_configuration import ServiceConfiguration
+from .event_logging import setup_logger
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import asyncio
+import time
+import os
+
+
+class AsyncIOTService(iIOTService):
+    """
+    Implements the IoT data collection service on a single asyncio event loop.
+    """
+    def __init__(self):
+        """
+        Constructor that initializes the asyncio IoT service.
+        Sets up logger, service configuration, SQL client and the SQL executor.
+        Connections are established when the event loop is started.
+        """
+        # Create folder structure
+        self._create_folder_structure()
+
+        # Create datalog
+        self.logger = setup_logger("IOT Service Log", "iot_service_logs/log")
+
+        # Read service configuration
+        self.service_configuration = ServiceConfiguration().load()
+
+        # Define SQL client; a single shared connection must be serialized
+        if self.service_configuration.sql_writer_workers > 0:
+            self.sql_client = MySqlPoolClient(writer_workers=self.service_configuration.sql_writer_workers,
+                                              statement_reuse=self.service_configuration.sql_statement_reuse)
+            self._sql_lock = None
+        else:
+            self.sql_client = MySqlClient(statement_reuse=self.service_configuration.sql_statement_reuse)
+            self._sql_lock = Lock()
+
+        # Define SQL service and the executor for all SQL work
+        self.sql_service = SQLService(sql_client=self.sql_client,
+                                      device_timestamps=self.service_configuration.device_timestamps)
+        self.sql_executor = ThreadPoolExecutor(max_workers=self.service_configuration.async_sql_executor_workers)
+
+        # Define local spool for measurements the database can not take right now
+        self.measurement_spool = None
+        self.spool_replayer = None
+        if self.service_configuration.spool_enabled:
+            self.measurement_spool = MeasurementSpool()
+            self.spool_replayer = SpoolReplayer(
+                spool=self.measurement_spool,
+                sql_service=self.sql_service,
+                replay_batch_size=self.service_configuration.spool_replay_batch_size,
+                lock=self._sql_lock,
+                logger=self.logger)
+
+        self.command_poller = CommandPoller(
+            sql_service=self.sql_service,
+            min_interval=self.service_configuration.command_poll_min_interval,
+            max_interval=self.service_configuration.command_poll_max_interval,
+            version_check=self.service_configuration.command_version_check,
+            broadcast_delay=self.service_configuration.command_broadcast_delay
+            if self.service_configuration.leader_election else 0.0)
+
+        self.parameter_cache = ParameterCache(sql_service=self.sql_service,
+                                              max_entries=self.service_configuration.parameter_cache_size)
+
+        # With several instances, only the lease holder processes commands
+        self.leader_lease = None
+        if self.service_configuration.leader_election:
+            self.leader_lease = LeaderLease(
+                sql_service=self.sql_service,
+                instance_id=self.service_configuration.instance_id,
+                lease_duration=self.service_configuration.leader_lease_duration,
+                renew_interval=self.service_configuration.leader_lease_renew_interval,
+                logger=self.logger)
+
+        self._sql_connected = False
+        self.configuration_version = None
+        self.collector_configuration = []
+        self.device_configuration = []
+        self.topic_configuration = []
+        self.topic_router = TopicRouter()
+        self.codec_registry = CodecRegistry()
+        self.schema_registry = SchemaRegistry(logger=self.logger)
+        self.deduplicator = MessageDeduplicator(max_entries=self.service_configuration.dedupe_cache_size)
+        self.compressor = None
+        if self.service_configuration.measurement_compression:
+            self.compressor = MeasurementCompressor(logger=self.logger)
+        self.ingest_pipeline = IngestPipeline(self.topic_router, self.codec_registry, self.schema_registry,
+                                              self.deduplicator, self.compressor)
+
+        # Rollups are flushed through the SQL executor, which serializes them with the other SQL work
+        self.measurement_rollup = None
+        if self.service_configuration.rollup_intervals:
+            self.measurement_rollup = MeasurementRollup(
+                sql_service=self.sql_service,
+                intervals=parse_rollup_intervals(self.service_configuration.rollup_intervals),
+                close_delay=self.service_configuration.rollup_close_delay,
+                logger=self.logger)
+
+        self.mqtt_clients = []
+        self._topic_clients = {}
+        self._client_publishers = {}
+        self._collecting = True
+        self._dropped_count = 0
+        self._unknown_field_count = 0
+        self._duplicate_count = 0
+        self._compression_logged = time.monotonic()
+        self._compression_unmatched = []
+        self._rollup_logged = 0.0
+        self._loop = None
+        self._ingest_queue = None
+        self.measurement_writer = None
+
+    def service_run(self):
+        """
+        Runs the service event loop until interrupted.
+        """
+        try:
+            asyncio.run(self._service_main())
+        except KeyboardInterrupt:
+            print('Service interrupted')
+
+    async def _service_main(self):
+        """
+        Connects to SQL and MQTT and runs the ingest and command tasks.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._ingest_queue = asyncio.Queue(maxsize=self.service_configuration.async_ingest_queue_size)
+
+        self.logger.info(f"Service instance: {self.service_configuration.instance_id}, "
+                         f"shared subscription group: {self.service_configuration.shared_subscription_group or '-'}")
+
+        # Start from the local configuration snapshot if there is one, SQL is connected by the command task.
+        # Without a snapshot wait for the SQL server instead of exiting, it is needed for the configuration.
+        snapshot = None
+        if self.service_configuration.config_snapshot_enabled:
+            snapshot = ConfigurationSnapshot.load(f"{SNAPSHOT_PATH}{CONFIGURATION_SNAPSHOT_FILE}")
+        if snapshot is None:
+            await self._connect_sql()
+            snapshot = await self._run_sql(self._read_configuration_snapshot)
+            await self._run_sql(self._read_compression_configuration)
+        else:
+            self.logger.info(f"Starting from configuration snapshot {snapshot.version[:12]}, "
+                             f"saved {time.ctime(snapshot.saved)}")
+        self._apply_configuration(snapshot)
+
+        self.measurement_writer = AsyncBatchMeasurementWriter(
+            sql_service=self.sql_service,
+            executor=self.sql_executor,
+            max_batch_size=self.service_configuration.measurement_batch_size,
+            max_batch_latency=self.service_configuration.measurement_batch_latency,
+            max_pending_flushes=self.service_configuration.async_sql_executor_workers,
+            lock=self._sql_lock,
+            logger=self.logger,
+            spool=self.measurement_spool,
+            spool_backlog=self.service_configuration.spool_backlog)
+        self.measurement_writer.start_writer()
+        if self.spool_replayer is not None and self._sql_connected:
+            self.spool_replayer.start_replayer()
+
+        await self._connect_clients()
+
+        try:
+            await asyncio.gather(self._ingest_task_fun(), self._command_task_fun())
+        finally:
+            self._disconnect_clients()
+            await self.measurement_writer.stop_writer()
+            if self.measurement_rollup is not None:
+                # Partial windows are merged with the rest of the window after a restart
+                await self._run_sql(self.measurement_rollup.flush, True)
+            if self.spool_replayer is not None and self._sql_connected:
+                await self._loop.run_in_executor(None, self.spool_replayer.stop_replayer)
+            if self.leader_lease is not None:
+                await self._run_sql(self.leader_lease.release)
+            await self._run_sql(self.sql_client.disconnect_sql)
+            self.sql_executor.shutdown()
+
+    async def _run_sql(self, fun, *args):
+        """
+        Runs a blocking SQL call in the SQL executor.
+        """
+        return await self._loop.run_in_executor(self.sql_executor, self._locked_call, fun, *args)
+
+    def _locked_call(self, fun, *args):
+        if self._sql_lock is None:
+            return fun(*args)
+        with self._sql_lock:
+            return fun(*args)
+
+    async def _connect_sql(self):
+        """
+        Connects to the SQL server, retrying with backoff until it is reachable.
+        """
+        retry_interval = self.service_configuration.sql_connect_retry_interval
+        while 1:
+            try:
+                self.logger.info(f"Connecting to SQL server!")
+                await self._run_sql(self.sql_service.connect_service)
+                break
+            except:
+                self.logger.info(f"Connecting to SQL failed! Retrying in {retry_interval:.0f} s")
+                await asyncio.sleep(retry_interval)
+                retry_interval = min(retry_interval * 2, 60.0)
+
+        self._sql_connected = True
+        self.logger.info(f"Connected to sql!")
+
+    def _read_compression_configuration(self):
+        """
+        Reads the compression settings of measurement series from SQL.
+        A failed read keeps the current settings.
+        """
+        if self.compressor is None:
+            return
+        try:
+            compression_configuration = self.sql_service.read_compression_configuration()
+        except Exception as error:
+            self.logger.error(f"Reading compression configuration failed, keeping the current one: {error}")
+            return
+        self.compressor.rebuild(compression_configuration)
+        # Give the new series a full statistics interval to receive measurements
+        self._compression_logged = time.monotonic()
+        self._compression_unmatched = []
+        self.logger.info(f"Compression configured for {len(self.compressor)} measurement series")
+
+    def _read_configuration_snapshot(self) -> ConfigurationSnapshot:
+        """
+        Reads the complete configuration from SQL in one round trip and saves it as the local snapshot.
+        An empty result (e.g. a failed read) never replaces the last saved snapshot.
+        """
+        snapshot = self.sql_service.read_service_configuration()
+        if self.service_configuration.config_snapshot_enabled and snapshot.rows:
+            try:
+                snapshot.save(f"{SNAPSHOT_PATH}{CONFIGURATION_SNAPSHOT_FILE}")
+            except OSError as error:
+                self.logger.warning(f"Saving configuration snapshot failed: {error}")
+        return snapshot
+
+    def _apply_configuration(self, snapshot: ConfigurationSnapshot):
+        """
+        Takes over broker, device and topic configuration and rebuilds the routing, codec and schema indexes.
+        """
+        self.configuration_version = snapshot.version
+        self.collector_configuration = snapshot.collector_configuration
+        self.device_configuration = snapshot.device_configuration
+        self.topic_configuration = snapshot.topic_configuration
+        self.codec_registry.rebuild(self.topic_configuration)
+        self.schema_registry.rebuild(self.topic_configuration)
+        self.topic_router.rebuild(self.topic_configuration)
+
+    async def _reload_configuration(self):
+        """
+        Reads the configuration from SQL and applies the differences to the MQTT clients if it changed.
+        """
+        print("Getting new configuration")
+        snapshot = await self._run_sql(self._read_configuration_snapshot)
+        await self._run_sql(self._read_compression_configuration)
+        if not snapshot.rows and self.topic_configuration:
+            self.logger.warning("SQL returned an empty configuration, keeping the current one")
+            return
+        if snapshot.version == self.configuration_version:
+            self.logger.info(f"Configuration {snapshot.version[:12]} unchanged")
+            return
+
+        self._apply_configuration(snapshot)
+        await self._update_clients()
+
+    async def _connect_clients(self):
+        """
+        Creates and connects one event loop driven MQTT client per broker configuration.
+        Brokers are connected concurrently.
+        """
+        self.mqtt_clients = []
+        self._topic_clients = {}
+        clients = await asyncio.gather(*(self._connect_client(collector_conf, self._broker_topics(collector_conf))
+                                         for collector_conf in self.collector_configuration))
+        for collector_conf, client in zip(self.collector_configuration, clients):
+            if client is not None:
+                for topic in self._broker_topics(collector_conf):
+                    self._topic_clients[topic] = client
+
+    async def _update_clients(self):
+        """
+        Applies a new configuration to the connected MQTT clients, changing only the differences:
+        clients of removed or changed brokers are disconnected, new brokers are connected,
+        and the other clients (un)subscribe only the changed topics.
+        """
+        new_configuration = {conf.configuration_id: conf for conf in self.collector_configuration}
+        current_clients = {}
+        for client in list(self.mqtt_clients):
+            conf = new_configuration.get(client.collector_configuration.configuration_id)
+            if conf is None or conf.connection_settings() != client.collector_configuration.connection_settings():
+                self._client_publishers.pop(client).stop_publisher()
+                client.mqtt_client_disconnect()
+                self.mqtt_clients.remove(client)
+                self.logger.info(f"Stopping collection: Broker: {client.collector_configuration.ip_addr}:"
+                                 f"{client.collector_configuration.port}")
+            else:
+                client.collector_configuration = conf
+                current_clients[conf.configuration_id] = client
+
+        # New brokers are connected concurrently
+        new_configuration = [conf for conf in self.collector_configuration
+                             if conf.configuration_id not in current_clients]
+        new_clients = await asyncio.gather(*(self._connect_client(conf, self._broker_topics(conf))
+                                             for conf in new_configuration))
+        new_clients = {conf.configuration_id: client for conf, client in zip(new_configuration, new_clients)}
+
+        topic_clients = {}
+        for collector_conf in self.collector_configuration:
+            topics = self._broker_topics(collector_conf)
+            client = current_clients.get(collector_conf.configuration_id)
+            if client is None:
+                client = new_clients[collector_conf.configuration_id]
+            else:
+                mqtt_topics = [shared_subscription_topic(t, self.service_configuration.shared_subscription_group)
+                               for t in topics]
+                subscribed = set(client.mqtt_topics)
+                added = [t for t in mqtt_topics if t not in subscribed]
+                removed = list(subscribed.difference(mqtt_topics))
+                if self._collecting:
+                    if added:
+                        client.mqtt_client_subscribe_topics(added)
+                    if removed:
+                        client.mqtt_client_unsubscribe_topics(removed)
+                client.mqtt_topics = mqtt_topics
+                if added or removed:
+                    self.logger.info(f"Updating collection: Broker: {collector_conf.ip_addr}:{collector_conf.port}, "
+                                     f"Topics added: {len(added)}, removed: {len(removed)}")
+            if client is not None:
+                for topic in topics:
+                    topic_clients[topic] = client
+        self._topic_clients = topic_clients
+
+    def _broker_topics(self, collector_conf: CollectorConfiguration) -> list:
+        return [i["topic"] for i in self.topic_configuration
+                if i["iot_configuration"] == collector_conf.configuration_id]
+
+    async def _connect_client(self, collector_conf: CollectorConfiguration, topics: list):
+        """
+        Creates and connects the MQTT client of a broker and subscribes its topics while collecting.
+        The connection is opened in an executor, so an unreachable broker does not block the event loop.
+        Returns the client, or None if the broker is not reachable.
+        """
+        client = AsyncMqttClientPaho(loop=self._loop, data_queue=self._ingest_queue,
+                                     overflow_policy=self.service_configuration.mqtt_overflow_policy,
+                                     instance_id=self.service_configuration.instance_id)
+        status = await client.mqtt_client_connect_async(usr=collector_conf.usr,
+                                                        password=collector_conf.password,
+                                                        broker=collector_conf.ip_addr,
+                                                        port=collector_conf.port)
+        if status != 1:
+            self.logger.info(f"Collector not connected!: Broker: {collector_conf.ip_addr}:{collector_conf.port}")
+            return None
+
+        client.collector_configuration = collector_conf
+        client.reconnect_callback = self._on_client_reconnected
+        client.mqtt_topics = [shared_subscription_topic(t, self.service_configuration.shared_subscription_group)
+                              for t in topics]
+        if self._collecting:
+            client.mqtt_client_subscribe_topics(client.mqtt_topics)
+        publisher = AsyncOutboundPublisher(client,
+                                           publish_rate=self.service_configuration.publish_rate,
+                                           max_in_flight=self.service_configuration.publish_max_in_flight,
+                                           logger=self.logger)
+        publisher.start_publisher()
+        self._client_publishers[client] = publisher
+        self.mqtt_clients.append(client)
+        self.logger.info(f"Starting collection: Broker: {collector_conf.ip_addr}:{collector_conf.port}, "
+                         f"Topics: {len(topics)}")
+        return client
+
+    def _on_client_reconnected(self, client: AsyncMqttClientPaho):
+        """
+        Subscribes the topics of a client again after its lost broker connection was re-established.
+        """
+        if self._collecting:
+            client.mqtt_client_subscribe_topics(client.mqtt_topics)
+        self.logger.info(f"Reconnected collector: Broker: {client.collector_configuration.ip_addr}:"
+                         f"{client.collector_configuration.port}")
+
+    def _disconnect_clients(self):
+        for client in self.mqtt_clients:
+            self._client_publishers[client].stop_publisher()
+            client.mqtt_client_disconnect()
+        self.mqtt_clients = []
+        self._topic_clients = {}
+        self._client_publishers = {}
+
+    async def _ingest_task_fun(self):
+        """
+        Task that converts received messages into measurements and passes them to the writer.
+        """
+        while 1:
+            packet = await self._ingest_queue.get()
+            try:
+                # Convert everything that is already waiting into one batch
+                batch = MeasurementBatch()
+                self.ingest_pipeline.process_packet(packet, batch)
+                while not self._ingest_queue.empty() and \
+                        len(batch) < self.service_configuration.measurement_batch_size:
+                    self.ingest_pipeline.process_packet(self._ingest_queue.get_nowait(), batch)
+                if self.measurement_rollup is not None:
+                    self.measurement_rollup.add(batch)
+                await self.measurement_writer.write_measurements(self.ingest_pipeline.compress(batch))
+            except Exception as error:
+                # A single bad packet must not stop the service
+                self.logger.error(f"Failed to process received messages: {error}")
+
+    async def _command_task_fun(self):
+        """
+        Task that reads and processes control commands from SQL whenever they changed.
+        """
+        if not self._sql_connected:
+            # Started from the configuration snapshot, connect to SQL and refresh the configuration now
+            await self._connect_sql()
+            if self.spool_replayer is not None:
+                self.spool_replayer.start_replayer()
+            await self._reload_configuration()
+
+        while 1:
+            try:
+                leader = self.leader_lease is None or await self._run_sql(self.leader_lease.is_leader)
+                cmds, reset_ids = await self._run_sql(self.command_poller.poll_instance, leader)
+                for cmd in cmds:
+                    try:
+                        await self._handle_command(cmd)
+                    except Exception as error:
+                        # The flag is reset anyway, so a bad command row is not executed again and again
+                        self.logger.error(f"Failed to execute command {cmd.get('id')}: {error}")
+                for cmd_id in reset_ids:
+                    await self._run_sql(self.sql_service.reset_cmd_flag, cmd_id)
+                self._log_dropped_messages()
+                self._log_unknown_fields()
+                self._log_duplicates()
+                self._log_compression()
+                if self.measurement_rollup is not None:
+                    await self._run_sql(self.measurement_rollup.flush)
+                    self._log_rollups()
+            except Exception as error:
+                self.logger.error(f"Command task error: {error}")
+            await asyncio.sleep(self.command_poller.interval)
+
+    def _log_dropped_messages(self):
+        """
+        Logs per-topic drop counters of the MQTT clients whenever new messages were dropped.
+        """
+        dropped_per_topic = Counter()
+        for client in self.mqtt_clients:
+            dropped_per_topic.update(client.dropped_per_topic)
+        dropped_count = sum(dropped_per_topic.values())
+        if dropped_count != self._dropped_count:
+            self._dropped_count = dropped_count
+            self.logger.warning(f"Ingest queue overflow, dropped messages per topic: {dict(dropped_per_topic)}")
+
+    def _log_duplicates(self):
+        """
+        Logs the deduplication statistics whenever new redelivered messages were dropped.
+        """
+        if self.deduplicator.hit_count != self._duplicate_count:
+            self._duplicate_count = self.deduplicator.hit_count
+            self.logger.info(f"Dropped redelivered messages, {self.deduplicator.statistics()}")
+
+    def _log_compression(self):
+        """
+        Logs the compression statistics at most every STATISTICS_LOG_INTERVAL seconds.
+        Warns about configured series that did not receive a measurement in that time.
+        """
+        if self.compressor is None or not len(self.compressor):
+            return
+        now = time.monotonic()
+        if now - self._compression_logged < STATISTICS_LOG_INTERVAL:
+            return
+        self._compression_logged = now
+        if self.compressor.received_count:
+            self.logger.info(f"Measurement compression {self.compressor.statistics()}")
+        unmatched = self.compressor.unmatched_series()
+        if unmatched and unmatched != self._compression_unmatched:
+            self.logger.warning(f"No measurements received for {len(unmatched)} compressed series (topic id, "
+                                f"measurement type id): {unmatched[:10]}")
+        self._compression_unmatched = unmatched
+
+    def _log_rollups(self):
+        """
+        Logs the rollup statistics at most every STATISTICS_LOG_INTERVAL seconds.
+        """
+        if self.measurement_rollup is None or not self.measurement_rollup.written_count:
+            return
+        now = time.monotonic()
+        if now - self._rollup_logged >= STATISTICS_LOG_INTERVAL:
+            self._rollup_logged = now
+            self.logger.info(f"Measurement rollups {self.measurement_rollup.statistics()}")
+
+    def _log_unknown_fields(self):
+        """
+        Logs per-topic counters of payload fields missing from the topic schemas whenever new ones were received.
+        """
+        unknown_per_topic = dict(self.ingest_pipeline.unknown_field_count)
+        unknown_count = sum(unknown_per_topic.values())
+        if unknown_count != self._unknown_field_count:
+            self._unknown_field_count = unknown_count
+            self.logger.warning(f"Fields not in the payload schema, ignored fields per topic: {unknown_per_topic}")
+
+    async def _handle_command(self, cmd):
+        if cmd["cmd_type"] == 100:  # CMD: Write parameters
+            await self._cmd_write_parameters(cmd)
+        elif cmd["cmd_type"] == 101:  # CMD: Write parameters to a device group or the fleet
+            await self._cmd_write_group_parameters(cmd)
+        elif cmd["cmd_type"] == 0:  # CMD: Start service
+            if not self._collecting:
+                for client in self.mqtt_clients:
+                    client.mqtt_client_subscribe_topics(client.mqtt_topics)
+                self._collecting = True
+                self.logger.info("Resuming collection")
+        elif cmd["cmd_type"] == 1:  # CMD: Stop service
+            if self._collecting:
+                for client in self.mqtt_clients:
+                    client.mqtt_client_unsubscribe_topics(client.mqtt_topics)
+                self._collecting = False
+                self.logger.info("Holding collection")
+        elif cmd["cmd_type"] == 5:  # CMD: Get new configuration
+            await self._reload_configuration()
+
+    async def _cmd_write_parameters(self, cmd):
+        """
+        Publishes the parameters of a device to their topics, grouped into one packet per topic.
+        """
+        try:
+            parameters = await self._run_sql(self.parameter_cache.get_device_parameters, cmd["device_id"])
+        except Exception as error:
+            self.logger.error(f"Reading parameters of device {cmd['device_id']} failed: {error}")
+            return
+        self._publish_parameters(parameters)
+
+    async def _cmd_write_group_parameters(self, cmd):
+        """
+        Publishes the parameters of all devices of a device group, or of the whole fleet without a group.
+        """
+        group_id = cmd.get("device_group_id")
+        try:
+            parameters = await self._run_sql(self.parameter_cache.get_device_group_parameters, group_id)
+        except Exception as error:
+            self.logger.error(f"Reading parameters of device group {group_id or 'fleet'} failed: {error}")
+            return
+        count = self._publish_parameters(parameters)
+        self.logger.info(f"Queued {count} parameter packets for device group {group_id or 'fleet'}")
+        self.logger.info(f"Parameter cache {self.parameter_cache.statistics()}")
+
+    def _publish_parameters(self, parameters: list) -> int:
+        """
+        Queues one packet per topic on the outbound publisher of the topic's broker.
+        Returns the number of queued packets.
+        """
+        count = 0
+        for topic, data in group_parameter_packets(parameters).items():
+            client = self._topic_clients.get(topic)
+            if client is None:
+                self.logger.warning(f"No MQTT client for topic {topic}, packet not published")
+                continue
+            self._client_publishers[client].publish(topic, data)
+            count += 1
+        return count
+
+    def _create_folder_structure(self):
+        """
+        Creates the log folder structure required by the service.
+        """
+        if not os.path.exists("iot_service_logs/"):
+            os.makedirs("iot_service_logs/")
@@ -10,3 +10,9 @@ class CollectorConfiguration:
         self.password = password
         self.ip_addr = ip_addr
         self.port = port
+
+    def connection_settings(self) -> tuple:
+        """
+        Settings of the broker connection; a collector must reconnect when they change.
+        """
+        return self.ip_addr, self.port, self.usr, self.password
@@ -0,0 +1,131 @@
+"""
+===============================================================================
+Module: command_poller.py
+Description:
+    This module implements the `CommandPoller` class, which reads service
+    commands from SQL only when the command table changed.
+
+    Every poll reads a single version number with the
+    `GetServiceCommandVersion` stored procedure; the database bumps it
+    (e.g. with a trigger) whenever a command row is inserted or updated.
+    Command rows are fetched with `GetServiceCommands` only when the version
+    differs from the last one seen.
+
+    The poll interval adapts: it drops to `min_interval` after a change, so
+    follow-up commands are picked up within tens of milliseconds, and
+    doubles on every unchanged poll up to `max_interval` while idle.
+
+    With `version_check` disabled, or while the version can not be read
+    (e.g. a database without `GetServiceCommandVersion`), the poller
+    fetches command rows on every poll at `max_interval`, as before.
+
+    A version is only taken as seen once its command rows were read, so
+    commands of a failed read are fetched again with the next poll.
+
+    With several instances (`poll_instance`), every instance polls:
+    - Broadcast commands (start, stop, reload configuration) are executed
+      by every instance, once per flagging. The leader resets their flags
+      only `broadcast_delay` seconds after it saw them, so that followers
+      polling at up to `max_interval` read them first.
+    - All other commands (e.g. publishing parameters) are executed and
+      reset by the leader only.
+    A new leader reads all flagged commands, so commands flagged while the
+    previous leader was gone are executed.
+
+Dependencies:
+    - sql_service.py (SQLService)
+    - Standard libraries: `time`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from .sql_service import SQLService
+
+import time
+
+BROADCAST_COMMAND_TYPES = (0, 1, 5)  # Start, stop, get new configuration
+
+
+class CommandPoller:
+    """
+    Version checked, adaptively timed reader of flagged service commands.
+    """
+
+    def __init__(self, sql_service: SQLService, min_interval: float = 0.05, max_interval: float = 1.0,
+                 version_check: bool = True, broadcast_delay: float = 0.0):
+        self.sql_service = sql_service
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.version_check = version_check
+        self.broadcast_delay = broadcast_delay
+
+        self.interval = min_interval if version_check else max_interval  # Seconds until the next poll
+        self.version_read_count = 0
+        self.command_read_count = 0
+        self._version = None
+        self._leader = False
+        self._broadcast_flagged = set()  # Ids of flagged broadcast commands at the last read
+        self._pending_resets = {}        # Broadcast command id -> monotonic time its flag is reset
+
+    def poll(self) -> list:
+        """
+        Return the flagged commands if the command table changed since the last poll, else an empty list.
+        """
+        version = None
+        if self.version_check:
+            version = self.sql_service.read_cmd_version()
+            self.version_read_count += 1
+            if version is None:
+                self.interval = self.max_interval
+            elif version == self._version:
+                self.interval = min(self.interval * 2, self.max_interval)
+                return []
+            else:
+                self.interval = self.min_interval
+
+        try:
+            cmds = self.sql_service.read_cmd_from_sql()
+        except Exception as error:
+            print(f"Failed to read service commands: {error}")
+            self.interval = self.max_interval
+            return []
+        self.command_read_count += 1
+        self._version = version
+        return [cmd for cmd in cmds if cmd["flag"] == 1]
+
+    def poll_instance(self, leader: bool) -> tuple:
+        """
+        Poll for one instance of a deployment.
+        Returns the commands to execute and the ids of the commands whose flag to reset.
+        """
+        if leader and not self._leader:
+            self._version = None  # Read all flagged commands after taking over
+        self._leader = leader
+        if not leader:
+            self._pending_resets.clear()
+
+        read_count = self.command_read_count
+        cmds = self.poll()
+        execute = []
+        reset = []
+        if self.command_read_count != read_count:
+            broadcast_flagged = set()
+            for cmd in cmds:
+                if cmd["cmd_type"] in BROADCAST_COMMAND_TYPES:
+                    broadcast_flagged.add(cmd["id"])
+                    if cmd["id"] not in self._broadcast_flagged:
+                        execute.append(cmd)
+                    if leader:
+                        self._pending_resets.setdefault(cmd["id"], time.monotonic() + self.broadcast_delay)
+                elif leader:
+                    execute.append(cmd)
+                    reset.append(cmd["id"])
+            self._broadcast_flagged = broadcast_flagged
+
+        now = time.monotonic()
+        for cmd_id, due in list(self._pending_resets.items()):
+            if due <= now:
+                del self._pending_resets[cmd_id]
+                reset.append(cmd_id)
+        return execute, reset
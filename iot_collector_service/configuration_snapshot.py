@@ -0,0 +1,142 @@
+"""
+===============================================================================
+Module: configuration_snapshot.py
+Description:
+    This module implements the `ConfigurationSnapshot` class, the complete
+    broker, device and topic configuration of the service, built from the
+    single result set of the `GetServiceConfiguration` stored procedure.
+
+    `GetServiceConfiguration` joins brokers, devices and topics in one round
+    trip instead of `GetIotConfiguration`, `GetDeviceList` and one
+    `GetTopicsForDevice` call per device. It returns one row per topic (left
+    joined, so brokers without devices and devices without topics are kept)
+    with the columns:
+        iot_configuration, user, password, broker, port,
+        device_id, device_name,
+        topic_id, topic, topic_type, payload_format, payload_layout,
+        payload_schema
+
+    A snapshot is saved to a local JSON file after every successful read
+    that returned rows, so a failed read never replaces the last good
+    snapshot. The file holds the broker credentials needed to connect on a
+    cold start, so it is only readable by the service user (mode 0600).
+    On a cold start the service starts collecting from the saved snapshot
+    right away and refreshes it from SQL in the background, so it does not
+    wait for a slow or briefly unavailable database.
+
+    The snapshot version is a hash of its rows, so an unchanged
+    configuration is recognized without rebuilding anything. The file also
+    records a format version; files of another format are ignored.
+
+Dependencies:
+    - device_configuration.py (DeviceConfiguration)
+    - collector_configuration.py (CollectorConfiguration)
+    - Standard libraries: `json`, `hashlib`, `time`, `os`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from .device_configuration import DeviceConfiguration
+from .collector_configuration import CollectorConfiguration
+
+import hashlib
+import json
+import time
+import os
+
+SNAPSHOT_PATH = "collector_data/configuration/"
+SNAPSHOT_FORMAT_VERSION = 1
+
+TOPIC_COLUMNS = ("topic_id", "topic", "topic_type", "device_id", "iot_configuration",
+                 "payload_format", "payload_layout", "payload_schema")
+
+
+def configuration_version(rows: list) -> str:
+    """
+    Return a stable hash of the configuration rows.
+    """
+    content = json.dumps(rows, sort_keys=True, default=str)
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+class ConfigurationSnapshot:
+    """
+    Broker, device and topic configuration built from the rows of GetServiceConfiguration.
+    """
+
+    def __init__(self, rows: list, saved: float = None):
+        self.rows = rows
+        self.version = configuration_version(rows)
+        self.saved = saved
+
+        collectors = {}
+        devices = {}
+        self.topic_configuration = []
+        for row in rows:
+            broker_id = row["iot_configuration"]
+            if broker_id is not None and broker_id not in collectors:
+                collectors[broker_id] = CollectorConfiguration(
+                    configuration_id=broker_id,
+                    usr=row["user"],
+                    password=row["password"],
+                    ip_addr=row["broker"],
+                    port=row["port"])
+
+            if row.get("device_id") is None:
+                continue
+            device = devices.get(row["device_id"])
+            if device is None:
+                device = DeviceConfiguration(
+                    device_name=row["device_name"],
+                    device_id=row["device_id"],
+                    topic=[],
+                    iot_configuration=broker_id)
+                devices[row["device_id"]] = device
+
+            if row.get("topic") is None:
+                continue
+            topic = {column: row.get(column) for column in TOPIC_COLUMNS}
+            device.topic.append(topic)
+            self.topic_configuration.append(topic)
+
+        self.collector_configuration = list(collectors.values())
+        self.device_configuration = list(devices.values())
+
+    def save(self, path: str):
+        """
+        Write the snapshot to a JSON file, replacing the previous one atomically.
+        """
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder, mode=0o700)
+
+        self.saved = time.time()
+        content = {"format_version": SNAPSHOT_FORMAT_VERSION,
+                   "version": self.version,
+                   "saved": self.saved,
+                   "rows": self.rows}
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        # Broker credentials: readable by the service user only
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            json.dump(content, f, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: str):
+        """
+        Return the snapshot saved in the file, or None if there is no usable snapshot.
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                content = json.load(f)
+        except (OSError, ValueError) as error:
+            print(f"Failed to read configuration snapshot {path}: {error}")
+            return None
+        if content.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            return None
+        return ConfigurationSnapshot(content["rows"], saved=content.get("saved"))
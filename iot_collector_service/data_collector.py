@@ -7,14 +7,23 @@ Description:
     collection for IoT devices. It connects to an MQTT broker, subscribes 
     to device topics, collects incoming messages, and publishes data as needed.
 
+    One collector serves all devices of a broker over a single MQTT
+    connection; incoming messages are demultiplexed to devices by topic.
+    With a shared subscription group, topics are subscribed as
+    `$share/<group>/<topic>`, so the broker balances messages across all
+    service instances of the group and each message is ingested once.
+
     The collector is designed to run in background threads and uses 
-    queues to manage incoming and outgoing messages.
+    queues to manage incoming and outgoing messages. Outgoing messages go
+    through a non-blocking, rate limited `OutboundPublisher`. Incoming messages can be
+    redirected to a shared ingest queue, so a collector service can fan in
+    the data of all collectors without polling each of them.
 
 Dependencies:
     - mqtt_client.py (for IMqttClient)
     - collector_configuration.py (CollectorConfiguration)
-    - device_configuration.py (DeviceConfiguration)
-    - threading, queue, json
+    - outbound_publisher.py (OutboundPublisher)
+    - threading, queue
 
 Author: [Martin P]
 
@@ -22,14 +31,15 @@ Author: [Martin P]
 """
 
 
-from .mqtt_client import IMqttClient
+from .mqtt_client import IMqttClient, shared_subscription_topic
+from .outbound_publisher import OutboundPublisher
 from .collector_configuration import CollectorConfiguration
-from .device_configuration import  DeviceConfiguration
 
 from abc import ABC, abstractmethod
 from threading import Thread, Event
-from queue import Queue
-import json
+from queue import Queue, Empty, Full
+
+COLLECTOR_STOP_TIMEOUT = 0.5  # Seconds a collector thread waits for a message before checking for stop
 
 class IDataCollector(ABC):
 
@@ -51,29 +61,44 @@ class IDataCollector(ABC):
 
     @abstractmethod
     def set_configuration(self, collector_conf: CollectorConfiguration, device_topic_configuration: list,
-                          device_configuration: DeviceConfiguration):
+                          device_configuration: list):
+        pass
+
+    @abstractmethod
+    def update_configuration(self, device_topic_configuration: list, device_configuration: list,
+                             subscribe: bool = True):
+        pass
+
+    @abstractmethod
+    def set_ingest_queue(self, ingest_queue: Queue):
         pass
 
     @abstractmethod
     def get_data(self):
         pass
 
+    @abstractmethod
+    def get_dropped_messages(self) -> dict:
+        pass
+
 class MqttDataCollector(IDataCollector):
 
-    def __init__(self, client: IMqttClient):
+    def __init__(self, client: IMqttClient, shared_subscription_group: str = "", publish_rate: float = 0,
+                 publish_max_in_flight: int = 0, logger=None):
         self.client = client
+        self.shared_subscription_group = shared_subscription_group
         self.collector_configuration = None
         self.device_configuration = None
         self.device_settings = None
+        self._topic_devices = {}
 
         self._thread_stop = False
         self.data_queue = Queue(maxsize=10)
-        self.publish_queue = Queue(maxsize=5)
+        self.publisher = OutboundPublisher(client, publish_rate=publish_rate, max_in_flight=publish_max_in_flight,
+                                           logger=logger)
 
         self._stop_event = Event()
-        self._stop_event2 = Event()
         self._collection_thread = Thread(target=self._colection_thread_fun)
-        self._publish_thread = Thread(target=self._publish_thread_fun)
 
     def connect_collector(self) -> int:
         status = self.client.mqtt_client_connect(
@@ -95,30 +120,68 @@ class MqttDataCollector(IDataCollector):
 
     def subscribe_topic(self):
         for device in self.device_configuration:
-            topic = device["topic"]
+            topic = shared_subscription_topic(device["topic"], self.shared_subscription_group)
             self.client.mqtt_client_subscribe(topic=topic)
 
     def unsubscribe_topic(self, topic):
-        self.client.mqtt_client_unsubscribe(topic)
+        self.client.mqtt_client_unsubscribe(shared_subscription_topic(topic, self.shared_subscription_group))
 
     def unsubscribe_all_topic(self):
         for device in self.device_configuration:
-            topic = device["topic"]
+            topic = shared_subscription_topic(device["topic"], self.shared_subscription_group)
             self.client.mqtt_client_unsubscribe(topic=topic)
 
     def run_collector(self):
         self._collection_thread.start()
-        self._publish_thread.start()
+        self.publisher.start_publisher()
 
     def stop_collector(self):
+        """
+        Stop the publisher and the collection thread, which exits within COLLECTOR_STOP_TIMEOUT seconds.
+        """
         self._stop_event.set()
-        self._stop_event2.set()
+        self.publisher.stop_publisher()
 
     def set_configuration(self, collector_conf: CollectorConfiguration, device_topic_configuration: list,
-                          device_configuration: DeviceConfiguration):
+                          device_configuration: list):
+        """
+        Set broker configuration, topics of all devices on the broker and the list
+        of DeviceConfiguration objects of those devices.
+        """
         self.collector_configuration = collector_conf
         self.device_configuration = device_topic_configuration
         self.device_settings = device_configuration
+        self._topic_devices = {t["topic"]: t["device_id"] for t in device_topic_configuration}
+
+    def update_configuration(self, device_topic_configuration: list, device_configuration: list,
+                             subscribe: bool = True):
+        """
+        Switch a running collector to a new topic configuration of the same broker, keeping the connection.
+        Only added topics are subscribed (when subscribe is set) and only removed topics are unsubscribed.
+        Returns the lists of added and removed topics.
+        """
+        topic_devices = {t["topic"]: t["device_id"] for t in device_topic_configuration}
+        added = [t for t in topic_devices if t not in self._topic_devices]
+        removed = [t for t in self._topic_devices if t not in topic_devices]
+
+        # Demultiplex old and new topics until the subscriptions are switched
+        self._topic_devices = {**self._topic_devices, **topic_devices}
+        if subscribe:
+            for topic in added:
+                self.client.mqtt_client_subscribe(topic=shared_subscription_topic(topic, self.shared_subscription_group))
+        for topic in removed:
+            self.unsubscribe_topic(topic)
+
+        self.device_configuration = device_topic_configuration
+        self.device_settings = device_configuration
+        self._topic_devices = topic_devices
+        return added, removed
+
+    def set_ingest_queue(self, ingest_queue: Queue):
+        """
+        Deliver received messages to a shared ingest queue instead of the collector's own queue.
+        """
+        self.data_queue = ingest_queue
 
     def get_data(self):
         data = {}
@@ -129,21 +192,32 @@ class MqttDataCollector(IDataCollector):
             pass
         return data
 
+    def get_dropped_messages(self) -> dict:
+        """
+        Return the number of messages dropped by the client queue per topic.
+        """
+        return dict(self.client.data_queue.dropped_per_topic)
+
     def publish_data(self, data):
-        self.publish_queue.put(data)
+        """
+        Queue a {"topic", "data"} packet on the rate limited outbound publisher; never blocks.
+        """
+        self.publisher.publish(data["topic"], data["data"])
 
     def _colection_thread_fun(self):
         #while not self._thread_stop:
         while not self._stop_event.is_set():
-            data = self.client.mqtt_get_data()
-            self.data_queue.put(data)
-        return
-
-    def _publish_thread_fun(self):
-        #while not self._thread_stop:
-        while not self._stop_event2.is_set():
-            packet = self.publish_queue.get()
-            mqtt_msg = json.dumps(packet["data"])
-            self.client.mqtt_publish_data(topic=packet["topic"],
-                                          data=mqtt_msg)
+            try:
+                data = self.client.mqtt_get_data(timeout=COLLECTOR_STOP_TIMEOUT)
+            except Empty:
+                continue
+            # Demultiplex message to device by topic
+            data["device_id"] = self._topic_devices.get(data["topic"])
+            # A full ingest queue must not keep a stopped collector alive
+            while not self._stop_event.is_set():
+                try:
+                    self.data_queue.put(data, timeout=COLLECTOR_STOP_TIMEOUT)
+                    break
+                except Full:
+                    pass
         return
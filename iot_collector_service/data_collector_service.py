@@ -1,6 +1,8 @@
 from .data_collector import IDataCollector
 from .event_logging import setup_logger
 from abc import ABC, abstractmethod
+from collections import Counter
+from queue import Queue, Empty
 import os
 
 DATA_LOG_PATH = "collector_logs/"
@@ -31,58 +33,92 @@ class IDataCollectorService(ABC):
         pass
 
 class DataCollectorService(IDataCollectorService):
-    def __init__(self):
+    def __init__(self, ingest_queue_size: int = 1000):
         self.collectors_list = []
+        self.collection_held = False
+
+        # Outbound routing index: topic -> collector connected to the broker of the topic
+        self._topic_collectors = {}
+
+        # All collectors deliver their messages to one shared ingest queue
+        self.ingest_queue = Queue(maxsize=ingest_queue_size)
         self.create_folder_structure()
 
         # Create datalog
         self.logger = setup_logger("Collector Service Log", "collector_logs/log")
 
     def add_collector(self, new_collector: IDataCollector, collector_name=""):
+        new_collector.set_ingest_queue(self.ingest_queue)
         self.collectors_list.append(new_collector)
+        self._rebuild_topic_index()
         self.create_folder_structure()
 
         # Write to log
-        self.logger.info(f"Adding collector to collector service: Device Id:{new_collector.device_settings.device_id}, "
-                     f"Device name: {new_collector.device_settings.device_name}")
+        self.logger.info(f"Adding collector to collector service: {self._collector_description(new_collector)}")
 
     def start_collection(self):
         # Start collection for each collector
         for collector in self.collectors_list:
-            status = collector.connect_collector()
-            if status == 1:
-                print("Collector connected")
-                collector.run_collector()
-                print("Collector service start")
-
-                # Write to log
-                self.logger.info(f"Starting collection: Device Id:{collector.device_settings.device_id}, "
-                             f"Device name: {collector.device_settings.device_name}")
-            else:
-                print("Collector not connected!")
-
-                # Write to log
-                self.logger.info(f"Collector not connected!: Device Id:{collector.device_settings.device_id}, "
-                             f"Device name: {collector.device_settings.device_name}")
+            self.start_collector(collector)
+
+    def start_collector(self, collector: IDataCollector):
+        status = collector.connect_collector()
+        if status == 1:
+            print("Collector connected")
+            collector.run_collector()
+            print("Collector service start")
+
+            # Write to log
+            self.logger.info(f"Starting collection: {self._collector_description(collector)}")
+        else:
+            print("Collector not connected!")
+
+            # Write to log
+            self.logger.info(f"Collector not connected!: {self._collector_description(collector)}")
+
+    def update_collector(self, collector: IDataCollector, device_topic_configuration: list,
+                         device_configuration: list):
+        """
+        Apply a new topic configuration to a running collector, (un)subscribing only the changed topics.
+        """
+        added, removed = collector.update_configuration(device_topic_configuration, device_configuration,
+                                                        subscribe=not self.collection_held)
+        self._rebuild_topic_index()
+        self.create_folder_structure()
+        if added or removed:
+            self.logger.info(f"Updating collection: {self._collector_description(collector)}, "
+                             f"Topics added: {len(added)}, removed: {len(removed)}")
+
+    def remove_collector(self, collector: IDataCollector):
+        """
+        Stop a single collector, disconnect it from its broker and remove it from the service.
+        """
+        collector.stop_collector()
+        collector.disconnect_collector()
+        self.collectors_list.remove(collector)
+        self._rebuild_topic_index()
+
+        # Write to log
+        self.logger.info(f"Removing collector: {self._collector_description(collector)}")
 
     def resume_collection(self):
+        self.collection_held = False
 
         for collector in self.collectors_list:
             collector.subscribe_topic()
 
             # Write to log
-            self.logger.info(f"Resuming collection: Device Id:{collector.device_settings.device_id}, "
-                         f"Device name: {collector.device_settings.device_name}")
+            self.logger.info(f"Resuming collection: {self._collector_description(collector)}")
 
     def hold_collection(self):
+        self.collection_held = True
 
         for collector in self.collectors_list:
             collector.unsubscribe_all_topic()
             print("Collector service held")
 
             # Write to log
-            self.logger.info(f"Holding collection: Device Id:{collector.device_settings.device_id}, "
-                         f"Device name: {collector.device_settings.device_name}")
+            self.logger.info(f"Holding collection: {self._collector_description(collector)}")
 
     def stop_collection(self):
 
@@ -93,22 +129,62 @@ class DataCollectorService(IDataCollectorService):
             print("Collector service stop")
 
             # Write to log
-            self.logger.info(f"Stopping collection: Device Id:{collector.device_settings.device_id}, "
-                         f"Device name: {collector.device_settings.device_name}")
+            self.logger.info(f"Stopping collection: {self._collector_description(collector)}")
+
 
-        del collector
+    def remove_collectors(self):
+        """
+        Remove all (stopped) collectors from the service.
+        """
+        self.collectors_list = []
+        self._topic_collectors = {}
 
-    def get_data(self):
+    def get_data(self, timeout: float = 0.1, max_packets: int = 100):
+        """
+        Wait up to timeout for the next message from any collector, then drain
+        up to max_packets already waiting messages without blocking.
+        """
         data_list = []
-        for collector in self.collectors_list:
-            data = collector.get_data()
-            # Check if data not empty
-            if data:
-                data_list.append(data)
+        try:
+            data_list.append(self.ingest_queue.get(timeout=timeout))
+            while len(data_list) < max_packets:
+                data_list.append(self.ingest_queue.get_nowait())
+        except Empty:
+            pass
         return data_list
 
-    def publish_data(self, data):
-        self.collectors_list[0].publish_data(data)  # TODO: Naredi da deluje za več kolektorjev
+    def get_dropped_messages(self) -> dict:
+        """
+        Return the number of dropped messages per topic over all collectors.
+        """
+        dropped = Counter()
+        for collector in self.collectors_list:
+            dropped.update(collector.get_dropped_messages())
+        return dict(dropped)
+
+    def publish_data(self, data) -> bool:
+        """
+        Publish a packet through the collector connected to the broker of its topic.
+        Every collector publishes from its own thread, so brokers are published to in parallel.
+        Returns False if no collector serves the topic.
+        """
+        collector = self._topic_collectors.get(data["topic"])
+        if collector is None:
+            self.logger.warning(f"No collector for topic {data['topic']}, packet not published")
+            return False
+        collector.publish_data(data)
+        return True
+
+    def _rebuild_topic_index(self):
+        """
+        Rebuild the topic -> collector index from the topic configuration of all collectors
+        and swap it in atomically.
+        """
+        topic_collectors = {}
+        for collector in self.collectors_list:
+            for topic in collector.device_configuration:
+                topic_collectors[topic["topic"]] = collector
+        self._topic_collectors = topic_collectors
 
     def create_folder_structure(self):
         # Create collector log folder
@@ -119,7 +195,14 @@ class DataCollectorService(IDataCollectorService):
         if not os.path.exists("collector_data/"):
             os.makedirs("collector_data/")
         else:
-            # Create sub folder of each collector
+            # Create sub folder of each device
             for collector in self.collectors_list:
-                if not os.path.exists(f"collector_data/{collector.device_settings.device_name}"):
-                    os.makedirs(f"collector_data/{collector.device_settings.device_name}")
+                for device in collector.device_settings:
+                    if not os.path.exists(f"collector_data/{device.device_name}"):
+                        os.makedirs(f"collector_data/{device.device_name}")
+
+    @staticmethod
+    def _collector_description(collector: IDataCollector):
+        conf = collector.collector_configuration
+        return f"Broker: {conf.ip_addr}:{conf.port}, Configuration Id:{conf.configuration_id}, " \
+               f"Devices: {', '.join(str(d.device_id) for d in collector.device_settings)}"
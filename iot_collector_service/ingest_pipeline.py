@@ -0,0 +1,139 @@
+"""
+===============================================================================
+Module: ingest_pipeline.py
+Description:
+    This module implements the `IngestPipeline` class, which converts packets
+    received from MQTT collectors into measurement records for the SQL
+    writer. It is shared by the threaded and the asyncio service runtimes.
+
+    Measurements are appended to a column-wise `MeasurementBatch` given by
+    the caller, so the whole batch of packets drained from the ingest queue
+    is converted without allocating an object per measurement.
+
+    Processing steps for each packet:
+    - Route the packet topic to device / topic id (`TopicRouter`).
+    - Skip packets of unknown or non-measurement topics.
+    - Decode the raw (`bytes`) payload once with the codec of the topic
+      (`CodecRegistry`). Payloads that do not decode to an object of fields
+      (e.g. a JSON array or number) are counted as invalid packets.
+    - Drop redelivered packets, recognized by their (topic, device
+      timestamp) key (`MessageDeduplicator`).
+    - Expand the payload to one measurement per field, stamped with the
+      time the packet was processed and the device timestamp of the packet
+      (the processing time if the device sent none).
+    - Topics with a payload schema (`SchemaRegistry`) map fields to
+      measurement type ids in a single pass; unknown fields are counted per
+      topic and invalid values are skipped and counted.
+    - Topics without a schema store the field names as measurement type
+      ids; values that are not finite numbers are skipped and counted.
+
+    The batch of all converted packets then passes the optional compression
+    stage (`MeasurementCompressor`), which drops values of configured series
+    that do not need to be stored.
+
+Dependencies:
+    - topic_router.py (TopicRouter)
+    - payload_codecs.py (CodecRegistry)
+    - payload_schema.py (SchemaRegistry)
+    - message_dedupe.py (MessageDeduplicator)
+    - measurement_compression.py (MeasurementCompressor)
+    - measurement_batch.py (MeasurementBatch)
+    - Standard libraries: `collections`, `math`, `time`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from .topic_router import TopicRouter
+from .payload_codecs import CodecRegistry
+from .payload_schema import SchemaRegistry, TIMESTAMP_FIELD
+from .message_dedupe import MessageDeduplicator
+from .measurement_compression import MeasurementCompressor
+from .measurement_batch import MeasurementBatch
+from collections import Counter
+from math import isfinite
+import time
+
+TOPIC_TYPE_MEASUREMENT = 1
+TIMESTAMP_TYPES = (int, float)
+
+
+class IngestPipeline:
+    """
+    Converts received MQTT packets into measurement records.
+    """
+
+    def __init__(self, topic_router: TopicRouter, codec_registry: CodecRegistry = None,
+                 schema_registry: SchemaRegistry = None, deduplicator: MessageDeduplicator = None,
+                 compressor: MeasurementCompressor = None):
+        self.topic_router = topic_router
+        self.codec_registry = codec_registry if codec_registry is not None else CodecRegistry()
+        self.schema_registry = schema_registry if schema_registry is not None else SchemaRegistry()
+        self.deduplicator = deduplicator
+        self.compressor = compressor
+        self.invalid_packet_count = 0
+        self.invalid_value_count = 0
+        self.unknown_field_count = Counter()  # Per topic
+
+    def process_packet(self, packet, batch: MeasurementBatch) -> int:
+        """
+        Append the measurements contained in a received packet to the batch and return their number.
+        Packets of unknown or non-measurement topics, undecodable packets and payloads that are not
+        objects of fields add nothing.
+        """
+        topic = packet["topic"]
+        route = self.topic_router.get_route(topic)
+        if route is None or route.topic_type != TOPIC_TYPE_MEASUREMENT:
+            return 0
+
+        try:
+            data = self.codec_registry.get_codec(topic).decode(packet["data"])
+        except ValueError:
+            self.invalid_packet_count += 1
+            return 0
+        if not isinstance(data, dict):
+            # Valid JSON / msgpack / CBOR, but not an object of fields
+            self.invalid_packet_count += 1
+            return 0
+        received = time.time()
+
+        # Device timestamp (seconds since the epoch) of the schema or the default timestamp field
+        schema = self.schema_registry.get_schema(topic)
+        timestamp = data.get(schema.timestamp_field if schema is not None else TIMESTAMP_FIELD)
+        if type(timestamp) in TIMESTAMP_TYPES and isfinite(timestamp):
+            if self.deduplicator is not None and self.deduplicator.is_duplicate(topic, timestamp):
+                return 0
+        else:
+            timestamp = received
+
+        if schema is not None:
+            count, invalid, unknown = schema.extract(data, batch, route.device_id, route.topic_id, received,
+                                                     timestamp)
+            if invalid:
+                self.invalid_value_count += invalid
+            if unknown:
+                self.unknown_field_count[topic] += unknown
+            return count
+
+        count = 0
+        for m in data:
+            if m != TIMESTAMP_FIELD:
+                try:
+                    value = float(data[m])
+                except (TypeError, ValueError, OverflowError):
+                    self.invalid_value_count += 1
+                    continue
+                if not isfinite(value):
+                    self.invalid_value_count += 1
+                    continue
+                batch.append(route.device_id, route.topic_id, m, value, received, timestamp)
+                count += 1
+        return count
+
+    def compress(self, batch: MeasurementBatch) -> MeasurementBatch:
+        """
+        Return the measurements of the batch that need to be stored.
+        """
+        if self.compressor is None:
+            return batch
+        return self.compressor.compress(batch)
@@ -0,0 +1,149 @@
+"""
+===============================================================================
+Module: ingest_queue.py
+Description:
+    This module implements `IngestQueue`, a bounded queue for received MQTT
+    packets with an explicit policy for what happens when the queue is full:
+
+    - block:        wait until there is space (previous behaviour)
+    - drop_oldest:  discard the oldest queued packet to make room
+    - drop_newest:  discard the incoming packet
+    - spill:        append packets to a spill file on disk and feed them
+                    back into the queue, in order, as space frees up
+
+    Except for `block`, putting a packet never blocks, so a slow consumer
+    (e.g. SQL) cannot stall the MQTT network loop and its keepalives.
+    Dropped packets are counted per topic.
+
+Dependencies:
+    - Standard libraries: `queue`, `threading`, `collections`, `pickle`, `os`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from collections import Counter
+from queue import Queue, Full, Empty
+from threading import Lock
+import pickle
+import os
+
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+OVERFLOW_SPILL = "spill"
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_SPILL)
+
+SPILL_PATH = "collector_data/spill/"
+
+
+class SpillFile:
+    """
+    Append-only file of pickled packets, read back in FIFO order.
+    The file is truncated whenever all spilled packets have been read back.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pending = 0
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        self._writer = open(path, "wb")
+        self._reader = open(path, "rb")
+
+    def append(self, packet):
+        pickle.dump(packet, self._writer)
+        self.pending += 1
+
+    def read(self, max_items: int) -> list:
+        self._writer.flush()
+        packets = []
+        while self.pending and len(packets) < max_items:
+            packets.append(pickle.load(self._reader))
+            self.pending -= 1
+
+        if not self.pending:
+            # Everything read back, start the file over
+            self._writer.seek(0)
+            self._writer.truncate()
+            self._reader.seek(0)
+        return packets
+
+    def close(self):
+        self._writer.close()
+        self._reader.close()
+
+
+class IngestQueue(Queue):
+    """
+    Bounded packet queue with a configurable overflow policy and per-topic drop counters.
+    """
+
+    def __init__(self, maxsize: int = 1000, overflow_policy: str = OVERFLOW_BLOCK, spill_file: str = None):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        super().__init__(maxsize=maxsize)
+        self.overflow_policy = overflow_policy
+        self.dropped_per_topic = Counter()
+        self.spilled_count = 0
+
+        self._overflow_lock = Lock()
+        self._spill = None
+        if overflow_policy == OVERFLOW_SPILL:
+            self._spill = SpillFile(spill_file or f"{SPILL_PATH}spill_{id(self)}.bin")
+
+    def put_packet(self, packet):
+        """
+        Put a packet into the queue applying the overflow policy if the queue is full.
+        """
+        if self.overflow_policy == OVERFLOW_BLOCK:
+            self.put(packet)
+            return
+
+        with self._overflow_lock:
+            # Keep packets in order while spilled packets are waiting
+            if self._spill is not None and self._spill.pending:
+                self._spill.append(packet)
+                self.spilled_count += 1
+                return
+
+            try:
+                self.put_nowait(packet)
+                return
+            except Full:
+                pass
+
+            if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                self.dropped_per_topic[packet["topic"]] += 1
+            elif self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                try:
+                    oldest = super().get_nowait()
+                    self.dropped_per_topic[oldest["topic"]] += 1
+                except Empty:
+                    pass
+                try:
+                    self.put_nowait(packet)
+                except Full:
+                    self.dropped_per_topic[packet["topic"]] += 1
+            else:
+                self._spill.append(packet)
+                self.spilled_count += 1
+
+    def get(self, block=True, timeout=None):
+        packet = super().get(block, timeout)
+        if self._spill is not None and self._spill.pending:
+            self._refill()
+        return packet
+
+    def get_dropped_count(self) -> int:
+        return sum(self.dropped_per_topic.values())
+
+    def _refill(self):
+        """
+        Move spilled packets back into the queue as far as there is space.
+        """
+        with self._overflow_lock:
+            free = self.maxsize - self.qsize()
+            for packet in self._spill.read(free):
+                self.put_nowait(packet)
@@ -10,16 +10,27 @@ Description:
 
     Key Responsibilities:
     - Initialize and run the service loop in background threads.
-    - Manage collector configuration and MQTT connections.
+    - Manage collector configuration and MQTT connections (one per broker).
     - Process incoming MQTT data and convert to structured measurements.
     - Execute control commands from SQL (like start, stop, reconfigure).
+    - Run as one shard of a multi-process service (see `shard_supervisor.py`),
+      owning only the topics of its shard and receiving commands from the
+      supervisor instead of polling SQL.
+    - Run as one of several instances of a deployment: start, stop and
+      configuration reloads are executed by every instance, other commands
+      only while holding the SQL lease (see `leader_election.py`).
+    - Start collecting from the local configuration snapshot and refresh it
+      from SQL in the background (see `configuration_snapshot.py`).
 
 Dependencies:
     - SQL Client (`MySqlClient`) and SQL Service (`SQLService`)
     - MQTT Client (`MqttClientPaho`)
     - DataCollectorService, MqttDataCollector
+    - TopicRouter, CodecRegistry, SchemaRegistry, MessageDeduplicator, MeasurementCompressor, IngestPipeline,
+      MeasurementBatch, BatchMeasurementWriter, MeasurementSpool, MeasurementRollup
+    - LeaderLease, CommandPoller, ConfigurationSnapshot, ParameterCache
     - Logging (via `setup_logger`)
-    - Standard libraries: `threading`, `json`, `sys`, `os`, `time`
+    - Standard libraries: `threading`, `queue`, `os`, `time`
 
 Author: [Martin P]
 ===============================================================================
@@ -29,16 +40,33 @@ from abc import ABC, abstractmethod
 from .data_collector_service import DataCollectorService
 from .data_collector import MqttDataCollector, CollectorConfiguration
 from .mqtt_client import MqttClientPaho
-from .sql_client import MySqlClient
+from .sql_client import MySqlClient, MySqlPoolClient
 from .sql_service import SQLService
+from .topic_router import TopicRouter, topic_shard
+from .ingest_pipeline import IngestPipeline
+from .payload_codecs import CodecRegistry
+from .payload_schema import SchemaRegistry
+from .message_dedupe import MessageDeduplicator
+from .measurement_compression import MeasurementCompressor
+from .measurement_writer import BatchMeasurementWriter
+from .measurement_rollup import MeasurementRollup, parse_rollup_intervals
+from .measurement_spool import MeasurementSpool, SpoolReplayer, SPOOL_PATH
+from .measurement_batch import MeasurementBatch
+from .configuration_snapshot import ConfigurationSnapshot, SNAPSHOT_PATH
+from .leader_election import LeaderLease
+from .parameter_cache import ParameterCache
+from .outbound_publisher import group_parameter_packets
+from .command_poller import CommandPoller
+from .service_configuration import ServiceConfiguration
 from .event_logging import setup_logger
-import json
-
-import sys
 from threading import Thread, Lock, Event
+from queue import Empty
 import time
 import os
 
+CONFIGURATION_SNAPSHOT_FILE = "service_configuration_snapshot.json"
+STATISTICS_LOG_INTERVAL = 60.0  # Seconds between logs of continuously changing statistics
+
 class iIOTService(ABC):
     """
     Abstract base class for IoT services.
@@ -59,93 +87,173 @@ class IOTService(iIOTService):
     Implements the core IoT data collection service logic.
     Manages MQTT collectors, SQL interactions, and threaded execution of service and data collection.
     """
-    def __init__(self):
+    def __init__(self, shard_index: int = 0, shard_count: int = 1, command_queue=None):
         """
         Constructor that initializes the IoT service.
         Sets up logger, database connection, reads configuration,
         creates collectors, and prepares background threads.
+
+        When run as a shard worker, only topics with topic_shard(topic) == shard_index
+        are collected and commands are read from command_queue instead of SQL.
         """
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self._command_queue = command_queue
+
         # Create folder structure
         self._create_folder_structure()
 
         # Create datalog
         self.logger = setup_logger("IOT Service Log", "iot_service_logs/log")
 
-        # Define SQL client
-        self.sql_client = MySqlClient()
+        # Read service configuration
+        self.service_configuration = ServiceConfiguration().load()
+
+        # Define SQL client (writer workers with own connections, separate control connection)
+        if self.service_configuration.sql_writer_workers > 0:
+            self.sql_client = MySqlPoolClient(writer_workers=self.service_configuration.sql_writer_workers,
+                                              statement_reuse=self.service_configuration.sql_statement_reuse)
+        else:
+            self.sql_client = MySqlClient(statement_reuse=self.service_configuration.sql_statement_reuse)
 
         # Define SQL service
-        self.sql_service = SQLService(sql_client=self.sql_client)
+        self.sql_service = SQLService(sql_client=self.sql_client,
+                                      device_timestamps=self.service_configuration.device_timestamps)
 
-        try:
-            self.sql_service.connect_service()
-            self.logger.info(f"Connecting to SQL server!")
-        except:
-            self.logger.info(f"Connecting to SQL failed! Stopping program execution")
-            sys.exit(1)
+        self._sql_connected = False
 
-        self.logger.info(f"Connected to sql!")
+        # Start from the local configuration snapshot if there is one, SQL is connected in the background.
+        # Without a snapshot wait for the SQL server instead of exiting, it is needed for the configuration.
+        snapshot = None
+        if self.service_configuration.config_snapshot_enabled:
+            snapshot = ConfigurationSnapshot.load(f"{SNAPSHOT_PATH}{CONFIGURATION_SNAPSHOT_FILE}")
+        if snapshot is None:
+            self._connect_sql()
+            snapshot = self._read_configuration_snapshot()
+        else:
+            self.logger.info(f"Starting from configuration snapshot {snapshot.version[:12]}, "
+                             f"saved {time.ctime(snapshot.saved)}")
 
-        self.collector_configuration = self.sql_service.read_iot_configuration()
-        self.device_configuration = self.sql_service.read_device_configuration()
-        self.topic_configuration = self.sql_service.read_topic_configuration()
+        self.logger.info(f"Service instance: {self.service_configuration.instance_id}, "
+                         f"shared subscription group: {self.service_configuration.shared_subscription_group or '-'}")
 
-        self.collector_service = DataCollectorService()
-        for collector_conf in self.collector_configuration:
-            for device_conf in self.device_configuration:
-                current_collector_topic_configuration = []
-                for i in self.topic_configuration:
-                    if i["iot_configuration"] == collector_conf.configuration_id and i["device_id"] == device_conf.device_id:
-                        current_collector_topic_configuration.append(i)
-                collector = MqttDataCollector(MqttClientPaho())
-                collector.set_configuration(collector_conf, current_collector_topic_configuration, device_conf)
-                self.collector_service.add_collector(collector)
+        self.parameter_cache = ParameterCache(sql_service=self.sql_service,
+                                              max_entries=self.service_configuration.parameter_cache_size)
+
+        # With several instances, only the lease holder processes commands
+        self.leader_lease = None
+        if self.service_configuration.leader_election and command_queue is None:
+            self.leader_lease = LeaderLease(
+                sql_service=self.sql_service,
+                instance_id=self.service_configuration.instance_id,
+                lease_duration=self.service_configuration.leader_lease_duration,
+                renew_interval=self.service_configuration.leader_lease_renew_interval,
+                logger=self.logger)
+
+        self.command_poller = CommandPoller(
+            sql_service=self.sql_service,
+            min_interval=self.service_configuration.command_poll_min_interval,
+            max_interval=self.service_configuration.command_poll_max_interval,
+            version_check=self.service_configuration.command_version_check,
+            broadcast_delay=self.service_configuration.command_broadcast_delay
+            if self.service_configuration.leader_election else 0.0)
+
+        self.configuration_version = snapshot.version
+        self.collector_configuration = snapshot.collector_configuration
+        self.device_configuration = snapshot.device_configuration
+        self.topic_configuration = self._shard_topics(snapshot.topic_configuration)
+        self.topic_router = TopicRouter(self.topic_configuration)
+        self.codec_registry = CodecRegistry(self.topic_configuration)
+        self.schema_registry = SchemaRegistry(self.topic_configuration, logger=self.logger)
+        self.deduplicator = MessageDeduplicator(max_entries=self.service_configuration.dedupe_cache_size)
+        self.compressor = None
+        if self.service_configuration.measurement_compression:
+            self.compressor = MeasurementCompressor(logger=self.logger)
+        self.ingest_pipeline = IngestPipeline(self.topic_router, self.codec_registry, self.schema_registry,
+                                              self.deduplicator, self.compressor)
+        if self._sql_connected:
+            self._read_compression_configuration()
+
+        self.collector_service = DataCollectorService(ingest_queue_size=self.service_configuration.ingest_queue_size)
+        self._create_collectors()
 
         self._stop_event = Event()
         self._mutex = Lock()
+        self._dropped_count = 0
+        self._unknown_field_count = 0
+        self._duplicate_count = 0
+        self._compression_logged = time.monotonic()
+        self._compression_unmatched = []
+        self._rollup_logged = 0.0
+
+        # Define local spool for measurements the database can not take right now
+        sql_lock = None if isinstance(self.sql_client, MySqlPoolClient) else self._mutex
+        self.measurement_spool = None
+        self.spool_replayer = None
+        if self.service_configuration.spool_enabled:
+            spool_name = f"measurement_spool_{shard_index}.db" if shard_count > 1 else "measurement_spool.db"
+            self.measurement_spool = MeasurementSpool(path=f"{SPOOL_PATH}{spool_name}")
+            self.spool_replayer = SpoolReplayer(
+                spool=self.measurement_spool,
+                sql_service=self.sql_service,
+                replay_batch_size=self.service_configuration.spool_replay_batch_size,
+                lock=sql_lock,
+                logger=self.logger)
+
+        # Define measurement writer
+        self.measurement_writer = BatchMeasurementWriter(
+            sql_service=self.sql_service,
+            max_batch_size=self.service_configuration.measurement_batch_size,
+            max_batch_latency=self.service_configuration.measurement_batch_latency,
+            lock=sql_lock,
+            logger=self.logger,
+            spool=self.measurement_spool,
+            spool_backlog=self.service_configuration.spool_backlog)
+
+        # Define window rollups of measurement series
+        self.measurement_rollup = None
+        if self.service_configuration.rollup_intervals:
+            self.measurement_rollup = MeasurementRollup(
+                sql_service=self.sql_service,
+                intervals=parse_rollup_intervals(self.service_configuration.rollup_intervals),
+                close_delay=self.service_configuration.rollup_close_delay,
+                lock=sql_lock,
+                logger=self.logger)
+
         #self._data_publish_thread = Thread(target=self._data_publish_thread_fun) # Začasno zakomentirano ker se ne rabi
         self._measurement_collection_thread = Thread(target=self._measurement_collection_thread_fun)
         self._service_main_thread = Thread(target=self._service_main_thread_fun)
 
     def service_run(self):
         """
-        Starts the main service thread.
+        Starts the measurement writer, the spool replayer and the main service thread.
         """
+        self.measurement_writer.start_writer()
+        if self.spool_replayer is not None and self._sql_connected:
+            self.spool_replayer.start_replayer()
         self._service_main_thread.start()
 
     def _measurement_collection_thread_fun(self):
         """
         Thread function that continuously collects and stores measurements from MQTT.
-        Parses data and writes measurements to the SQL database.
+        Parses data and passes measurements to the batching measurement writer.
         Suspends collection on stop signal.
         """
-        self.collector_service.start_collection()
         stop_flag = False
         while 1:
             if not self._stop_event.is_set():
                 stop_flag = False
-                data_packet = self.collector_service.get_data()
-                if data_packet:
+                try:
+                    data_packet = self.collector_service.get_data()
+                    batch = MeasurementBatch()
                     for response in data_packet:
-                        topic = response["topic"]
-                        data = json.loads(response["data"])
-                        # Assign measurement to device
-                        for i in self.topic_configuration:
-                            if i["topic"] == topic:
-                                if i["topic_type"] == 1:  # Measurement
-                                    measurement = {"device_id": i["device_id"], "topic_id": i["topic_id"]}
-                                    # Parse measurement packet
-                                    for m in data:
-                                        if m != "timestamp":  # TMP: Začasna rešitev, dodelati naprave da pošljejo zraven timestmp
-                                            measurement["measurement_type_id"] = m
-                                            measurement["value"] = data[m]
-                                            print(measurement)
-
-                                            self._mutex.acquire()
-                                            try:
-                                                self.sql_service.write_measurement_to_sql(measurement)
-                                            finally:
-                                                self._mutex.release()
+                        self.ingest_pipeline.process_packet(response, batch)
+                    if self.measurement_rollup is not None:
+                        self.measurement_rollup.add(batch)
+                    self.measurement_writer.write_measurements(self.ingest_pipeline.compress(batch))
+                except Exception as error:
+                    # A single bad packet must not stop the collection
+                    self.logger.error(f"Failed to process received messages: {error}")
             else:
                 if not stop_flag:
                     stop_flag = True
@@ -158,90 +266,352 @@ class IOTService(iIOTService):
         Thread function that continuously reads and processes control commands from SQL.
         Supports commands like start, stop, write parameters, and reload configuration.
         """
+        # Collectors are started here, so that configuration reloads never race with their start
+        self.collector_service.start_collection()
         self._measurement_collection_thread.start()
 
+        if not self._sql_connected:
+            # Started from the configuration snapshot, connect to SQL and refresh the configuration now
+            self._connect_sql()
+            if self.spool_replayer is not None:
+                self.spool_replayer.start_replayer()
+            with self._mutex:
+                self._cmd_get_new_configuration()
+
         try:
             while 1:
-                self._mutex.acquire()
                 try:
-                    # Get service commands
-                    cmds = self.sql_service.read_cmd_from_sql()
-                    # Service all recevied commands
-                    for cmd in cmds:
-                        if cmd["flag"] == 1:
-                            if cmd["cmd_type"] == 100:  # CMD: Write parameters
-                                self._cmd_write_parameters(cmd)
-                                #self.sql_service.reset_cmd_flag(cmd["id"])
-                            elif cmd["cmd_type"] == 0:  # CMD: Start service
-                                self.collector_service.resume_collection()
-                                self._stop_event.clear()
-                                #self.sql_service.reset_cmd_flag(cmd["id"])
-                            elif cmd["cmd_type"] == 1:  # CMD: Stop service
-                                self._stop_event.set()
-                                self.sql_service.reset_cmd_flag(cmd["id"])
-                                #self._measurement_collection_thread.join()
-                            elif cmd["cmd_type"] == 5:  # CMD: Get new configuration
-                                # Transfer new configuraiont
-                                self._cmd_get_new_configuration()
-
-                            self.sql_service.reset_cmd_flag(cmd["id"])
-                finally:
-                    self._mutex.release()
-                time.sleep(1)
+                    if self._command_queue is None:
+                        self._mutex.acquire()
+                        try:
+                            # Get changed service commands, side effecting ones only while leading
+                            leader = self.leader_lease is None or self.leader_lease.is_leader()
+                            cmds, reset_ids = self.command_poller.poll_instance(leader)
+                            # Service all recevied commands
+                            self._handle_commands(cmds)
+                            for cmd_id in reset_ids:
+                                self.sql_service.reset_cmd_flag(cmd_id)
+                        finally:
+                            self._mutex.release()
+                    else:
+                        # Shard worker: commands are forwarded by the supervisor
+                        cmds = self._get_forwarded_commands(timeout=1)
+                        self._mutex.acquire()
+                        try:
+                            self._handle_commands(cmds)
+                        finally:
+                            self._mutex.release()
+                    self._log_dropped_messages(self.collector_service.get_dropped_messages())
+                    self._log_unknown_fields()
+                    self._log_duplicates()
+                    self._log_compression()
+                    if self.measurement_rollup is not None:
+                        self.measurement_rollup.flush()
+                        self._log_rollups()
+                    if self._command_queue is None:
+                        time.sleep(self.command_poller.interval)
+                except Exception as error:
+                    self.logger.error(f"Command loop error: {error}")
+                    time.sleep(self.command_poller.interval)
 
         except KeyboardInterrupt:
             print('Service interrupted')
             self.collector_service.stop_collection()
+            self.measurement_writer.stop_writer()
+            if self.measurement_rollup is not None:
+                # Partial windows are merged with the rest of the window after a restart
+                self.measurement_rollup.flush(close_all=True)
+            if self.spool_replayer is not None:
+                self.spool_replayer.stop_replayer()
+            if self.leader_lease is not None:
+                self.leader_lease.release()
             self.sql_client.disconnect_sql()
             self._measurement_collection_thread.join()
             self._service_main_thread.join()
 
+    def _handle_commands(self, cmds: list):
+        """
+        Executes service commands, logging the ones that fail.
+        """
+        for cmd in cmds:
+            try:
+                self._handle_command(cmd)
+            except Exception as error:
+                # The flag is reset anyway, so a bad command row is not executed again and again
+                self.logger.error(f"Failed to execute command {cmd.get('id')}: {error}")
+
+    def _handle_command(self, cmd):
+        """
+        Executes a single service command.
+        """
+        if cmd["cmd_type"] == 100:  # CMD: Write parameters
+            self._cmd_write_parameters(cmd)
+        elif cmd["cmd_type"] == 101:  # CMD: Write parameters to a device group or the fleet
+            self._cmd_write_group_parameters(cmd)
+        elif cmd["cmd_type"] == 0:  # CMD: Start service
+            self.collector_service.resume_collection()
+            self._stop_event.clear()
+        elif cmd["cmd_type"] == 1:  # CMD: Stop service
+            self._stop_event.set()
+            #self._measurement_collection_thread.join()
+        elif cmd["cmd_type"] == 5:  # CMD: Get new configuration
+            # Transfer new configuraiont
+            self._cmd_get_new_configuration()
+
+    def _get_forwarded_commands(self, timeout: float) -> list:
+        """
+        Waits up to timeout for commands forwarded by the shard supervisor.
+        """
+        cmds = []
+        try:
+            cmds.append(self._command_queue.get(timeout=timeout))
+            while 1:
+                cmds.append(self._command_queue.get_nowait())
+        except Empty:
+            pass
+        return cmds
+
+    def _connect_sql(self):
+        """
+        Connects to the SQL server, retrying with backoff until it is reachable.
+        """
+        retry_interval = self.service_configuration.sql_connect_retry_interval
+        while 1:
+            try:
+                self.logger.info(f"Connecting to SQL server!")
+                self.sql_service.connect_service()
+                break
+            except:
+                self.logger.info(f"Connecting to SQL failed! Retrying in {retry_interval:.0f} s")
+                time.sleep(retry_interval)
+                retry_interval = min(retry_interval * 2, 60.0)
+
+        self._sql_connected = True
+        self.logger.info(f"Connected to sql!")
+
+    def _read_configuration_snapshot(self) -> ConfigurationSnapshot:
+        """
+        Reads the complete configuration from SQL in one round trip and saves it as the local snapshot.
+        An empty result (e.g. a failed read) never replaces the last saved snapshot.
+        """
+        snapshot = self.sql_service.read_service_configuration()
+        if self.service_configuration.config_snapshot_enabled and snapshot.rows:
+            try:
+                snapshot.save(f"{SNAPSHOT_PATH}{CONFIGURATION_SNAPSHOT_FILE}")
+            except OSError as error:
+                self.logger.warning(f"Saving configuration snapshot failed: {error}")
+        return snapshot
+
+    def _read_compression_configuration(self):
+        """
+        Reads the compression settings of measurement series from SQL.
+        A failed read keeps the current settings.
+        """
+        if self.compressor is None:
+            return
+        try:
+            compression_configuration = self.sql_service.read_compression_configuration()
+        except Exception as error:
+            self.logger.error(f"Reading compression configuration failed, keeping the current one: {error}")
+            return
+        self.compressor.rebuild(compression_configuration)
+        # Give the new series a full statistics interval to receive measurements
+        self._compression_logged = time.monotonic()
+        self._compression_unmatched = []
+        self.logger.info(f"Compression configured for {len(self.compressor)} measurement series")
+
+    def _shard_topics(self, topic_configuration: list) -> list:
+        """
+        Keeps only the topics owned by this shard.
+        """
+        if self.shard_count > 1:
+            topic_configuration = [i for i in topic_configuration
+                                   if topic_shard(i["topic"], self.shard_count) == self.shard_index]
+        return topic_configuration
+
+    def _log_dropped_messages(self, dropped_per_topic: dict):
+        """
+        Logs per-topic drop counters of the ingest queues whenever new messages were dropped.
+        """
+        dropped_count = sum(dropped_per_topic.values())
+        if dropped_count != self._dropped_count:
+            self._dropped_count = dropped_count
+            self.logger.warning(f"Ingest queue overflow, dropped messages per topic: {dropped_per_topic}")
+
+    def _log_duplicates(self):
+        """
+        Logs the deduplication statistics whenever new redelivered messages were dropped.
+        """
+        if self.deduplicator.hit_count != self._duplicate_count:
+            self._duplicate_count = self.deduplicator.hit_count
+            self.logger.info(f"Dropped redelivered messages, {self.deduplicator.statistics()}")
+
+    def _log_compression(self):
+        """
+        Logs the compression statistics at most every STATISTICS_LOG_INTERVAL seconds.
+        Warns about configured series that did not receive a measurement in that time.
+        """
+        if self.compressor is None or not len(self.compressor):
+            return
+        now = time.monotonic()
+        if now - self._compression_logged < STATISTICS_LOG_INTERVAL:
+            return
+        self._compression_logged = now
+        if self.compressor.received_count:
+            self.logger.info(f"Measurement compression {self.compressor.statistics()}")
+        unmatched = self.compressor.unmatched_series()
+        if unmatched and unmatched != self._compression_unmatched:
+            self.logger.warning(f"No measurements received for {len(unmatched)} compressed series (topic id, "
+                                f"measurement type id): {unmatched[:10]}")
+        self._compression_unmatched = unmatched
+
+    def _log_rollups(self):
+        """
+        Logs the rollup statistics at most every STATISTICS_LOG_INTERVAL seconds.
+        """
+        if self.measurement_rollup is None or not self.measurement_rollup.written_count:
+            return
+        now = time.monotonic()
+        if now - self._rollup_logged >= STATISTICS_LOG_INTERVAL:
+            self._rollup_logged = now
+            self.logger.info(f"Measurement rollups {self.measurement_rollup.statistics()}")
+
+    def _log_unknown_fields(self):
+        """
+        Logs per-topic counters of payload fields missing from the topic schemas whenever new ones were received.
+        """
+        unknown_per_topic = dict(self.ingest_pipeline.unknown_field_count)
+        unknown_count = sum(unknown_per_topic.values())
+        if unknown_count != self._unknown_field_count:
+            self._unknown_field_count = unknown_count
+            self.logger.warning(f"Fields not in the payload schema, ignored fields per topic: {unknown_per_topic}")
+
     def _cmd_write_parameters(self, cmd):
         """
         Handles the command to write device parameters.
         Publishes parameter packets via MQTT to respective topics.
         """
-        # Get parameters from SQL
-        parameters = self.sql_service.read_parameters_from_sql(cmd["device_id"])
+        # Get parameters from the cache or SQL
+        try:
+            parameters = self.parameter_cache.get_device_parameters(cmd["device_id"])
+        except Exception as error:
+            self.logger.error(f"Reading parameters of device {cmd['device_id']} failed: {error}")
+            return
+        self._publish_parameters(parameters)
 
-        # Get list of all topics in parameters
-        topic_list = list(set([d["topic"] for d in parameters if "topic" in d]))
+    def _cmd_write_group_parameters(self, cmd):
+        """
+        Handles the command to write the parameters of all devices of a device group,
+        or of the whole fleet when the command has no device group.
+        """
+        group_id = cmd.get("device_group_id")
+        try:
+            parameters = self.parameter_cache.get_device_group_parameters(group_id)
+        except Exception as error:
+            self.logger.error(f"Reading parameters of device group {group_id or 'fleet'} failed: {error}")
+            return
+        count = self._publish_parameters(parameters)
+        self.logger.info(f"Queued {count} parameter packets for device group {group_id or 'fleet'}")
+        self.logger.info(f"Parameter cache {self.parameter_cache.statistics()}")
 
-        # Build data packets for each topic
-        for t in topic_list:
-            parameter_for_topic = list(filter(lambda par: par["topic"] == t, parameters))
-            data = {}
-            for param in parameter_for_topic:
-                data[param["param_name"]] = param["value"]
-            data_packet = {
-                "topic": t,
-                "data": data
-            }
-            self.collector_service.publish_data(data_packet)
+    def _publish_parameters(self, parameters: list) -> int:
+        """
+        Groups parameters into one packet per topic and queues them on the outbound publishers.
+        Queuing does not block, packets are published at the configured rate per broker.
+        Returns the number of queued packets.
+        """
+        count = 0
+        for topic, data in group_parameter_packets(parameters).items():
+            # Every shard receives the command, only the owner of a topic publishes to it
+            if self.shard_count > 1 and topic_shard(topic, self.shard_count) != self.shard_index:
+                continue
+            if self.collector_service.publish_data({"topic": topic, "data": data}):
+                count += 1
+        return count
 
     def _cmd_get_new_configuration(self):
         """
         Handles the command to reload the IoT configuration from SQL.
-        Stops current collection, creates new collectors, and resumes collection.
+        Applies only the differences: collectors of removed or changed brokers are stopped,
+        new brokers get new collectors, and running collectors (un)subscribe only changed topics.
         """
         print("Getting new configuration")
-        self.collector_configuration = self.sql_service.read_iot_configuration()
-        self.device_configuration = self.sql_service.read_device_configuration()
-        self.topic_configuration = self.sql_service.read_topic_configuration()
+        snapshot = self._read_configuration_snapshot()
+        self._read_compression_configuration()
+        if not snapshot.rows and self.topic_configuration:
+            self.logger.warning("SQL returned an empty configuration, keeping the current one")
+            return
+        if snapshot.version == self.configuration_version:
+            self.logger.info(f"Configuration {snapshot.version[:12]} unchanged")
+            return
+
+        self.configuration_version = snapshot.version
+        self.collector_configuration = snapshot.collector_configuration
+        self.device_configuration = snapshot.device_configuration
+        self.topic_configuration = self._shard_topics(snapshot.topic_configuration)
 
-        self.collector_service.stop_collection()
+        # Route new topics before they are subscribed
+        self.codec_registry.rebuild(self.topic_configuration)
+        self.schema_registry.rebuild(self.topic_configuration)
+        self.topic_router.rebuild(self.topic_configuration)
+
+        new_configuration = {conf.configuration_id: conf for conf in self.collector_configuration}
+        current_collectors = {}
+        for collector in list(self.collector_service.collectors_list):
+            conf = new_configuration.get(collector.collector_configuration.configuration_id)
+            if conf is None or conf.connection_settings() != collector.collector_configuration.connection_settings():
+                self.collector_service.remove_collector(collector)
+            else:
+                collector.collector_configuration = conf
+                current_collectors[conf.configuration_id] = collector
 
-        # Create new data collectors
         for collector_conf in self.collector_configuration:
-            current_collector_topic_configuration = []
-            for i in self.topic_configuration:
-                if i["iot_configuration"] == collector_conf.configuration_id:
-                    current_collector_topic_configuration.append(i)
-            collector = MqttDataCollector(MqttClientPaho())
-            collector.set_configuration(collector_conf, current_collector_topic_configuration)
+            topic_configuration, devices = self._collector_configuration(collector_conf)
+            collector = current_collectors.get(collector_conf.configuration_id)
+            if collector is not None:
+                self.collector_service.update_collector(collector, topic_configuration, devices)
+                continue
+
+            collector = self._create_collector(collector_conf, topic_configuration, devices)
             self.collector_service.add_collector(collector)
+            self.collector_service.start_collector(collector)
+            if self.collector_service.collection_held:
+                collector.unsubscribe_all_topic()
 
-        self.collector_service.start_collection()
+    def _create_collectors(self):
+        """
+        Creates one MQTT collector (and connection) per broker configuration,
+        serving the topics of all devices on that broker.
+        """
+        for collector_conf in self.collector_configuration:
+            topic_configuration, devices = self._collector_configuration(collector_conf)
+            self.collector_service.add_collector(self._create_collector(collector_conf, topic_configuration, devices))
+
+    def _collector_configuration(self, collector_conf: CollectorConfiguration):
+        """
+        Returns the topics and DeviceConfiguration objects served by the collector of a broker.
+        """
+        topic_configuration = [i for i in self.topic_configuration
+                               if i["iot_configuration"] == collector_conf.configuration_id]
+        device_ids = set(i["device_id"] for i in topic_configuration)
+        devices = [d for d in self.device_configuration if d.device_id in device_ids]
+        return topic_configuration, devices
+
+    def _create_collector(self, collector_conf: CollectorConfiguration, topic_configuration: list,
+                          devices: list) -> MqttDataCollector:
+        """
+        Creates the MQTT collector of a broker.
+        """
+        collector = MqttDataCollector(
+            MqttClientPaho(queue_size=self.service_configuration.mqtt_queue_size,
+                           overflow_policy=self.service_configuration.mqtt_overflow_policy,
+                           instance_id=self.service_configuration.instance_id),
+            shared_subscription_group=self.service_configuration.shared_subscription_group,
+            publish_rate=self.service_configuration.publish_rate,
+            publish_max_in_flight=self.service_configuration.publish_max_in_flight,
+            logger=self.logger)
+        collector.set_configuration(collector_conf, topic_configuration, devices)
+        return collector
 
     def _create_folder_structure(self):
         """
@@ -0,0 +1,106 @@
+"""
+===============================================================================
+Module: leader_election.py
+Description:
+    This module implements the `LeaderLease` class, a SQL lease based leader
+    election for running several service instances side by side.
+
+    Only the leader executes side effecting service commands, so a command
+    (e.g. publishing parameters) is executed once per deployment. Start,
+    stop and configuration reloads are executed by every instance (see
+    `CommandPoller.poll_instance`). All instances keep ingesting.
+
+    The lease is a row in SQL, handled by two stored procedures:
+    - `AcquireServiceLease(lease_name, holder, lease_seconds)` atomically
+      takes the lease if it is free, expired or already held by `holder`,
+      extends it to NOW() + lease_seconds, and returns the current lease row
+      (`holder`, `expires`).
+    - `ReleaseServiceLease(lease_name, holder)` clears the lease if it is
+      held by `holder`, so another instance can take over right away.
+
+    Timing bounds, with lease duration D and renew interval R (R < D):
+    - The leader renews every R and considers itself leader only until
+      D - R after the start of its last successful renewal, so it steps
+      down before the lease can expire in SQL.
+    - A follower retries every R, so after a leader dies or loses the
+      database, another instance takes over within D + R.
+
+Dependencies:
+    - sql_service.py (SQLService)
+    - Standard libraries: `time`, `os`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from .sql_service import SQLService
+
+import time
+import os
+
+SERVICE_LEASE_NAME = "iot_service_commands"
+
+
+class LeaderLease:
+    """
+    Holds or waits for the command processing lease of a service deployment.
+    """
+
+    def __init__(self, sql_service: SQLService, instance_id: str, lease_duration: float = 15.0,
+                 renew_interval: float = 5.0, lease_name: str = SERVICE_LEASE_NAME, logger=None):
+        if renew_interval >= lease_duration:
+            raise ValueError("Lease renew interval must be shorter than the lease duration")
+
+        self.sql_service = sql_service
+        self.holder = f"{instance_id}-{os.getpid()}"
+        self.lease_duration = lease_duration
+        self.renew_interval = renew_interval
+        self.lease_name = lease_name
+
+        self._logger = logger
+        self._leader = False
+        self._valid_until = 0.0
+        self._next_attempt = 0.0
+
+    def is_leader(self) -> bool:
+        """
+        Return True while this instance holds the lease, renewing or acquiring it when due.
+        Performs at most one SQL call per renew interval.
+        """
+        now = time.monotonic()
+        if now >= self._next_attempt:
+            self._next_attempt = now + self.renew_interval
+            try:
+                lease = self.sql_service.acquire_service_lease(self.lease_name, self.holder,
+                                                               int(self.lease_duration))
+                if lease and lease[0]["holder"] == self.holder:
+                    self._valid_until = now + self.lease_duration - self.renew_interval
+                else:
+                    self._valid_until = 0.0
+            except Exception as error:
+                if self._logger:
+                    self._logger.warning(f"Renewing service lease failed: {error}")
+
+        leader = time.monotonic() < self._valid_until
+        if leader != self._leader:
+            self._leader = leader
+            message = "Acquired service lease, processing commands" if leader \
+                else "Lost service lease, command processing stopped"
+            print(message)
+            if self._logger:
+                self._logger.info(f"{message} (holder {self.holder})")
+        return leader
+
+    def release(self):
+        """
+        Give up the lease, if held, so another instance can take over without waiting for it to expire.
+        """
+        if not self._leader:
+            return
+        self._leader = False
+        self._valid_until = 0.0
+        try:
+            self.sql_service.release_service_lease(self.lease_name, self.holder)
+        except Exception as error:
+            if self._logger:
+                self._logger.warning(f"Releasing service lease failed: {error}")
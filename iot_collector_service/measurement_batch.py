@@ -0,0 +1,119 @@
+"""
+===============================================================================
+Module: measurement_batch.py
+Description:
+    This module defines the measurement types passed from the ingest
+    pipeline through the measurement writer and the spool to the SQL
+    service.
+
+    - `Measurement` is a compact record of a single measurement with
+      `__slots__` instead of a per-instance dict.
+    - `MeasurementBatch` stores many measurements column-wise in parallel
+      `array` columns (ids, values, timestamps). Appending a measurement
+      stores its numbers unboxed in the column buffers instead of
+      allocating a dict (or record) per value, and merging batches copies
+      whole column buffers.
+
+    Each measurement carries two times: `received`, the time the service
+    processed the packet, and `timestamp`, the time the device took the
+    measurement (the received time for devices that send no timestamp).
+
+    Measurement type ids are integers for topics with a payload schema and
+    field names of the device payloads otherwise, so they are kept in a
+    list column.
+
+Dependencies:
+    - Standard libraries: `array`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from array import array
+
+
+class Measurement:
+    """
+    Single measurement record.
+    """
+    __slots__ = ("device_id", "topic_id", "measurement_type_id", "value", "received", "timestamp")
+
+    def __init__(self, device_id: int, topic_id: int, measurement_type_id, value: float, received: float,
+                 timestamp: float = None):
+        self.device_id = device_id
+        self.topic_id = topic_id
+        self.measurement_type_id = measurement_type_id
+        self.value = value
+        self.received = received
+        self.timestamp = received if timestamp is None else timestamp
+
+    def __repr__(self):
+        return f"Measurement(device_id={self.device_id}, topic_id={self.topic_id}, " \
+               f"measurement_type_id={self.measurement_type_id!r}, value={self.value}, received={self.received}, " \
+               f"timestamp={self.timestamp})"
+
+
+class MeasurementBatch:
+    """
+    Column-wise batch of measurements.
+    """
+    __slots__ = ("device_id", "topic_id", "measurement_type_id", "value", "received", "timestamp")
+
+    def __init__(self):
+        self.device_id = array("q")
+        self.topic_id = array("q")
+        self.measurement_type_id = []
+        self.value = array("d")
+        self.received = array("d")
+        self.timestamp = array("d")
+
+    def __len__(self):
+        return len(self.value)
+
+    def __iter__(self):
+        """
+        Iterate over the batch as Measurement records.
+        """
+        for row in self.rows():
+            yield Measurement(*row)
+
+    def append(self, device_id: int, topic_id: int, measurement_type_id, value: float, received: float,
+               timestamp: float):
+        self.device_id.append(device_id)
+        self.topic_id.append(topic_id)
+        self.measurement_type_id.append(measurement_type_id)
+        self.value.append(value)
+        self.received.append(received)
+        self.timestamp.append(timestamp)
+
+    def append_measurement(self, measurement: Measurement):
+        self.append(measurement.device_id, measurement.topic_id, measurement.measurement_type_id,
+                    measurement.value, measurement.received, measurement.timestamp)
+
+    def extend(self, batch: "MeasurementBatch"):
+        """
+        Append all measurements of another batch.
+        """
+        self.device_id.extend(batch.device_id)
+        self.topic_id.extend(batch.topic_id)
+        self.measurement_type_id.extend(batch.measurement_type_id)
+        self.value.extend(batch.value)
+        self.received.extend(batch.received)
+        self.timestamp.extend(batch.timestamp)
+
+    def rows(self, *columns: str):
+        """
+        Return an iterator of row tuples over the given columns (all columns if none are given).
+        """
+        columns = columns or self.__slots__
+        return zip(*(getattr(self, column) for column in columns))
+
+    @classmethod
+    def from_rows(cls, rows) -> "MeasurementBatch":
+        """
+        Build a batch from (device_id, topic_id, measurement_type_id, value, received, timestamp) rows.
+        """
+        batch = cls()
+        for row in rows:
+            batch.append(*row)
+        return batch
@@ -0,0 +1,248 @@
+"""
+===============================================================================
+Module: measurement_compression.py
+Description:
+    This module implements the optional compression stage of the ingest
+    pipeline. Measurement series (topic, measurement type) of slowly
+    changing sensors are thinned out before they are written to SQL:
+
+    - `DeadbandFilter` stores a value only when it differs from the last
+      stored value by more than the deviation.
+    - `SwingingDoorFilter` (swinging door trending) stores the values
+      needed to reconstruct the series by linear interpolation: a value is
+      stored only when no straight line from the last stored value passes
+      within the deviation of all values since (the door closed). Stored
+      values are measured values, so values between two stored ones are
+      within twice the deviation of their interpolation.
+
+    Both filters store a value at least every `max_interval` seconds
+    (heartbeat), so a flat series still shows the sensor is alive. The
+    deviation is absolute (`deviation`) or relative to the last stored
+    value (`deviation_percent`); when both are set, the larger one applies.
+    Series are timed with the device timestamp of the measurements.
+
+    Compression is configured in SQL with the `GetMeasurementCompression`
+    stored procedure, returning one row per compressed series:
+        topic_id, measurement_type_id, compression (deadband, swinging_door),
+        deviation, deviation_percent, max_interval
+    Series without a row are written unchanged. Topics with a payload
+    schema store integer measurement type ids, topics without one store the
+    payload field names, so `measurement_type_id` is the integer id or the
+    field name accordingly (numeric strings are read as ids). Configured
+    series that have not received a measurement are reported by
+    `unmatched_series`, so a misconfigured series does not go unnoticed.
+
+Dependencies:
+    - measurement_batch.py (MeasurementBatch)
+    - Standard libraries: `abc`, `math`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from .measurement_batch import MeasurementBatch
+
+from abc import ABC, abstractmethod
+import math
+
+COMPRESSION_DEADBAND = "deadband"
+COMPRESSION_SWINGING_DOOR = "swinging_door"
+
+# Positions in MeasurementBatch rows
+VALUE = 3
+TIMESTAMP = 5
+
+
+class ICompressionFilter(ABC):
+    __slots__ = ()
+
+    @abstractmethod
+    def add(self, row: tuple, output: MeasurementBatch) -> None:
+        """Take the next measurement row of the series and append the rows to store to output."""
+        pass
+
+    @property
+    @abstractmethod
+    def started(self) -> bool:
+        """True once the filter has taken a measurement."""
+        pass
+
+
+class DeadbandFilter(ICompressionFilter):
+    """
+    Stores a value when it leaves the deadband around the last stored value or max_interval passed.
+    """
+    __slots__ = ("deviation", "deviation_percent", "max_interval", "_value", "_timestamp")
+
+    def __init__(self, deviation: float = 0.0, deviation_percent: float = 0.0, max_interval: float = 0.0):
+        self.deviation = deviation
+        self.deviation_percent = deviation_percent
+        self.max_interval = max_interval
+        self._value = None
+        self._timestamp = None
+
+    def add(self, row: tuple, output: MeasurementBatch):
+        value = row[VALUE]
+        timestamp = row[TIMESTAMP]
+        if self._value is not None:
+            deviation = max(self.deviation, abs(self._value) * self.deviation_percent / 100)
+            if abs(value - self._value) <= deviation and \
+                    not (0 < self.max_interval <= timestamp - self._timestamp):
+                return
+        output.append(*row)
+        self._value = value
+        self._timestamp = timestamp
+
+    @property
+    def started(self) -> bool:
+        return self._value is not None
+
+
+class SwingingDoorFilter(ICompressionFilter):
+    """
+    Swinging door trending: stores the last value inside the door when a new value closes it.
+    """
+    __slots__ = ("deviation", "deviation_percent", "max_interval", "_stored", "_held", "_slope_min", "_slope_max")
+
+    def __init__(self, deviation: float = 0.0, deviation_percent: float = 0.0, max_interval: float = 0.0):
+        self.deviation = deviation
+        self.deviation_percent = deviation_percent
+        self.max_interval = max_interval
+        self._stored = None
+        self._held = None
+        self._slope_min = -math.inf
+        self._slope_max = math.inf
+
+    def add(self, row: tuple, output: MeasurementBatch):
+        stored = self._stored
+        timestamp = row[TIMESTAMP]
+        if stored is None or timestamp <= stored[TIMESTAMP] or \
+                0 < self.max_interval <= timestamp - stored[TIMESTAMP]:
+            # First value, clock went back or heartbeat: store the held and the new value
+            if self._held is not None:
+                output.append(*self._held)
+            output.append(*row)
+            self._store(row)
+            return
+
+        # Door: slopes of lines from the stored value passing within the deviation of all values since
+        deviation = max(self.deviation, abs(stored[VALUE]) * self.deviation_percent / 100)
+        interval = timestamp - stored[TIMESTAMP]
+        slope_min = max(self._slope_min, (row[VALUE] - stored[VALUE] - deviation) / interval)
+        slope_max = min(self._slope_max, (row[VALUE] - stored[VALUE] + deviation) / interval)
+        if slope_min <= slope_max:
+            self._slope_min = slope_min
+            self._slope_max = slope_max
+            self._held = row
+            return
+
+        # Door closed: store the last value inside it and open a new door there
+        output.append(*self._held)
+        self._store(self._held)
+        self.add(row, output)
+
+    @property
+    def started(self) -> bool:
+        return self._stored is not None
+
+    def _store(self, row: tuple):
+        self._stored = row
+        self._held = None
+        self._slope_min = -math.inf
+        self._slope_max = math.inf
+
+
+COMPRESSION_FILTERS = {
+    COMPRESSION_DEADBAND: DeadbandFilter,
+    COMPRESSION_SWINGING_DOOR: SwingingDoorFilter,
+}
+
+
+def series_key(topic_id, measurement_type_id) -> tuple:
+    """
+    Key of a series as it appears in measurement batches: integer topic id and integer measurement type id,
+    or the payload field name for topics without a payload schema.
+    """
+    if isinstance(measurement_type_id, str) and measurement_type_id.strip().isdigit():
+        measurement_type_id = int(measurement_type_id)
+    return int(topic_id), measurement_type_id
+
+
+class MeasurementCompressor:
+    """
+    Compression stage: routes every measurement of a batch to the filter of its series.
+    """
+
+    def __init__(self, compression_configuration=None, logger=None):
+        self.received_count = 0  # Measurements of compressed series taken in
+        self.stored_count = 0    # Measurements of compressed series passed on
+
+        self._logger = logger
+        self._filters = {}
+        if compression_configuration is not None:
+            self.rebuild(compression_configuration)
+
+    def rebuild(self, compression_configuration: list):
+        """
+        Create the filters of all configured series and swap them in atomically.
+        Series start over with their next value.
+        """
+        filters = {}
+        for conf in compression_configuration:
+            compression = (conf.get("compression") or "").lower()
+            if compression not in COMPRESSION_FILTERS:
+                self._warning(f"Unknown compression {compression!r} for topic {conf['topic_id']}, "
+                              f"measurement type {conf['measurement_type_id']}")
+                continue
+            filters[series_key(conf["topic_id"], conf["measurement_type_id"])] = COMPRESSION_FILTERS[compression](
+                deviation=float(conf.get("deviation") or 0.0),
+                deviation_percent=float(conf.get("deviation_percent") or 0.0),
+                max_interval=float(conf.get("max_interval") or 0.0))
+        self._filters = filters
+
+    def compress(self, batch: MeasurementBatch) -> MeasurementBatch:
+        """
+        Return the batch of measurements to store.
+        """
+        filters = self._filters
+        if not filters or not len(batch):
+            return batch
+
+        output = MeasurementBatch()
+        received = 0
+        stored = 0
+        for row in batch.rows():
+            measurement_filter = filters.get((row[1], row[2]))
+            if measurement_filter is None:
+                output.append(*row)
+                continue
+            before = len(output)
+            measurement_filter.add(row, output)
+            received += 1
+            stored += len(output) - before
+        self.received_count += received
+        self.stored_count += stored
+        return output
+
+    def unmatched_series(self) -> list:
+        """
+        Return the configured series (topic_id, measurement_type_id) that have not received a measurement.
+        """
+        return [key for key, measurement_filter in self._filters.items() if not measurement_filter.started]
+
+    @property
+    def compression_ratio(self) -> float:
+        return self.received_count / self.stored_count if self.stored_count else 1.0
+
+    def statistics(self) -> str:
+        return f"series: {len(self._filters)}, received: {self.received_count}, stored: {self.stored_count}, " \
+               f"compression ratio: {self.compression_ratio:.1f}:1"
+
+    def _warning(self, message: str):
+        if self._logger:
+            self._logger.warning(message)
+        else:
+            print(message)
+
+    def __len__(self):
+        return len(self._filters)
@@ -0,0 +1,188 @@
+"""
+===============================================================================
+Module: measurement_rollup.py
+Description:
+    This module implements the `MeasurementRollup` class, which keeps
+    tumbling window aggregates (count, min, max, mean) of every measurement
+    series (topic, measurement type) while measurements stream through the
+    service, and writes the aggregates of closed windows to SQL.
+
+    Long range dashboard queries read the precomputed rollup rows instead of
+    scanning the raw measurements.
+
+    - Windows of every configured interval (e.g. 60 s and 3600 s) are
+      aligned to the epoch and assigned by the measurement timestamp (the
+      device timestamp when the device sends one).
+    - Aggregates are updated in place as batches arrive, before the
+      compression stage, so rollups cover all received values.
+    - A window is closed `close_delay` seconds after its end, which leaves
+      time for measurements still buffered in the ingest queues.
+    - All windows closed since the last flush are written in one bulk
+      write (`InsertMeasurementRollup`, one transaction). Failed rows are
+      kept and written with the next flush.
+    - Late measurements of an already closed window start a new aggregate
+      of that window, which is written with the next flush. The stored
+      procedure merges it with the existing row of the window, so partial
+      windows (late data, service restart) add up correctly.
+
+    Stored procedure arguments (times in seconds since the epoch):
+        InsertMeasurementRollup(interval_seconds, window_start, topic_id,
+                                measurement_type_id, count, min, max, mean)
+
+Dependencies:
+    - sql_service.py (ISQLService)
+    - measurement_batch.py (MeasurementBatch)
+    - Standard libraries: `concurrent.futures`, `threading`, `time`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from .sql_service import ISQLService
+from .measurement_batch import MeasurementBatch
+
+from concurrent.futures import Future
+from threading import Lock
+import time
+
+# Positions in the aggregate of a series
+COUNT = 0
+MIN = 1
+MAX = 2
+SUM = 3
+
+
+def parse_rollup_intervals(intervals: str) -> tuple:
+    """
+    Parse a comma separated list of window lengths in seconds, e.g. "60,3600".
+    """
+    return tuple(sorted({int(interval) for interval in intervals.split(",") if interval.strip()}))
+
+
+class MeasurementRollup:
+    """
+    Tumbling window aggregates of all measurement series, flushed to SQL when windows close.
+    """
+
+    def __init__(self, sql_service: ISQLService, intervals: tuple = (60, 3600), close_delay: float = 10.0,
+                 max_pending_rows: int = 100000, lock: Lock = None, logger=None):
+        if not intervals or min(intervals) <= 0:
+            raise ValueError(f"Invalid rollup intervals: {intervals}")
+        self.sql_service = sql_service
+        self.intervals = tuple(intervals)
+        self.close_delay = close_delay
+        self.max_pending_rows = max_pending_rows
+
+        self.late_count = 0      # Measurements added to windows that were already closed (per interval)
+        self.written_count = 0   # Rollup rows written
+        self.failed_count = 0    # Failed rollup writes
+        self.dropped_count = 0   # Rollup rows dropped after failed writes
+
+        self._lock = lock
+        self._logger = logger
+        self._windows = {}       # (interval, window start) -> {(topic_id, measurement_type_id): aggregate}
+        self._closed_until = {interval: 0.0 for interval in self.intervals}
+        self._pending = []       # Rows of closed windows waiting to be written
+        self._windows_lock = Lock()
+        self._pending_lock = Lock()
+
+    def add(self, batch: MeasurementBatch):
+        """
+        Add the measurements of a batch to the aggregates of their windows.
+        """
+        if not len(batch):
+            return
+        with self._windows_lock:
+            windows = self._windows
+            for interval in self.intervals:
+                closed_until = self._closed_until[interval]
+                current_start = None
+                series = None
+                for topic_id, measurement_type_id, value, timestamp in batch.rows(
+                        "topic_id", "measurement_type_id", "value", "timestamp"):
+                    start = timestamp - timestamp % interval
+                    if start != current_start:
+                        current_start = start
+                        series = windows.get((interval, start))
+                        if series is None:
+                            series = windows[(interval, start)] = {}
+                    if start < closed_until:
+                        self.late_count += 1
+
+                    aggregate = series.get((topic_id, measurement_type_id))
+                    if aggregate is None:
+                        series[(topic_id, measurement_type_id)] = [1, value, value, value]
+                        continue
+                    aggregate[COUNT] += 1
+                    if value < aggregate[MIN]:
+                        aggregate[MIN] = value
+                    elif value > aggregate[MAX]:
+                        aggregate[MAX] = value
+                    aggregate[SUM] += value
+
+    def close_windows(self, now: float = None, close_all: bool = False) -> list:
+        """
+        Remove the windows closed at now (all windows with close_all) and return their rollup rows:
+        (interval, window_start, topic_id, measurement_type_id, count, min, max, mean).
+        """
+        now = time.time() if now is None else now
+        rows = []
+        with self._windows_lock:
+            closed = [key for key in self._windows if close_all or key[1] + key[0] + self.close_delay <= now]
+            for interval, start in closed:
+                for (topic_id, measurement_type_id), aggregate in self._windows.pop((interval, start)).items():
+                    rows.append((interval, start, topic_id, measurement_type_id, aggregate[COUNT],
+                                 aggregate[MIN], aggregate[MAX], aggregate[SUM] / aggregate[COUNT]))
+                self._closed_until[interval] = max(self._closed_until[interval], start + interval)
+        return rows
+
+    def flush(self, close_all: bool = False):
+        """
+        Write the rollup rows of all closed windows (all windows with close_all) to SQL in one bulk write.
+        """
+        rows = self.close_windows(close_all=close_all)
+        with self._pending_lock:
+            if self._pending:
+                rows = self._pending + rows
+                self._pending = []
+        if not rows:
+            return
+
+        if self._lock is not None:
+            self._lock.acquire()
+        try:
+            result = self.sql_service.write_rollups_to_sql(rows)
+        except Exception as error:
+            self._flush_done(rows, error)
+            return
+        finally:
+            if self._lock is not None:
+                self._lock.release()
+
+        if isinstance(result, Future):
+            # Pooled SQL clients write the rows asynchronously
+            result.add_done_callback(lambda f: self._flush_done(rows, f.exception()))
+        else:
+            self._flush_done(rows, None)
+
+    def _flush_done(self, rows: list, error):
+        if error is None:
+            self.written_count += len(rows)
+            return
+
+        self.failed_count += 1
+        if self._logger:
+            self._logger.error(f"Failed to write {len(rows)} rollup rows: {error}")
+        with self._pending_lock:
+            # Keep the newest rows for the next flush
+            self._pending = rows + self._pending
+            if len(self._pending) > self.max_pending_rows:
+                dropped = len(self._pending) - self.max_pending_rows
+                self._pending = self._pending[dropped:]
+                self.dropped_count += dropped
+
+    def statistics(self) -> str:
+        return f"intervals: {','.join(str(interval) for interval in self.intervals)} s, " \
+               f"open windows: {len(self._windows)}, written rows: {self.written_count}, " \
+               f"late measurements: {self.late_count}, failed writes: {self.failed_count}, " \
+               f"dropped rows: {self.dropped_count}"
@@ -0,0 +1,248 @@
+"""
+===============================================================================
+Module: measurement_spool.py
+Description:
+    This module implements a durable local spool for measurements that can
+    not be written to SQL right away, and a background replayer that drains
+    it once the database is reachable again.
+
+    - `MeasurementSpool` is an append-only table in an embedded SQLite
+      database in WAL mode. Each appended batch is one transaction, so the
+      spool pays one fsync per batch instead of one per measurement.
+      Measurements are deduplicated on (topic, measurement type, received
+      time), so a batch spooled twice is stored once.
+    - `SpoolReplayer` reads the spool in insertion order and writes it to
+      SQL in bulk, removing rows only after the write was committed.
+      Replayed measurements are always inserted with their original time
+      (`InsertMeasurementAt`), so an outage does not move its data to the
+      time of the recovery.
+
+    Rows that can never be written must not block the spool, as new
+    measurements are spooled behind them. When a replay batch fails while
+    the database is reachable, its rows are replayed one by one, and rows
+    the database rejects (e.g. unknown measurement type, foreign key) are
+    moved to the `measurement_dead_letter` table with the error. So are
+    rows that can not be read back, e.g. a NaN value SQLite stored as NULL.
+    Connection errors keep the rows and the replayer backs off.
+
+    With a pooled SQL client several batches are written at once, so a
+    batch that failed may be spooled after newer batches were committed.
+    Measurements then reach SQL out of insertion order, but they keep their
+    own times.
+
+Dependencies:
+    - sql_service.py (ISQLService)
+    - sql_client.py (is_connection_error)
+    - measurement_batch.py (MeasurementBatch)
+    - Standard libraries: `sqlite3`, `threading`, `concurrent.futures`, `os`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from .sql_service import ISQLService
+from .sql_client import is_connection_error
+from .measurement_batch import MeasurementBatch
+
+from concurrent.futures import Future
+from threading import Thread, Event, Lock
+import sqlite3
+import os
+
+SPOOL_PATH = "collector_data/spool/"
+
+
+class MeasurementSpool:
+    """
+    SQLite (WAL mode) backed append-only spool of measurements.
+    """
+
+    def __init__(self, path: str = f"{SPOOL_PATH}measurement_spool.db"):
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS measurement_spool ("
+                                 "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                                 "device_id, topic_id, measurement_type_id, value, received, timestamp, "
+                                 "UNIQUE (topic_id, measurement_type_id, received))")
+        # Spools written before device timestamps were kept
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(measurement_spool)")]
+        if "timestamp" not in columns:
+            self._connection.execute("ALTER TABLE measurement_spool ADD COLUMN timestamp")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS measurement_dead_letter ("
+                                 "id INTEGER PRIMARY KEY, "
+                                 "device_id, topic_id, measurement_type_id, value, received, timestamp, "
+                                 "error, failed DEFAULT CURRENT_TIMESTAMP)")
+        self._connection.commit()
+        self.pending_count = self._connection.execute("SELECT COUNT(*) FROM measurement_spool").fetchone()[0]
+        self.dead_letter_count = 0  # Rows moved to the dead letter table since start
+
+    def append(self, measurements: MeasurementBatch):
+        """
+        Append measurements to the spool in a single transaction.
+        """
+        rows = measurements.rows("device_id", "topic_id", "measurement_type_id", "value", "received", "timestamp")
+        with self._lock:
+            before = self._connection.total_changes
+            self._connection.executemany("INSERT OR IGNORE INTO measurement_spool "
+                                         "(device_id, topic_id, measurement_type_id, value, received, timestamp) "
+                                         "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._connection.commit()
+            self.pending_count += self._connection.total_changes - before
+
+    def read(self, max_rows: int):
+        """
+        Return the row ids and the measurements of up to max_rows oldest rows.
+        Rows with missing values can not be replayed and are moved to the dead letter table.
+        """
+        with self._lock:
+            rows = self._connection.execute("SELECT id, device_id, topic_id, measurement_type_id, value, received, "
+                                            "IFNULL(timestamp, received) "
+                                            "FROM measurement_spool ORDER BY id LIMIT ?", (max_rows,)).fetchall()
+        invalid_ids = [row[0] for row in rows if None in row]
+        if invalid_ids:
+            self.move_to_dead_letter(invalid_ids, "Missing value")
+            rows = [row for row in rows if None not in row]
+        ids = [row[0] for row in rows]
+        return ids, MeasurementBatch.from_rows(row[1:] for row in rows)
+
+    def remove(self, last_id: int):
+        """
+        Remove all measurements up to and including the row with last_id.
+        """
+        with self._lock:
+            cursor = self._connection.execute("DELETE FROM measurement_spool WHERE id <= ?", (last_id,))
+            self._connection.commit()
+            self.pending_count -= cursor.rowcount
+
+    def move_to_dead_letter(self, ids: list, error: str):
+        """
+        Move the rows with the given ids to the dead letter table.
+        """
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO measurement_dead_letter "
+                                         "(id, device_id, topic_id, measurement_type_id, value, received, timestamp, "
+                                         "error) SELECT id, device_id, topic_id, measurement_type_id, value, "
+                                         "received, timestamp, ? FROM measurement_spool WHERE id = ?",
+                                         [(error, row_id) for row_id in ids])
+            before = self._connection.total_changes
+            self._connection.executemany("DELETE FROM measurement_spool WHERE id = ?", [(row_id,) for row_id in ids])
+            removed = self._connection.total_changes - before
+            self._connection.commit()
+            self.pending_count -= removed
+            self.dead_letter_count += removed
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class SpoolReplayer:
+    """
+    Background thread that drains the spool into SQL in bulk, oldest measurements first.
+    """
+
+    def __init__(self, spool: MeasurementSpool, sql_service: ISQLService, replay_batch_size: int = 5000,
+                 replay_interval: float = 1.0, lock: Lock = None, logger=None):
+        self.spool = spool
+        self.sql_service = sql_service
+        self.replay_batch_size = replay_batch_size
+        self.replay_interval = replay_interval
+        self.replayed_count = 0
+
+        self._lock = lock
+        self._logger = logger
+        self._stop_event = Event()
+        self._replay_thread = Thread(target=self._replay_thread_fun)
+
+    def start_replayer(self):
+        self._replay_thread.start()
+
+    def stop_replayer(self):
+        self._stop_event.set()
+        self._replay_thread.join()
+
+    def _replay_thread_fun(self):
+        retry_interval = self.replay_interval
+        while not self._stop_event.is_set():
+            if not self.spool.pending_count:
+                self._stop_event.wait(self.replay_interval)
+                continue
+
+            try:
+                replayed = self._replay()
+            except Exception as error:
+                # Database still unavailable, back off up to a minute
+                if self._logger:
+                    self._logger.warning(f"Spool replay failed, {self.spool.pending_count} measurements "
+                                         f"pending: {error}")
+                self._stop_event.wait(retry_interval)
+                retry_interval = min(retry_interval * 2, 60.0)
+                continue
+
+            retry_interval = self.replay_interval
+            self.replayed_count += replayed
+            if self._logger:
+                self._logger.info(f"Replayed {replayed} spooled measurements, "
+                                  f"{self.spool.pending_count} pending, "
+                                  f"{self.spool.dead_letter_count} moved to the dead letter table")
+        if self._logger:
+            self._logger.info(f"Spool replayer stopped, {self.spool.pending_count} measurements pending")
+
+    def _replay(self) -> int:
+        """
+        Replay the oldest spooled measurements and return the number written.
+        Raises when the database is not reachable.
+        """
+        ids, measurements = self.spool.read(self.replay_batch_size)
+        if not ids:
+            return 0
+        try:
+            self._write(measurements)
+        except Exception as error:
+            if is_connection_error(error):
+                raise
+            return self._replay_rows(ids, measurements)
+        self.spool.remove(ids[-1])
+        return len(ids)
+
+    def _replay_rows(self, ids: list, measurements: MeasurementBatch) -> int:
+        """
+        Replay the measurements of a failed batch one by one and move the rejected ones to the dead letter table.
+        Raises when the database is not reachable, after removing the rows handled so far.
+        """
+        replayed = 0
+        handled_id = 0  # Rows up to this id are written or moved to the dead letter table
+        for row_id, row in zip(ids, measurements.rows()):
+            try:
+                self._write(MeasurementBatch.from_rows((row,)))
+            except Exception as error:
+                if is_connection_error(error):
+                    if handled_id:
+                        self.spool.remove(handled_id)
+                    raise
+                if self._logger:
+                    self._logger.error(f"Spooled measurement {row} rejected, moved to the dead letter table: {error}")
+                self.spool.move_to_dead_letter([row_id], str(error))
+                handled_id = row_id
+                continue
+            replayed += 1
+            handled_id = row_id
+        self.spool.remove(ids[-1])
+        return replayed
+
+    def _write(self, measurements: MeasurementBatch):
+        if self._lock is not None:
+            self._lock.acquire()
+        try:
+            result = self.sql_service.write_spooled_measurements_to_sql(measurements)
+        finally:
+            if self._lock is not None:
+                self._lock.release()
+        if isinstance(result, Future):
+            result.result()
@@ -0,0 +1,380 @@
+"""
+===============================================================================
+Module: measurement_writer.py
+Description:
+    This module defines an abstract interface `IMeasurementWriter` and a
+    concrete implementation `BatchMeasurementWriter`, a writer stage that sits
+    between the measurement collection loop and the SQL service.
+
+    Measurements are buffered in a queue and written by a background thread
+    in batches, one transaction per batch. When the SQL client is pooled,
+    batches are handed to its writer workers and complete asynchronously. A batch is flushed when either
+    `max_batch_size` measurements are buffered or `max_batch_latency` seconds
+    have passed since the first measurement of the batch arrived.
+
+    Producers hand over whole `MeasurementBatch` objects (e.g. all
+    measurements of the packets drained from the ingest queue at once),
+    which the writer merges column-wise into the batch it flushes. A flush
+    may therefore exceed `max_batch_size` by up to one handed over batch.
+
+    With a pooled SQL client, batches are written concurrently. A batch
+    whose write fails is spooled after newer batches may have committed, so
+    spooled measurements are replayed out of order, with their own times
+    (see `measurement_spool.py`).
+
+    When a batch write fails, its rows are written one by one, so a row
+    the database rejects (e.g. an unknown measurement type) is dropped and
+    logged instead of failing the whole batch. When `ROW_FALLBACK_FAILURES`
+    rows in a row fail, the database is considered unavailable and the
+    remaining rows are spooled.
+
+    The queue holds at most `max_queued_batches` times `max_batch_size`
+    measurements (plus `spool_backlog` with a spool, which takes over
+    before that). When it is full, producers wait, so a slow database
+    backs up into the ingest queues and their overflow policies apply
+    instead of growing the writer queue without limit.
+
+Dependencies:
+    - sql_service.py (ISQLService)
+    - measurement_spool.py (MeasurementSpool)
+    - measurement_batch.py (Measurement, MeasurementBatch)
+    - Standard libraries: `threading`, `queue`, `time`, `asyncio`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from .sql_service import ISQLService
+from .measurement_spool import MeasurementSpool
+from .measurement_batch import Measurement, MeasurementBatch
+
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, Executor
+from threading import Thread, Event, Lock, Condition
+from queue import Queue, Empty
+import asyncio
+import time
+
+ROW_FALLBACK_FAILURES = 10  # Consecutive failed rows after which a failed batch is spooled instead
+
+
+
+class IMeasurementWriter(ABC):
+
+    @abstractmethod
+    def start_writer(self):
+        pass
+
+    @abstractmethod
+    def stop_writer(self):
+        pass
+
+    @abstractmethod
+    def write_measurement(self, measurement: Measurement):
+        pass
+
+    @abstractmethod
+    def write_measurements(self, batch: MeasurementBatch):
+        pass
+
+
+class FlushStatistics:
+    """
+    Timing statistics of the flushes performed by the writer.
+    """
+    def __init__(self):
+        self.flush_count = 0
+        self.measurement_count = 0
+        self.failed_flush_count = 0
+        self.spooled_count = 0
+        self.rejected_count = 0
+        self.last_flush_size = 0
+        self.last_flush_duration = 0.0
+        self.max_flush_duration = 0.0
+        self.total_flush_duration = 0.0
+
+    def add_flush(self, size: int, duration: float):
+        self.flush_count += 1
+        self.measurement_count += size
+        self.last_flush_size = size
+        self.last_flush_duration = duration
+        self.max_flush_duration = max(self.max_flush_duration, duration)
+        self.total_flush_duration += duration
+
+
+class BatchMeasurementWriter(IMeasurementWriter):
+    """
+    Buffers measurements and writes them to SQL in size/time bounded batches.
+    """
+
+    def __init__(self, sql_service: ISQLService, max_batch_size: int = 500, max_batch_latency: float = 0.5,
+                 lock: Lock = None, logger=None, spool: MeasurementSpool = None, spool_backlog: int = 50000,
+                 max_queued_batches: int = 8):
+        self.sql_service = sql_service
+        self.max_batch_size = max_batch_size
+        self.max_batch_latency = max_batch_latency
+        self.spool = spool
+        self.spool_backlog = spool_backlog
+        self.max_queued = max_batch_size * max_queued_batches + (spool_backlog if spool is not None else 0)
+        self.statistics = FlushStatistics()
+        self._statistics_lock = Lock()
+
+        self._lock = lock
+        self._logger = logger
+        self._queue = Queue()
+        self._queued_count = 0  # Measurements waiting in the queue
+        self._queued_condition = Condition()
+        self._stop_event = Event()
+        self._writer_thread = Thread(target=self._writer_thread_fun)
+
+    def start_writer(self):
+        self._writer_thread.start()
+
+    def stop_writer(self):
+        """
+        Stop the writer thread after flushing all buffered measurements.
+        """
+        self._stop_event.set()
+        self._writer_thread.join()
+
+    def write_measurement(self, measurement: Measurement):
+        batch = MeasurementBatch()
+        batch.append_measurement(measurement)
+        self.write_measurements(batch)
+
+    def write_measurements(self, batch: MeasurementBatch):
+        """
+        Queue a batch for the writer, waiting while the queue is full.
+        """
+        if len(batch):
+            with self._queued_condition:
+                while self._queued_count >= self.max_queued and not self._stop_event.is_set():
+                    self._queued_condition.wait(timeout=1.0)
+                self._queued_count += len(batch)
+            self._queue.put(batch)
+
+    def _writer_thread_fun(self):
+        batch = MeasurementBatch()
+        deadline = 0.0
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            if batch:
+                timeout = max(0.0, deadline - time.monotonic())
+            else:
+                timeout = self.max_batch_latency
+            try:
+                received = self._queue.get(timeout=timeout)
+                self._add_queued(-len(received))
+                if not batch:
+                    deadline = time.monotonic() + self.max_batch_latency
+                batch.extend(received)
+            except Empty:
+                pass
+
+            if batch and (len(batch) >= self.max_batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = MeasurementBatch()
+
+        if batch:
+            self._flush(batch)
+
+    def _add_queued(self, count: int):
+        with self._queued_condition:
+            self._queued_count += count
+            if count < 0:
+                self._queued_condition.notify_all()
+
+    def _flush(self, batch: MeasurementBatch):
+        # Keep order behind spooled measurements and spool while the database is behind
+        if self.spool is not None and (self.spool.pending_count or self._queued_count > self.spool_backlog):
+            self._spool_batch(batch)
+            return
+
+        if self._lock is not None:
+            self._lock.acquire()
+        start = time.perf_counter()
+        try:
+            result = self.sql_service.write_measurements_to_sql(batch)
+        except Exception as error:
+            result = error
+        finally:
+            if self._lock is not None:
+                self._lock.release()
+
+        if isinstance(result, Exception):
+            # Outside of the lock, the rows of the failed batch are written one by one
+            self._flush_done(batch, start, result)
+        elif isinstance(result, Future):
+            # Pooled SQL clients write the batch asynchronously
+            result.add_done_callback(lambda f: self._flush_done(batch, start, f.exception()))
+        else:
+            self._flush_done(batch, start, None)
+
+    def _flush_done(self, batch: MeasurementBatch, start: float, error):
+        duration = time.perf_counter() - start
+        with self._statistics_lock:
+            if error is not None:
+                self.statistics.failed_flush_count += 1
+            else:
+                self.statistics.add_flush(len(batch), duration)
+
+        if error is not None:
+            if self._logger:
+                self._logger.error(f"Failed to flush {len(batch)} measurements: {error}")
+            batch = self._write_rows(batch)
+            if len(batch) and self.spool is not None:
+                self._spool_batch(batch)
+        elif self._logger:
+            if duration > self.max_batch_latency:
+                self._logger.warning(f"Slow flush: {len(batch)} measurements in {duration * 1000:.1f} ms")
+            else:
+                self._logger.debug(f"Flushed {len(batch)} measurements in {duration * 1000:.1f} ms")
+
+    def _write_rows(self, batch: MeasurementBatch) -> MeasurementBatch:
+        """
+        Write the measurements of a failed batch one by one and drop the ones the database rejects.
+        Returns the measurements that were not written because the database looks unavailable:
+        none was written or ROW_FALLBACK_FAILURES measurements in a row failed.
+        """
+        failed = []
+        unwritten = MeasurementBatch()
+        written = 0
+        for measurement in batch:
+            if len(failed) >= ROW_FALLBACK_FAILURES:
+                unwritten.append_measurement(measurement)
+                continue
+            if self._lock is not None:
+                self._lock.acquire()
+            try:
+                self.sql_service.write_measurement_to_sql(measurement, raise_errors=True)
+            except Exception:
+                failed.append(measurement)
+                continue
+            finally:
+                if self._lock is not None:
+                    self._lock.release()
+            # The database takes other measurements, so it rejected the failed ones
+            written += 1
+            self._drop_rejected(failed)
+            failed = []
+
+        if written and len(failed) < ROW_FALLBACK_FAILURES:
+            self._drop_rejected(failed)
+            return unwritten
+        remaining = MeasurementBatch()
+        for measurement in failed:
+            remaining.append_measurement(measurement)
+        remaining.extend(unwritten)
+        return remaining
+
+    def _drop_rejected(self, measurements: list):
+        if not measurements:
+            return
+        with self._statistics_lock:
+            self.statistics.rejected_count += len(measurements)
+        if self._logger:
+            for measurement in measurements:
+                self._logger.error(f"Dropped measurement rejected by the database: {measurement}")
+
+    def _spool_batch(self, batch: MeasurementBatch):
+        try:
+            self.spool.append(batch)
+        except Exception as error:
+            if self._logger:
+                self._logger.error(f"Failed to spool {len(batch)} measurements: {error}")
+            return
+        with self._statistics_lock:
+            self.statistics.spooled_count += len(batch)
+
+
+class AsyncBatchMeasurementWriter(BatchMeasurementWriter):
+    """
+    Batching measurement writer for the asyncio runtime.
+    Batches are written in an executor with at most max_pending_flushes batches in flight.
+    """
+
+    def __init__(self, sql_service: ISQLService, executor: Executor, max_batch_size: int = 500,
+                 max_batch_latency: float = 0.5, max_pending_flushes: int = 4, lock: Lock = None, logger=None,
+                 spool: MeasurementSpool = None, spool_backlog: int = 50000, max_queued_batches: int = 8):
+        super().__init__(sql_service=sql_service, max_batch_size=max_batch_size,
+                         max_batch_latency=max_batch_latency, lock=lock, logger=logger,
+                         spool=spool, spool_backlog=spool_backlog, max_queued_batches=max_queued_batches)
+        self._executor = executor
+        self._queue = asyncio.Queue()
+        self._queue_space = asyncio.Event()
+        self._flush_slots = asyncio.Semaphore(max_pending_flushes)
+        self._pending_flushes = set()
+        self._writer_task = None
+
+    def start_writer(self):
+        self._writer_task = asyncio.get_running_loop().create_task(self._writer_task_fun())
+
+    async def stop_writer(self):
+        """
+        Stop the writer task after all buffered measurements are written.
+        """
+        self._stop_event.set()
+        self._queue_space.set()
+        await self._writer_task
+
+    async def write_measurement(self, measurement: Measurement):
+        batch = MeasurementBatch()
+        batch.append_measurement(measurement)
+        await self.write_measurements(batch)
+
+    async def write_measurements(self, batch: MeasurementBatch):
+        """
+        Queue a batch for the writer, waiting while the queue is full.
+        """
+        if len(batch):
+            while self._queued_count >= self.max_queued and not self._stop_event.is_set():
+                self._queue_space.clear()
+                await self._queue_space.wait()
+            self._add_queued(len(batch))
+            self._queue.put_nowait(batch)
+
+    def _add_queued(self, count: int):
+        super()._add_queued(count)
+        if count < 0:
+            self._queue_space.set()
+
+    async def _writer_task_fun(self):
+        batch = MeasurementBatch()
+        deadline = 0.0
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            # Take everything that is already waiting without suspending
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                if not batch:
+                    deadline = time.monotonic() + self.max_batch_latency
+                received = self._queue.get_nowait()
+                self._add_queued(-len(received))
+                batch.extend(received)
+
+            if len(batch) < self.max_batch_size:
+                timeout = max(0.0, deadline - time.monotonic()) if batch else self.max_batch_latency
+                try:
+                    received = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                    self._add_queued(-len(received))
+                    if not batch:
+                        deadline = time.monotonic() + self.max_batch_latency
+                    batch.extend(received)
+                except asyncio.TimeoutError:
+                    pass
+
+            if batch and (len(batch) >= self.max_batch_size or time.monotonic() >= deadline):
+                await self._flush_async(batch)
+                batch = MeasurementBatch()
+
+        if batch:
+            await self._flush_async(batch)
+        if self._pending_flushes:
+            await asyncio.wait(self._pending_flushes)
+
+    async def _flush_async(self, batch: MeasurementBatch):
+        await self._flush_slots.acquire()
+        flush = asyncio.get_running_loop().run_in_executor(self._executor, self._flush, batch)
+        self._pending_flushes.add(flush)
+        flush.add_done_callback(self._flush_async_done)
+
+    def _flush_async_done(self, flush):
+        self._pending_flushes.discard(flush)
+        self._flush_slots.release()
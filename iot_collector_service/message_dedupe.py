@@ -0,0 +1,75 @@
+"""
+===============================================================================
+Module: message_dedupe.py
+Description:
+    This module implements the `MessageDeduplicator` class, a bounded LRU
+    set of recently received messages keyed on (topic, device timestamp).
+
+    MQTT QoS 1 redeliveries and device retries deliver the same message
+    more than once. A device never sends two different messages of a topic
+    with the same timestamp, so a message whose (topic, timestamp) key was
+    seen recently is a duplicate and is dropped before its measurements
+    reach SQL. Messages without a device timestamp can not be recognized
+    and always pass.
+
+    The set keeps the `max_entries` most recently seen keys; redeliveries
+    arrive shortly after the original, so a few seconds of traffic are
+    enough. Hit (duplicate) and miss counters and the approximate memory
+    use are kept for monitoring.
+
+Dependencies:
+    - Standard libraries: `collections`, `sys`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from collections import OrderedDict
+import sys
+
+KEY_SIZE = sys.getsizeof(("", 0.0)) + sys.getsizeof(0.0)  # Key tuple and timestamp; topic strings are shared
+
+
+class MessageDeduplicator:
+    """
+    Bounded LRU set of (topic, device timestamp) keys of recently received messages.
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+
+        self.hit_count = 0
+        self.miss_count = 0
+
+        self._entries = OrderedDict()
+
+    def is_duplicate(self, topic: str, timestamp: float) -> bool:
+        """
+        Return True if a message of the topic with the same timestamp was seen recently, remember it otherwise.
+        """
+        if self.max_entries <= 0:
+            return False
+
+        key = (topic, timestamp)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hit_count += 1
+            return True
+
+        self.miss_count += 1
+        self._entries[key] = None
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return False
+
+    def memory_usage(self) -> int:
+        """
+        Return the approximate memory used by the set in bytes.
+        """
+        return sys.getsizeof(self._entries) + len(self._entries) * KEY_SIZE
+
+    def statistics(self) -> str:
+        checks = self.hit_count + self.miss_count
+        hit_ratio = self.hit_count / checks if checks else 0.0
+        return f"duplicates: {self.hit_count} of {checks} messages ({hit_ratio:.2%} hit ratio), " \
+               f"entries: {len(self._entries)}/{self.max_entries}, memory: {self.memory_usage() / 1024:.0f} KiB"
@@ -4,9 +4,27 @@
 """
 
 from paho.mqtt import client as mqttclient
+from .ingest_queue import IngestQueue, OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, SPILL_PATH
 from abc import ABC, abstractmethod
+from collections import Counter
+import asyncio
+import os
 import random
-from queue import Queue
+
+SUBSCRIBE_CHUNK_SIZE = 100  # Topics per SUBSCRIBE / UNSUBSCRIBE packet
+RECONNECT_MIN_DELAY = 1.0   # Seconds before the first reconnect attempt of an event loop driven client
+RECONNECT_MAX_DELAY = 60.0  # Reconnect delay reached by doubling after failed attempts
+
+
+def shared_subscription_topic(topic: str, group: str = "") -> str:
+    """
+    Return the topic filter to subscribe to. With a group, the broker delivers each
+    message of the topic to only one subscriber of the group ($share/<group>/<topic>).
+    Received messages still carry the original topic.
+    """
+    if not group:
+        return topic
+    return f"$share/{group}/{topic}"
 
 class IMqttClient(ABC):
     @abstractmethod
@@ -30,7 +48,7 @@ class IMqttClient(ABC):
         pass
 
     @abstractmethod
-    def mqtt_get_data(self):
+    def mqtt_get_data(self, timeout: float = None):
         pass
 
     @abstractmethod
@@ -42,19 +60,27 @@ class MqttClientPaho(IMqttClient, mqttclient.Client):
     Mqtt Client for reading and writing to mqtt broker
 
     Args:
+        queue_size: capacity of the received data queue
+        overflow_policy: what to do with received messages when the data queue is full
+                         (block, drop_oldest, drop_newest, spill)
+        instance_id: identity of the service instance, used as client id prefix
 
     Attributes:
+        data_queue: IngestQueue with received messages and per-topic drop counters
+        publish_done_callback: called with the message id when a published message was sent
 
     """
-    def __init__(self):
-        self.client_id = f'python-mqtt-{random.randint(0, 1000)}'
+    def __init__(self, queue_size: int = 10, overflow_policy: str = OVERFLOW_BLOCK, instance_id: str = ""):
+        self.client_id = f'{instance_id or "python-mqtt"}-{os.getpid()}-{random.randint(0, 1000)}'
         super().__init__(self.client_id)
 
         self._usr = ""
         self._password = ""
         self.broker = ""
         self.port = 0
-        self.data_queue = Queue(maxsize=10)
+        self.data_queue = IngestQueue(maxsize=queue_size, overflow_policy=overflow_policy,
+                                      spill_file=f"{SPILL_PATH}{self.client_id}.bin")
+        self.publish_done_callback = None
 
     def mqtt_client_connect(self, usr: str, password: str, broker: str, port: int):
         """
@@ -94,11 +120,32 @@ class MqttClientPaho(IMqttClient, mqttclient.Client):
     def mqtt_client_unsubscribe(self, topic):
         self.unsubscribe(topic)
 
-    def mqtt_get_data(self):
-        return self.data_queue.get()
+    def mqtt_client_subscribe_topics(self, topics: list):
+        """
+        Subscribe to many topics using one SUBSCRIBE packet per chunk of topics
+        """
+        for i in range(0, len(topics), SUBSCRIBE_CHUNK_SIZE):
+            self.subscribe([(topic, 0) for topic in topics[i:i + SUBSCRIBE_CHUNK_SIZE]])
+
+    def mqtt_client_unsubscribe_topics(self, topics: list):
+        """
+        Unsubscribe from many topics using one UNSUBSCRIBE packet per chunk of topics
+        """
+        for i in range(0, len(topics), SUBSCRIBE_CHUNK_SIZE):
+            self.unsubscribe(topics[i:i + SUBSCRIBE_CHUNK_SIZE])
 
-    def mqtt_publish_data(self, topic, data):
-        self.publish(topic, data)
+    def mqtt_get_data(self, timeout: float = None):
+        """
+        Return the next received message, waiting at most timeout seconds (raises queue.Empty).
+        """
+        return self.data_queue.get(timeout=timeout)
+
+    def mqtt_publish_data(self, topic, data) -> bool:
+        """
+        Publish data to a topic; returns False if the message could not be queued for sending
+        """
+        info = self.publish(topic, data)
+        return info.rc == mqttclient.MQTT_ERR_SUCCESS
 
     def _on_connect_handle(self, client, userdata, flags, rc):
         if rc == 0:
@@ -107,12 +154,160 @@ class MqttClientPaho(IMqttClient, mqttclient.Client):
             print("Failed to connect, return code %d\n", rc)
 
     def _on_message_handle(self, client, userdata, msg):
-        data_packet = {"topic": msg.topic, "data": msg.payload.decode()}
-        self.data_queue.put(data_packet)
+        data_packet = {"topic": msg.topic, "data": msg.payload}
+        self.data_queue.put_packet(data_packet)
 
     def _on_log_handle(self, userdata, level, buf):
         print(buf)
 
     def _on_publish_handle(self, client, userdata, mid):
         #print("on_publish, mid {}".format(mid))
+        if self.publish_done_callback is not None:
+            self.publish_done_callback(mid)
+
+
+class AsyncMqttClientPaho(MqttClientPaho):
+    """
+    Mqtt Client driven by an asyncio event loop instead of the paho network thread.
+    Socket reads, writes and keepalive handling are scheduled on the event loop and
+    received messages are put into an asyncio.Queue without blocking the loop.
+
+    The event loop must never block, so a full data queue drops the oldest queued
+    message for the drop_oldest policy and the received message for all other policies.
+
+    There is no network thread to reconnect the client, so a lost connection is
+    re-established by an event loop task, retrying with a doubling delay between
+    RECONNECT_MIN_DELAY and RECONNECT_MAX_DELAY, after which reconnect_callback is
+    called (e.g. to subscribe the topics again).
+
+    Connecting blocks on DNS and TCP, so connects and reconnects run in the default
+    executor of the loop; the socket callbacks paho calls from the executor thread
+    are handed over to the event loop.
+
+    Args:
+        loop: running asyncio event loop
+        data_queue: asyncio.Queue receiving {"topic", "data"} packets
+        overflow_policy: overflow policy applied when the data queue is full
+        instance_id: identity of the service instance, used as client id prefix
+
+    Attributes:
+        mqtt_topics: topic filters the client is subscribed to while collecting
+        collector_configuration: broker configuration the client is connected with
+        dropped_per_topic: number of messages dropped per topic because the data queue was full
+        reconnect_callback: called with the client after a lost connection was re-established
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop, data_queue: asyncio.Queue,
+                 overflow_policy: str = OVERFLOW_DROP_OLDEST, instance_id: str = ""):
+        super().__init__(instance_id=instance_id)
+        self.loop = loop
+        self.data_queue = data_queue
+        self.overflow_policy = overflow_policy
+        self.mqtt_topics = []
+        self.collector_configuration = None
+        self.dropped_per_topic = Counter()
+        self.reconnect_callback = None
+        self._misc_task = None
+        self._reconnect_task = None
+        self._closing = False
+
+        self.on_socket_open = self._on_socket_open_handle
+        self.on_socket_close = self._on_socket_close_handle
+        self.on_socket_register_write = self._on_socket_register_write_handle
+        self.on_socket_unregister_write = self._on_socket_unregister_write_handle
+
+    async def mqtt_client_connect_async(self, usr: str, password: str, broker: str, port: int) -> int:
+        """
+        Connect client to MQTT broker without blocking the event loop.
+        """
+        return await self.loop.run_in_executor(None, self.mqtt_client_connect, usr, password, broker, port)
+
+    def mqtt_client_start(self):
+        # Network traffic is driven by the event loop socket callbacks
         pass
+
+    def mqtt_client_disconnect(self):
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        self.disconnect()
+
+    def mqtt_get_data(self, timeout: float = None):
+        return self.data_queue.get_nowait()
+
+    def _on_message_handle(self, client, userdata, msg):
+        data_packet = {"topic": msg.topic, "data": msg.payload}
+        try:
+            self.data_queue.put_nowait(data_packet)
+        except asyncio.QueueFull:
+            if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                oldest = self.data_queue.get_nowait()
+                self.dropped_per_topic[oldest["topic"]] += 1
+                self.data_queue.put_nowait(data_packet)
+            else:
+                self.dropped_per_topic[msg.topic] += 1
+
+    def _on_socket_open_handle(self, client, userdata, sock):
+        self._in_loop(self._socket_opened, client, sock)
+
+    def _on_socket_close_handle(self, client, userdata, sock):
+        self._in_loop(self._socket_closed, sock)
+
+    def _on_socket_register_write_handle(self, client, userdata, sock):
+        self._in_loop(self.loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write_handle(self, client, userdata, sock):
+        self._in_loop(self.loop.remove_writer, sock)
+
+    def _socket_opened(self, client, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self._misc_task = self.loop.create_task(self._misc_loop())
+
+    def _socket_closed(self, sock):
+        self.loop.remove_reader(sock)
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+        self._schedule_reconnect()
+
+    def _in_loop(self, callback, *args):
+        """
+        Run a callback on the event loop, right away when called from the event loop thread.
+        """
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    async def _misc_loop(self):
+        # Keepalive and retry handling, normally done by the paho network thread
+        while self.loop_misc() == mqttclient.MQTT_ERR_SUCCESS:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                return
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        if self._closing or (self._reconnect_task is not None and not self._reconnect_task.done()):
+            return
+        self._reconnect_task = self.loop.create_task(self._reconnect_loop())
+
+    async def _reconnect_loop(self):
+        # Reconnect handling, normally done by the paho network thread
+        delay = RECONNECT_MIN_DELAY
+        while not self._closing:
+            await asyncio.sleep(delay)
+            try:
+                await self.loop.run_in_executor(None, self.reconnect)
+            except Exception as error:
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                print(f"Reconnecting to MQTT broker {self.broker}:{self.port} failed: {error}, "
+                      f"retrying in {delay:.0f} s")
+                continue
+            print(f"Reconnected to MQTT broker {self.broker}:{self.port}")
+            if self.reconnect_callback is not None:
+                self.reconnect_callback(self)
+            return
@@ -0,0 +1,230 @@
+"""
+===============================================================================
+Module: outbound_publisher.py
+Description:
+    This module implements the outbound (service -> device) publishing
+    pipeline used for parameter writes.
+
+    - `group_parameter_packets` groups parameter rows into one packet per
+      topic in a single pass.
+    - `PublishRateLimiter` is a token bucket limiting messages per second.
+    - `OutboundPublisher` owns the outbound queue of one broker connection
+      and publishes from its own thread. Queuing never blocks the caller,
+      publishing is rate limited and at most `max_in_flight` messages are
+      in flight (published, but not yet confirmed by the client's
+      on_publish callback) per broker.
+    - `AsyncOutboundPublisher` is the same pipeline as an asyncio task.
+
+    Large pushes (e.g. parameters of the whole fleet) are queued at once
+    and drained at the configured rate, so they take a predictable time
+    and do not compete with ingestion for the network or the CPU.
+
+Dependencies:
+    - mqtt_client.py (MqttClientPaho)
+    - Standard libraries: `threading`, `queue`, `asyncio`, `json`, `time`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from .mqtt_client import MqttClientPaho
+
+from threading import Thread, Event, Condition
+from queue import Queue, Empty
+import asyncio
+import json
+import time
+
+IN_FLIGHT_TIMEOUT = 10.0  # Seconds without publish confirmations before in-flight messages are considered lost
+
+
+def group_parameter_packets(parameters: list, topics=None) -> dict:
+    """
+    Group parameter rows (topic, param_name, value) into one dict of parameter values per topic.
+    With topics given, only parameters of those topics are kept.
+    """
+    packets = {}
+    for param in parameters:
+        topic = param.get("topic")
+        if topic is None or (topics is not None and topic not in topics):
+            continue
+        packets.setdefault(topic, {})[param["param_name"]] = param["value"]
+    return packets
+
+
+class PublishRateLimiter:
+    """
+    Token bucket allowing `rate` messages per second with bursts of up to `burst` messages.
+    A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+
+    def reserve(self) -> float:
+        """
+        Take one token and return the number of seconds to wait before sending the message.
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class OutboundPublisher:
+    """
+    Non-blocking, rate limited outbound queue of one broker connection with a bounded number of
+    in-flight messages.
+    """
+
+    def __init__(self, client: MqttClientPaho, publish_rate: float = 0, max_in_flight: int = 0, logger=None):
+        self.client = client
+        self.max_in_flight = max_in_flight
+        self.published_count = 0
+        self.failed_count = 0
+
+        self._queue = Queue()
+        self._rate_limiter = PublishRateLimiter(publish_rate)
+        self._in_flight = 0
+        self._in_flight_changed = Condition()
+        self._logger = logger
+        self._stop_event = Event()
+        self._publish_thread = Thread(target=self._publish_thread_fun, daemon=True)
+
+        client.publish_done_callback = self._publish_done
+
+    def start_publisher(self):
+        self._publish_thread.start()
+
+    def stop_publisher(self):
+        self._stop_event.set()
+        with self._in_flight_changed:
+            self._in_flight_changed.notify_all()
+
+    def publish(self, topic: str, data: dict):
+        """
+        Queue a packet for publishing; never blocks.
+        """
+        self._queue.put_nowait((topic, data))
+
+    @property
+    def pending_count(self) -> int:
+        return self._queue.qsize()
+
+    def _publish_thread_fun(self):
+        while not self._stop_event.is_set():
+            try:
+                topic, data = self._queue.get(timeout=0.5)
+            except Empty:
+                continue
+
+            delay = self._rate_limiter.reserve()
+            if delay > 0 and self._stop_event.wait(delay):
+                return
+
+            if self.max_in_flight > 0:
+                with self._in_flight_changed:
+                    if not self._in_flight_changed.wait_for(
+                            lambda: self._in_flight < self.max_in_flight or self._stop_event.is_set(),
+                            timeout=IN_FLIGHT_TIMEOUT):
+                        self._warning(f"No publish confirmations from {self.client.broker} for "
+                                      f"{IN_FLIGHT_TIMEOUT:.0f} s, dropping {self._in_flight} in-flight messages")
+                        self._in_flight = 0
+                    if self._stop_event.is_set():
+                        return
+                    self._in_flight += 1
+
+            if self.client.mqtt_publish_data(topic=topic, data=json.dumps(data)):
+                self.published_count += 1
+            else:
+                self.failed_count += 1
+                self._publish_done(None)
+                self._warning(f"Publishing to {topic} failed")
+
+    def _publish_done(self, mid):
+        if self.max_in_flight <= 0:
+            return
+        with self._in_flight_changed:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._in_flight_changed.notify()
+
+    def _warning(self, message: str):
+        if self._logger:
+            self._logger.warning(message)
+
+
+class AsyncOutboundPublisher:
+    """
+    OutboundPublisher for event loop driven MQTT clients, running as an asyncio task.
+    """
+
+    def __init__(self, client: MqttClientPaho, publish_rate: float = 0, max_in_flight: int = 0, logger=None):
+        self.client = client
+        self.max_in_flight = max_in_flight
+        self.published_count = 0
+        self.failed_count = 0
+
+        self._queue = asyncio.Queue()
+        self._rate_limiter = PublishRateLimiter(publish_rate)
+        self._in_flight = 0
+        self._slot_free = asyncio.Event()
+        self._logger = logger
+        self._publish_task = None
+
+        client.publish_done_callback = self._publish_done
+
+    def start_publisher(self):
+        self._publish_task = asyncio.get_running_loop().create_task(self._publish_task_fun())
+
+    def stop_publisher(self):
+        if self._publish_task is not None:
+            self._publish_task.cancel()
+
+    def publish(self, topic: str, data: dict):
+        """
+        Queue a packet for publishing; never blocks.
+        """
+        self._queue.put_nowait((topic, data))
+
+    @property
+    def pending_count(self) -> int:
+        return self._queue.qsize()
+
+    async def _publish_task_fun(self):
+        while 1:
+            topic, data = await self._queue.get()
+
+            delay = self._rate_limiter.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            while 0 < self.max_in_flight <= self._in_flight:
+                self._slot_free.clear()
+                try:
+                    await asyncio.wait_for(self._slot_free.wait(), timeout=IN_FLIGHT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    self._warning(f"No publish confirmations from {self.client.broker} for "
+                                  f"{IN_FLIGHT_TIMEOUT:.0f} s, dropping {self._in_flight} in-flight messages")
+                    self._in_flight = 0
+            self._in_flight += 1
+
+            if self.client.mqtt_publish_data(topic=topic, data=json.dumps(data)):
+                self.published_count += 1
+            else:
+                self.failed_count += 1
+                self._publish_done(None)
+                self._warning(f"Publishing to {topic} failed")
+
+    def _publish_done(self, mid):
+        self._in_flight = max(0, self._in_flight - 1)
+        self._slot_free.set()
+
+    def _warning(self, message: str):
+        if self._logger:
+            self._logger.warning(message)
@@ -0,0 +1,97 @@
+"""
+===============================================================================
+Module: parameter_cache.py
+Description:
+    This module implements the `ParameterCache` class, an in-process LRU
+    cache of device and device group parameters read from SQL.
+
+    Every lookup first reads a single version number with the
+    `GetParameterVersion` stored procedure; the database bumps it (e.g.
+    with a trigger) whenever a parameter row is inserted, updated or
+    deleted. When the version differs from the one the cached entries were
+    read at, the whole cache is invalidated. Resending parameters or
+    pushing them to many devices then costs one cheap version read instead
+    of reading the same parameter rows again.
+
+    Failed parameter reads raise and are never cached. Empty results are
+    not cached either, so a device whose parameters were just added (or a
+    read that came back empty) is read again with the next lookup.
+
+    Hit, miss and invalidation counters are kept for monitoring.
+
+Dependencies:
+    - sql_service.py (SQLService)
+    - Standard libraries: `collections`, `threading`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from .sql_service import SQLService
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class ParameterCache:
+    """
+    LRU cache of parameter rows, invalidated when the parameter version in SQL changes.
+    """
+
+    def __init__(self, sql_service: SQLService, max_entries: int = 1000):
+        self.sql_service = sql_service
+        self.max_entries = max_entries
+
+        self.hit_count = 0
+        self.miss_count = 0
+        self.invalidation_count = 0
+
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = Lock()
+
+    def get_device_parameters(self, device_id) -> list:
+        """
+        Return the parameters of a device. Raises if they could not be read from SQL.
+        """
+        return self._get(("device", device_id), self.sql_service.read_parameters_from_sql, device_id)
+
+    def get_device_group_parameters(self, group_id=None) -> list:
+        """
+        Return the parameters of all devices in a device group (all devices for None).
+        Raises if they could not be read from SQL.
+        """
+        return self._get(("group", group_id), self.sql_service.read_device_group_parameters_from_sql, group_id)
+
+    def statistics(self) -> str:
+        requests = self.hit_count + self.miss_count
+        hit_ratio = self.hit_count / requests if requests else 0.0
+        return f"hits: {self.hit_count}, misses: {self.miss_count} ({hit_ratio:.0%} hit ratio), " \
+               f"invalidations: {self.invalidation_count}, entries: {len(self._entries)}"
+
+    def _get(self, key: tuple, read_fun, *args) -> list:
+        with self._lock:
+            if self.max_entries <= 0:
+                self.miss_count += 1
+                return read_fun(*args)
+
+            version = self.sql_service.read_parameter_version()
+            if version is None or version != self._version:
+                if self._entries:
+                    self.invalidation_count += 1
+                self._entries.clear()
+                self._version = version
+
+            parameters = self._entries.get(key)
+            if parameters is not None:
+                self._entries.move_to_end(key)
+                self.hit_count += 1
+                return parameters
+
+            self.miss_count += 1
+            parameters = read_fun(*args)
+            if version is not None and parameters:
+                self._entries[key] = parameters
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return parameters
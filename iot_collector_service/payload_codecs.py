@@ -0,0 +1,186 @@
+"""
+===============================================================================
+Module: payload_codecs.py
+Description:
+    This module defines an abstract interface `IPayloadCodec` for encoding
+    and decoding device payloads, concrete codecs for compact binary formats
+    and a `CodecRegistry` that selects the codec of every topic.
+
+    Supported payload formats:
+    - json:     JSON text (orjson when installed)
+    - msgpack:  MessagePack (requires the optional `msgpack` package)
+    - cbor:     CBOR (requires the optional `cbor2` package)
+    - struct:   fixed binary layout described by `payload_layout`
+
+    A struct layout is an optional byte order character followed by comma
+    separated `field:format` pairs using `struct` module format characters,
+    e.g. `<co2:H,humidity:f,timestamp:d`. The layout is compiled once into a
+    `struct.Struct` and a tuple of field names.
+
+    The codec of a topic is configured in SQL next to the topic
+    configuration, with the `payload_format` and `payload_layout` columns of
+    the `GetTopics` result. Topics without them use JSON.
+
+Dependencies:
+    - payload_decoder.py (IPayloadDecoder, get_json_decoder)
+    - msgpack, cbor2 (optional)
+    - Standard libraries: `struct`, `json`, `abc`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from .payload_decoder import IPayloadDecoder, get_json_decoder
+
+from abc import abstractmethod
+import struct
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+FORMAT_JSON = "json"
+FORMAT_MSGPACK = "msgpack"
+FORMAT_CBOR = "cbor"
+FORMAT_STRUCT = "struct"
+
+
+class IPayloadCodec(IPayloadDecoder):
+
+    @abstractmethod
+    def encode(self, data: dict) -> bytes:
+        """Encode a dict of field name -> value into a payload."""
+        pass
+
+
+class JsonPayloadCodec(IPayloadCodec):
+    """
+    JSON text payloads, decoded with the fastest available JSON decoder.
+    """
+    def __init__(self):
+        self._decoder = get_json_decoder()
+
+    def encode(self, data: dict) -> bytes:
+        return json.dumps(data).encode()
+
+    def decode(self, payload: bytes) -> dict:
+        return self._decoder.decode(payload)
+
+
+class MsgPackPayloadCodec(IPayloadCodec):
+    """
+    MessagePack payloads.
+    """
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError("msgpack is not installed")
+
+    def encode(self, data: dict) -> bytes:
+        return msgpack.packb(data)
+
+    def decode(self, payload: bytes) -> dict:
+        return msgpack.unpackb(payload)
+
+
+class CborPayloadCodec(IPayloadCodec):
+    """
+    CBOR payloads.
+    """
+    def __init__(self):
+        if cbor2 is None:
+            raise ImportError("cbor2 is not installed")
+
+    def encode(self, data: dict) -> bytes:
+        return cbor2.dumps(data)
+
+    def decode(self, payload: bytes) -> dict:
+        return cbor2.loads(payload)
+
+
+class StructPayloadCodec(IPayloadCodec):
+    """
+    Fixed binary layout payloads, precompiled from a layout such as "<co2:H,humidity:f".
+    """
+    def __init__(self, layout: str):
+        byte_order = "<"
+        if layout and layout[0] in "@=<>!":
+            byte_order, layout = layout[0], layout[1:]
+
+        fields = []
+        formats = []
+        for item in layout.split(","):
+            name, _, field_format = item.rpartition(":")
+            if not name or not field_format:
+                raise ValueError(f"Invalid struct layout item: {item!r}")
+            fields.append(name.strip())
+            formats.append(field_format.strip())
+
+        self.fields = tuple(fields)
+        self._struct = struct.Struct(byte_order + "".join(formats))
+
+    def encode(self, data: dict) -> bytes:
+        return self._struct.pack(*[data[field] for field in self.fields])
+
+    def decode(self, payload: bytes) -> dict:
+        try:
+            return dict(zip(self.fields, self._struct.unpack(payload)))
+        except struct.error as error:
+            raise ValueError(str(error))
+
+
+def create_codec(payload_format: str = FORMAT_JSON, payload_layout: str = "") -> IPayloadCodec:
+    """
+    Create the codec for a payload format (and layout, for struct payloads).
+    """
+    payload_format = (payload_format or FORMAT_JSON).lower()
+    if payload_format == FORMAT_JSON:
+        return JsonPayloadCodec()
+    elif payload_format == FORMAT_MSGPACK:
+        return MsgPackPayloadCodec()
+    elif payload_format == FORMAT_CBOR:
+        return CborPayloadCodec()
+    elif payload_format == FORMAT_STRUCT:
+        return StructPayloadCodec(payload_layout)
+    raise ValueError(f"Unknown payload format: {payload_format}")
+
+
+class CodecRegistry:
+    """
+    Lookup table: topic string -> payload codec. Topics without a configured codec use JSON.
+    """
+
+    def __init__(self, topic_configuration=None):
+        self.default_codec = JsonPayloadCodec()
+        self._codecs = {}
+        if topic_configuration is not None:
+            self.rebuild(topic_configuration)
+
+    def rebuild(self, topic_configuration: list):
+        """
+        Build codecs from the payload_format / payload_layout of each topic and swap them in atomically.
+        Identical configurations share one codec instance.
+        """
+        codecs = {}
+        compiled = {}
+        for topic in topic_configuration:
+            key = ((topic.get("payload_format") or FORMAT_JSON).lower(), topic.get("payload_layout") or "")
+            if key == (FORMAT_JSON, ""):
+                continue
+            if key not in compiled:
+                try:
+                    compiled[key] = create_codec(*key)
+                except (ImportError, ValueError, struct.error) as error:
+                    print(f"Invalid payload codec for topic {topic['topic']}: {error}, using JSON")
+                    compiled[key] = self.default_codec
+            codecs[topic["topic"]] = compiled[key]
+        self._codecs = codecs
+
+    def get_codec(self, topic: str) -> IPayloadCodec:
+        return self._codecs.get(topic, self.default_codec)
@@ -0,0 +1,66 @@
+"""
+===============================================================================
+Module: payload_decoder.py
+Description:
+    This module defines an abstract interface `IPayloadDecoder` for decoding
+    raw MQTT payloads (`bytes`) into a dict of field name -> value, and JSON
+    implementations of it.
+
+    Payloads are carried as `bytes` from the MQTT client to the ingest
+    pipeline and decoded exactly once. `get_json_decoder` returns the orjson
+    based decoder when the optional `orjson` package is installed and falls
+    back to the standard library `json` module otherwise.
+
+Dependencies:
+    - orjson (optional)
+    - Standard libraries: `json`, `abc`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from abc import ABC, abstractmethod
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class IPayloadDecoder(ABC):
+
+    @abstractmethod
+    def decode(self, payload: bytes) -> dict:
+        """Decode a raw payload into a dict of field name -> value."""
+        pass
+
+
+class JsonPayloadDecoder(IPayloadDecoder):
+    """
+    JSON decoder using the standard library json module.
+    Decoding to str explicitly is faster than letting json.loads detect the encoding of bytes.
+    """
+    def decode(self, payload: bytes) -> dict:
+        return json.loads(payload.decode())
+
+
+class OrjsonPayloadDecoder(IPayloadDecoder):
+    """
+    JSON decoder using orjson, which parses bytes directly without decoding them to str first.
+    """
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("orjson is not installed")
+
+    def decode(self, payload: bytes) -> dict:
+        return orjson.loads(payload)
+
+
+def get_json_decoder() -> IPayloadDecoder:
+    """
+    Return the fastest available JSON payload decoder.
+    """
+    if orjson is not None:
+        return OrjsonPayloadDecoder()
+    return JsonPayloadDecoder()
@@ -0,0 +1,141 @@
+"""
+===============================================================================
+Module: payload_schema.py
+Description:
+    This module implements per-topic payload schemas, which map the fields of
+    decoded device payloads to integer measurement type ids, and a
+    `SchemaRegistry` that selects the schema of every topic.
+
+    A schema is configured in SQL next to the topic configuration, with the
+    `payload_schema` column of the topic rows. It is a comma separated list
+    of `field:measurement_type_id[:value_type]` items and optionally one
+    `field:timestamp` item declaring the device timestamp field, e.g.
+    `co2:1:int,humidity:3:float,timestamp:timestamp`.
+
+    Value types (default float):
+    - float: int or float values
+    - int:   int values
+    - bool:  bool values
+
+    The schema is compiled once into a tuple of (field, measurement type id,
+    accepted types). Extracting measurements is then a single pass over the
+    schema fields with one dict lookup and one exact type check per field:
+    - fields of the wrong type (including null) and non-finite floats (NaN,
+      infinity) are skipped and counted as invalid,
+    - payload fields that are not in the schema are counted as unknown,
+    so malformed payloads never reach the database.
+
+    Topics without a schema keep storing the payload field names as
+    measurement type ids.
+
+Dependencies:
+    - measurement_batch.py (MeasurementBatch)
+    - Standard libraries: `math`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from .measurement_batch import MeasurementBatch
+
+from math import isfinite
+
+TIMESTAMP_FIELD = "timestamp"
+MISSING = object()  # Marks schema fields that are not in the payload
+
+VALUE_TYPES = {
+    "float": (int, float),
+    "int": (int,),
+    "bool": (bool,),
+}
+
+
+class PayloadSchema:
+    """
+    Compiled payload schema: field name -> measurement type id and value type.
+    """
+
+    def __init__(self, schema: str):
+        fields = []
+        self.timestamp_field = None
+        for item in schema.split(","):
+            parts = [part.strip() for part in item.split(":")]
+            if len(parts) not in (2, 3) or not parts[0] or not parts[1]:
+                raise ValueError(f"Invalid payload schema item: {item!r}")
+
+            if parts[1] == TIMESTAMP_FIELD:
+                self.timestamp_field = parts[0]
+                continue
+
+            if not parts[1].isdigit():
+                raise ValueError(f"Invalid measurement type id in payload schema item: {item!r}")
+            value_type = parts[2] if len(parts) == 3 else "float"
+            if value_type not in VALUE_TYPES:
+                raise ValueError(f"Unknown value type in payload schema item: {item!r}")
+            fields.append((parts[0], int(parts[1]), VALUE_TYPES[value_type]))
+
+        self.fields = tuple(fields)
+        self._field_count = len(self.fields) + 1  # Including the timestamp field
+
+    def extract(self, data: dict, batch: MeasurementBatch, device_id: int, topic_id: int, received: float,
+                timestamp: float) -> tuple:
+        """
+        Append the measurements of a decoded payload to the batch.
+        Returns the number of measurements appended, invalid values and unknown fields.
+        """
+        count = 0
+        invalid = 0
+        missing = 0 if self.timestamp_field in data else 1
+        for field, measurement_type_id, value_types in self.fields:
+            value = data.get(field, MISSING)
+            if value is MISSING:
+                missing += 1
+            elif type(value) in value_types and (type(value) is not float or isfinite(value)):
+                batch.append(device_id, topic_id, measurement_type_id, value, received, timestamp)
+                count += 1
+            else:
+                invalid += 1
+        return count, invalid, len(data) - self._field_count + missing
+
+
+class SchemaRegistry:
+    """
+    Lookup table: topic string -> compiled payload schema. Topics without a schema return None.
+    """
+
+    def __init__(self, topic_configuration=None, logger=None):
+        self._logger = logger
+        self._schemas = {}
+        if topic_configuration is not None:
+            self.rebuild(topic_configuration)
+
+    def rebuild(self, topic_configuration: list):
+        """
+        Compile the payload_schema of each topic and swap the schemas in atomically.
+        Identical schemas share one compiled instance.
+        """
+        schemas = {}
+        compiled = {}
+        for topic in topic_configuration:
+            schema = topic.get("payload_schema")
+            if not schema:
+                continue
+            if schema not in compiled:
+                try:
+                    compiled[schema] = PayloadSchema(schema)
+                except ValueError as error:
+                    message = f"Invalid payload schema for topic {topic['topic']}: {error}, using field names"
+                    if self._logger:
+                        self._logger.warning(message)
+                    else:
+                        print(message)
+                    compiled[schema] = None
+            if compiled[schema] is not None:
+                schemas[topic["topic"]] = compiled[schema]
+        self._schemas = schemas
+
+    def get_schema(self, topic: str):
+        return self._schemas.get(topic)
+
+    def __len__(self):
+        return len(self._schemas)
@@ -0,0 +1,117 @@
+"""
+===============================================================================
+Module: service_configuration.py
+Description:
+    This module implements the `ServiceConfiguration` class, which holds the
+    tunable runtime options of the IoT service (batching, queue sizes, ...).
+
+    Options are read from `configuration/service_configuration.csv`, a CSV
+    file with `parameter,value` rows. Parameters missing from the file keep
+    their default values, so the file only needs to list overrides.
+
+Dependencies:
+    - Standard libraries: `csv`, `os`, `socket`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+import csv
+import os
+import socket
+
+configuration_path = "./configuration/"
+
+
+class ServiceConfiguration:
+    """
+    Runtime options of the IoT service with their default values.
+    """
+
+    def __init__(self):
+        # Service instance
+        self.instance_id = socket.gethostname()  # Identity of this service instance
+        self.shared_subscription_group = ""      # Subscribe as $share/<group>/<topic>; empty disables
+        self.leader_election = False             # Only the holder of the SQL lease processes commands
+        self.leader_lease_duration = 15.0        # Seconds a lease is valid without renewal
+        self.leader_lease_renew_interval = 5.0   # Seconds between lease renewals / takeover attempts
+        self.command_broadcast_delay = 5.0       # Seconds followers get to read start/stop/reload before reset
+
+        # Configuration
+        self.config_snapshot_enabled = True      # Start from the local configuration snapshot, refresh from SQL
+
+        # Command polling
+        self.command_version_check = True        # Read command rows only when the command version changed
+        self.command_poll_min_interval = 0.05    # Poll interval right after a command change
+        self.command_poll_max_interval = 1.0     # Poll interval reached by backing off while idle
+
+        # Outbound publishing
+        self.publish_rate = 200.0                # Published messages per second per broker; 0 disables limiting
+        self.publish_max_in_flight = 100         # Unconfirmed published messages per broker; 0 disables limiting
+        self.parameter_cache_size = 1000         # Cached parameter sets (devices / groups); 0 disables caching
+
+        # Process model
+        self.shard_workers = 1                   # Worker processes with topics sharded across them; 1 runs in-process
+
+        # SQL client
+        self.sql_writer_workers = 4              # Writer connections; 0 uses a single shared connection
+        self.sql_connect_retry_interval = 5.0    # First retry delay when the SQL server is down at startup
+        self.sql_statement_reuse = False         # Reuse cursors / prepared statements, no commit on read-only calls
+
+        # Ingest queues
+        self.mqtt_queue_size = 1000              # Received messages buffered per MQTT connection
+        self.mqtt_overflow_policy = "drop_oldest"  # Full queue policy: block, drop_oldest, drop_newest, spill
+        self.ingest_queue_size = 1000            # Messages buffered in the shared ingest queue of all collectors
+
+        # Device timestamps
+        self.device_timestamps = False           # Insert measurements with the device timestamp (InsertMeasurementAt)
+        self.dedupe_cache_size = 100000          # Remembered (topic, device timestamp) keys of messages; 0 disables
+
+        # Compression
+        self.measurement_compression = False     # Compress series configured in SQL (GetMeasurementCompression)
+
+        # Rollups
+        self.rollup_intervals = ""               # Window lengths in seconds, e.g. "60,3600"; empty disables rollups
+        self.rollup_close_delay = 10.0           # Seconds after the window end until a window is written
+
+        # Measurement writer
+        self.measurement_batch_size = 500        # Flush when this many measurements are buffered
+        self.measurement_batch_latency = 0.5     # Flush at the latest this many seconds after first buffered value
+
+        # Measurement spool
+        self.spool_enabled = True                # Spool measurements locally when SQL is unavailable or behind
+        self.spool_backlog = 50000               # Spool new batches while more measurements wait for the writer
+        self.spool_replay_batch_size = 5000      # Spooled measurements written to SQL per replay batch
+
+        # Asyncio runtime
+        self.async_sql_executor_workers = 4      # Threads executing SQL work for the event loop
+        self.async_ingest_queue_size = 100000    # Received messages buffered before the overflow policy applies
+
+    def load(self, file_name: str = "service_configuration.csv"):
+        """
+        Override default values with the parameters listed in the configuration file.
+        """
+        path = f"{configuration_path}{file_name}"
+        if not os.path.exists(path):
+            return self
+
+        with open(path) as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                name = row["parameter"].strip()
+                if not hasattr(self, name):
+                    print(f"Unknown service configuration parameter: {name}")
+                    continue
+                setattr(self, name, self._convert(getattr(self, name), row["value"].strip()))
+        return self
+
+    @staticmethod
+    def _convert(default, value: str):
+        """
+        Convert a string value from the configuration file to the type of the default value.
+        """
+        if isinstance(default, bool):
+            return value.lower() in ("1", "true", "yes")
+        if default is None:
+            return value
+        return type(default)(value)
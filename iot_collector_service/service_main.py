@@ -0,0 +1,33 @@
+"""
+    File name: service_main.py
+    Date: 10.01.2023
+"""
+from .iot_service import IOTService
+from .async_iot_service import AsyncIOTService
+from .shard_supervisor import ShardSupervisor
+from .service_configuration import ServiceConfiguration
+import argparse
+
+def run_service(async_mode: bool = False, workers: int = None):
+    if workers is None:
+        workers = ServiceConfiguration().load().shard_workers
+
+    if workers > 1 and not async_mode:
+        service = ShardSupervisor(shard_count=workers)
+    elif async_mode:
+        service = AsyncIOTService()
+    else:
+        service = IOTService()
+    service.service_run()
+
+def main():
+    parser = argparse.ArgumentParser(prog="iot_collector_service",
+                                     description="Service for collecting measurements from IOT devices")
+    parser.add_argument("--async", dest="async_mode", action="store_true",
+                        help="run the service on the asyncio runtime")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of topic-sharded worker processes (default: shard_workers configuration)")
+    args = parser.parse_args()
+    if args.async_mode and args.workers is not None and args.workers > 1:
+        parser.error("--async can not be combined with more than one worker")
+    run_service(async_mode=args.async_mode, workers=args.workers)
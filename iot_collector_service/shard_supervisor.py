@@ -0,0 +1,165 @@
+"""
+===============================================================================
+Module: shard_supervisor.py
+Description:
+    This module implements the `ShardSupervisor` class, which runs the IoT
+    service as N worker processes to use more than one CPU core.
+
+    Topics are partitioned across workers by a stable hash (`topic_shard`).
+    Each worker is a full `IOTService` that owns the MQTT subscriptions and
+    the SQL connections of its topics. The supervisor:
+    - starts the workers and restarts any worker process that exits,
+    - polls service commands from SQL and forwards them to every worker,
+      so commands are executed once per shard and flags are reset once.
+      With leader election enabled, supervisors without the SQL lease
+      forward only start, stop and reload commands (see `leader_election.py`).
+
+    Run with:
+        $ python -m iot_collector_service --workers 4
+
+Dependencies:
+    - IOTService
+    - SQL Client (`MySqlClient`) and SQL Service (`SQLService`)
+    - LeaderLease, CommandPoller, ServiceConfiguration
+    - Logging (via `setup_logger`)
+    - Standard libraries: `multiprocessing`, `time`, `os`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from .iot_service import iIOTService, IOTService
+from .sql_client import MySqlClient
+from .sql_service import SQLService
+from .leader_election import LeaderLease
+from .command_poller import CommandPoller
+from .service_configuration import ServiceConfiguration
+from .event_logging import setup_logger
+
+from multiprocessing import Process, Queue
+import time
+import os
+
+WORKER_RESTART_DELAY = 5.0  # Minimum seconds between restarts of the same worker
+
+
+def run_shard_worker(shard_index: int, shard_count: int, command_queue: Queue):
+    """
+    Entry point of a worker process.
+    """
+    service = IOTService(shard_index=shard_index, shard_count=shard_count, command_queue=command_queue)
+    service.service_run()
+
+
+class ShardSupervisor(iIOTService):
+    """
+    Starts, monitors and forwards commands to the shard worker processes.
+    """
+    def __init__(self, shard_count: int):
+        self._create_folder_structure()
+
+        # Create datalog
+        self.logger = setup_logger("IOT Shard Supervisor Log", "iot_service_logs/log")
+
+        self.shard_count = shard_count
+        self.service_configuration = ServiceConfiguration().load()
+        self.sql_client = MySqlClient(statement_reuse=self.service_configuration.sql_statement_reuse)
+        self.sql_service = SQLService(sql_client=self.sql_client)
+
+        self.command_poller = CommandPoller(
+            sql_service=self.sql_service,
+            min_interval=self.service_configuration.command_poll_min_interval,
+            max_interval=self.service_configuration.command_poll_max_interval,
+            version_check=self.service_configuration.command_version_check,
+            broadcast_delay=self.service_configuration.command_broadcast_delay
+            if self.service_configuration.leader_election else 0.0)
+
+        self.leader_lease = None
+        if self.service_configuration.leader_election:
+            self.leader_lease = LeaderLease(
+                sql_service=self.sql_service,
+                instance_id=self.service_configuration.instance_id,
+                lease_duration=self.service_configuration.leader_lease_duration,
+                renew_interval=self.service_configuration.leader_lease_renew_interval,
+                logger=self.logger)
+
+        self._workers = [None] * shard_count
+        self._command_queues = [None] * shard_count
+        self._started = [0.0] * shard_count
+
+    def service_run(self):
+        """
+        Starts all workers and supervises them until interrupted.
+        """
+        self._connect_sql()
+        for shard_index in range(self.shard_count):
+            self._start_worker(shard_index)
+
+        try:
+            while 1:
+                self._forward_commands()
+                self._check_workers()
+                time.sleep(self.command_poller.interval)
+        except KeyboardInterrupt:
+            print('Service interrupted')
+            for worker in self._workers:
+                worker.join(timeout=10)
+                if worker.is_alive():
+                    worker.terminate()
+            if self.leader_lease is not None:
+                self.leader_lease.release()
+            self.sql_client.disconnect_sql()
+
+    def _connect_sql(self):
+        retry_interval = self.service_configuration.sql_connect_retry_interval
+        while 1:
+            try:
+                self.sql_service.connect_service()
+                self.logger.info(f"Shard supervisor connected to sql!")
+                return
+            except:
+                self.logger.info(f"Connecting to SQL failed! Retrying in {retry_interval:.0f} s")
+                time.sleep(retry_interval)
+                retry_interval = min(retry_interval * 2, 60.0)
+
+    def _start_worker(self, shard_index: int):
+        self._command_queues[shard_index] = Queue()
+        worker = Process(target=run_shard_worker,
+                         args=(shard_index, self.shard_count, self._command_queues[shard_index]),
+                         name=f"iot-shard-{shard_index}")
+        worker.start()
+        self._workers[shard_index] = worker
+        self._started[shard_index] = time.monotonic()
+        self.logger.info(f"Started shard worker {shard_index}/{self.shard_count}, pid {worker.pid}")
+
+    def _check_workers(self):
+        """
+        Restarts worker processes that exited.
+        """
+        for shard_index, worker in enumerate(self._workers):
+            if worker.is_alive():
+                continue
+            if time.monotonic() - self._started[shard_index] < WORKER_RESTART_DELAY:
+                continue
+            self.logger.error(f"Shard worker {shard_index} exited with code {worker.exitcode}, restarting")
+            self._start_worker(shard_index)
+
+    def _forward_commands(self):
+        """
+        Reads service commands from SQL, forwards them to all workers and resets their flags.
+        Without the lease only broadcast commands (start, stop, reload) are forwarded.
+        """
+        leader = self.leader_lease is None or self.leader_lease.is_leader()
+        cmds, reset_ids = self.command_poller.poll_instance(leader)
+        for cmd in cmds:
+            for command_queue in self._command_queues:
+                command_queue.put(cmd)
+        for cmd_id in reset_ids:
+            self.sql_service.reset_cmd_flag(cmd_id)
+
+    def _create_folder_structure(self):
+        """
+        Creates the log folder structure required by the service.
+        """
+        if not os.path.exists("iot_service_logs/"):
+            os.makedirs("iot_service_logs/")
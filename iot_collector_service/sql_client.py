@@ -6,14 +6,30 @@ Description:
     and a concrete implementation `MySqlClient` that uses the MySQL Connector 
     to interact with a MySQL database.
 
+    `MySqlPoolClient` is a pooled implementation: batch writes are executed
+    by N writer workers, each with its own connection, fed from a shared
+    queue, while commands and configuration reads use a separate control
+    connection, so slow reads never stall ingestion.
+
+    In statement reuse mode (`statement_reuse=True`) a client:
+    - keeps its cursors open for the lifetime of the connection,
+    - executes batch writes through a server-side prepared `CALL` statement
+      per stored procedure, so it is parsed once instead of per call,
+    - runs in autocommit mode, so read-only calls need no COMMIT round trip
+      and never keep a stale transaction snapshot; writes are wrapped in an
+      explicit transaction,
+    - returns plain tuples instead of dicts where the caller asks for them.
+
     The implementation includes:
     - Connecting and disconnecting from a MySQL database.
     - Inserting and selecting data from tables.
     - Executing stored procedures with optional input arguments.
+    - Executing a stored procedure for a batch of arguments in one transaction.
 
 Dependencies:
     - mysql-connector-python
     - Python's abc (Abstract Base Class) module
+    - threading, queue, concurrent.futures
 
 Author: [Martin P.]
 
@@ -22,10 +38,24 @@ Author: [Martin P.]
 
 
 from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from threading import Thread, Lock
+from queue import Queue
 import mysql.connector
 from mysql.connector.locales.eng import client_error
 from mysql.connector import Error
 
+def is_connection_error(error: Exception) -> bool:
+    """
+    True if error means the database could not be reached or the call could not complete
+    (connection, timeout, deadlock), False if the database rejected the statement or its data.
+    """
+    if not isinstance(error, Error):
+        return True
+    return type(error) is Error or isinstance(error, (mysql.connector.InterfaceError,
+                                                      mysql.connector.OperationalError))
+
+
 class ISqlClient(ABC):
     """
     Abstract base class that defines the interface for an SQL client.
@@ -53,17 +83,26 @@ class ISqlClient(ABC):
         pass
 
     @abstractmethod
-    def execute_stored_procedure(self, stored_procedure: str, input_args=()):
+    def execute_stored_procedure(self, stored_procedure: str, input_args=(), read_only: bool = False,
+                                 dictionary: bool = True, raise_errors: bool = False):
         """Execute a stored procedure with optional input arguments."""
         pass
 
+    @abstractmethod
+    def execute_stored_procedure_batch(self, stored_procedure: str, input_args_list: list):
+        """Execute a stored procedure for each argument tuple in a single transaction."""
+        pass
+
 class MySqlClient(ISqlClient):
     """
     Concrete implementation of ISqlClient for MySQL databases using mysql.connector.
+    With statement_reuse, cursors and prepared statements are reused across calls.
     """
 
-    def __init__(self):
+    def __init__(self, statement_reuse: bool = False):
         self.connection = None
+        self.statement_reuse = statement_reuse
+        self._cursors = {}
 
     def connect_sql(self, host: str, database: str, user: str, password: str):
         """
@@ -75,6 +114,9 @@ class MySqlClient(ISqlClient):
                                                       database=database,
                                                       user=user,
                                                       password=password)
+            self._cursors = {}
+            if self.statement_reuse:
+                self.connection.autocommit = True
             print("Connected to SQL server")
             return 1
 
@@ -87,6 +129,7 @@ class MySqlClient(ISqlClient):
         Close the MySQL database connection if it is open.
         """
         if self.connection.is_connected():
+            self._close_cursors()
             self.connection.close()
             print("MySQL connection is closed")
 
@@ -112,19 +155,218 @@ class MySqlClient(ISqlClient):
         myresult = cursor.fetchall()
         return myresult
 
-    def execute_stored_procedure(self, stored_procedure: str, input_args=()):
+    def execute_stored_procedure(self, stored_procedure: str, input_args=(), read_only: bool = False,
+                                 dictionary: bool = True, raise_errors: bool = False):
         """
         Execute the specified stored procedure with optional input arguments.
-        Returns any data returned by the procedure.
+        Returns any data returned by the procedure, as dicts or, without dictionary, as tuples.
+        Errors return an empty result, or are re-raised with raise_errors, so that callers can tell
+        a failed call from an empty result.
+        In statement reuse mode read-only calls are executed without a transaction and commit.
         """
         data = []
         try:
-            cursor = self.connection.cursor(dictionary=True)
+            cursor = self._cursor("dict" if dictionary else "tuple")
+            if self.statement_reuse and not read_only:
+                self.connection.start_transaction()
             cursor.callproc(stored_procedure, input_args)
-            self.connection.commit()
+            if not (self.statement_reuse and read_only):
+                self.connection.commit()
             for result in cursor.stored_results():
                 data = result.fetchall()
 
         except mysql.connector.Error as error:
             print(f"Failed to execute stored procedure: {error}")
+            # An open transaction would make every following write fail with "Transaction already in progress"
+            if self.connection is not None and self.connection.is_connected():
+                try:
+                    self.connection.rollback()
+                except mysql.connector.Error:
+                    pass
+            else:
+                self._reconnect()
+            if raise_errors:
+                raise
         return data
+
+    def execute_stored_procedure_batch(self, stored_procedure: str, input_args_list: list):
+        """
+        Execute the specified stored procedure once for every argument tuple using
+        executemany, and commit the whole batch as a single transaction.
+        The transaction is rolled back and the exception re-raised on failure.
+        """
+        if not input_args_list:
+            return
+        if self.connection is None:
+            raise mysql.connector.Error("Not connected to SQL server")
+
+        placeholders = ",".join(["%s"] * len(input_args_list[0]))
+        try:
+            cursor = self._cursor(f"prepared:{stored_procedure}")
+            if self.statement_reuse:
+                self.connection.start_transaction()
+        except mysql.connector.Error:
+            self._reconnect()
+            raise
+        try:
+            cursor.executemany(f"CALL {stored_procedure}({placeholders})", input_args_list)
+            self.connection.commit()
+        except mysql.connector.Error as error:
+            print(f"Failed to execute stored procedure batch: {error}")
+            if self.connection.is_connected():
+                self.connection.rollback()
+            else:
+                self._reconnect()
+            raise
+        finally:
+            if not self.statement_reuse:
+                cursor.close()
+
+    def _cursor(self, kind: str):
+        """
+        Return a cursor of the given kind ("dict", "tuple" or "prepared:<procedure>").
+        Without statement reuse a new cursor is created for every call.
+        """
+        cursor = self._cursors.get(kind)
+        if cursor is None:
+            if kind == "dict":
+                cursor = self.connection.cursor(dictionary=True)
+            elif kind.startswith("prepared:") and self.statement_reuse:
+                # One prepared cursor per procedure keeps its statement prepared on the server
+                cursor = self.connection.cursor(prepared=True)
+            else:
+                cursor = self.connection.cursor()
+            if self.statement_reuse:
+                self._cursors[kind] = cursor
+        return cursor
+
+    def _close_cursors(self):
+        for cursor in self._cursors.values():
+            try:
+                cursor.close()
+            except mysql.connector.Error:
+                pass
+        self._cursors = {}
+
+    def _reconnect(self):
+        """
+        Try once to re-establish a lost connection, so that the next call can succeed.
+        """
+        # Cursors and prepared statements do not survive the connection
+        self._cursors = {}
+        try:
+            if self.connection is not None and not self.connection.is_connected():
+                self.connection.reconnect(attempts=1, delay=0)
+                if self.statement_reuse:
+                    self.connection.autocommit = True
+                print("Reconnected to SQL server")
+        except mysql.connector.Error as error:
+            print(f"Failed to reconnect to SQL server: {error}")
+
+
+class MySqlPoolClient(ISqlClient):
+    """
+    Pooled implementation of ISqlClient for MySQL databases.
+    Batch writes are queued and executed in parallel by writer workers with their own
+    connections; all other calls go through a dedicated, lock protected control connection.
+    """
+
+    def __init__(self, writer_workers: int = 4, writer_queue_size: int = 8, statement_reuse: bool = False):
+        self.writer_workers = writer_workers
+        self.statement_reuse = statement_reuse
+        self.control_client = MySqlClient(statement_reuse=statement_reuse)
+        self.writer_clients = []
+
+        self._control_lock = Lock()
+        self._writer_queue = Queue(maxsize=writer_queue_size)
+        self._writer_threads = []
+
+    def connect_sql(self, host: str, database: str, user: str, password: str):
+        """
+        Connect the control connection and one connection per writer worker, then start the workers.
+        Returns 1 if successful, raises an exception on failure.
+        """
+        clients = [self.control_client] + [MySqlClient(statement_reuse=self.statement_reuse)
+                                           for _ in range(self.writer_workers)]
+        try:
+            for client in clients:
+                client.connect_sql(host=host, database=database, user=user, password=password)
+        except mysql.connector.Error:
+            for client in clients:
+                if client.connection is not None:
+                    client.disconnect_sql()
+            raise
+
+        self.writer_clients = clients[1:]
+        for client in self.writer_clients:
+            thread = Thread(target=self._writer_thread_fun, args=(client,))
+            thread.start()
+            self._writer_threads.append(thread)
+        return 1
+
+    def disconnect_sql(self):
+        """
+        Stop writer workers after the queued batches are written and close all connections.
+        """
+        for _ in self._writer_threads:
+            self._writer_queue.put(None)
+        for thread in self._writer_threads:
+            thread.join()
+        self._writer_threads = []
+
+        for client in self.writer_clients:
+            client.disconnect_sql()
+        self.writer_clients = []
+
+        with self._control_lock:
+            self.control_client.disconnect_sql()
+
+    def insert_sql(self, table_name: str, column_names: list, values: list):
+        """
+        Insert a new record into the specified table over the control connection.
+        """
+        with self._control_lock:
+            self.control_client.insert_sql(table_name, column_names, values)
+
+    def select_sql(self, table_name: str):
+        """
+        Fetch and return all records from the specified table over the control connection.
+        """
+        with self._control_lock:
+            return self.control_client.select_sql(table_name)
+
+    def execute_stored_procedure(self, stored_procedure: str, input_args=(), read_only: bool = False,
+                                 dictionary: bool = True, raise_errors: bool = False):
+        """
+        Execute the specified stored procedure over the control connection.
+        Returns any data returned by the procedure.
+        """
+        with self._control_lock:
+            return self.control_client.execute_stored_procedure(stored_procedure, input_args,
+                                                                read_only=read_only, dictionary=dictionary,
+                                                                raise_errors=raise_errors)
+
+    def execute_stored_procedure_batch(self, stored_procedure: str, input_args_list: list):
+        """
+        Queue the batch for the writer workers and return a Future that completes
+        when the batch is committed (or holds the exception if it failed).
+        Blocks only when all workers are busy and the writer queue is full.
+        Raises right away when the workers are not connected yet.
+        """
+        if not self._writer_threads:
+            raise mysql.connector.Error("Not connected to SQL server")
+        future = Future()
+        self._writer_queue.put((future, stored_procedure, input_args_list))
+        return future
+
+    def _writer_thread_fun(self, client: MySqlClient):
+        while 1:
+            job = self._writer_queue.get()
+            if job is None:
+                return
+            future, stored_procedure, input_args_list = job
+            try:
+                client.execute_stored_procedure_batch(stored_procedure, input_args_list)
+                future.set_result(len(input_args_list))
+            except Exception as error:
+                future.set_exception(error)
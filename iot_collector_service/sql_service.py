@@ -17,13 +17,20 @@ Usage:
     an IoT system, including:
     - Establishing SQL connections
     - Reading device and collector configurations
-    - Writing measurement data
+    - Writing measurement data, optionally with the device timestamp
+      (`InsertMeasurementAt(topic_id, measurement_type_id, value, timestamp)`,
+      timestamp in seconds since the epoch, e.g. stored with FROM_UNIXTIME)
+    - Writing spooled measurements with their original time
+      (`InsertMeasurementAt`, also without device timestamps)
+    - Writing window rollups of measurement series (`InsertMeasurementRollup`)
     - Fetching service commands
 
 Dependencies:
     - sql_client.py
     - device_configuration.py
     - collector_configuration.py
+    - configuration_snapshot.py
+    - measurement_batch.py
     - csv
     - abc (abstract base class)
 
@@ -35,6 +42,8 @@ Author: [Martin P]
 from .sql_client import ISqlClient
 from .device_configuration import DeviceConfiguration
 from .collector_configuration import CollectorConfiguration
+from .configuration_snapshot import ConfigurationSnapshot
+from .measurement_batch import Measurement, MeasurementBatch
 
 from abc import ABC, abstractmethod
 import csv
@@ -67,10 +76,40 @@ class ISQLService(ABC):
         pass
 
     @abstractmethod
-    def write_measurement_to_sql(self, measurement):
+    def read_topic_configuration(self):
+        """Read the topics of all devices from the database."""
+        pass
+
+    @abstractmethod
+    def read_service_configuration(self):
+        """Read broker, device and topic configuration from the database in one round trip."""
+        pass
+
+    @abstractmethod
+    def read_compression_configuration(self):
+        """Read the compression settings of measurement series from the database."""
+        pass
+
+    @abstractmethod
+    def write_measurement_to_sql(self, measurement: Measurement, raise_errors: bool = False):
         """Write a single measurement record to the SQL database."""
         pass
 
+    @abstractmethod
+    def write_measurements_to_sql(self, measurements: MeasurementBatch):
+        """Write a batch of measurement records to the SQL database in one transaction."""
+        pass
+
+    @abstractmethod
+    def write_spooled_measurements_to_sql(self, measurements: MeasurementBatch):
+        """Write a batch of spooled measurement records with their original time in one transaction."""
+        pass
+
+    @abstractmethod
+    def write_rollups_to_sql(self, rollups: list):
+        """Write a list of measurement rollup rows to the SQL database in one transaction."""
+        pass
+
     @abstractmethod
     def read_data_from_sql(self):
         """(Placeholder) Read measurement data from the SQL database."""
@@ -81,17 +120,55 @@ class ISQLService(ABC):
         """Read service commands from the SQL database."""
         pass
 
+    @abstractmethod
+    def read_cmd_version(self):
+        """Read the version of the service command table."""
+        pass
+
+    @abstractmethod
+    def read_parameters_from_sql(self, dev_id):
+        """Read the parameters of a device from the SQL database."""
+        pass
+
+    @abstractmethod
+    def read_parameter_version(self):
+        """Read the version of the device parameters."""
+        pass
+
+    @abstractmethod
+    def read_device_group_parameters_from_sql(self, group_id=None):
+        """Read the parameters of all devices in a device group (all devices for None)."""
+        pass
+
+    @abstractmethod
+    def reset_cmd_flag(self, cmd_id):
+        """Reset the flag of an executed service command."""
+        pass
+
+    @abstractmethod
+    def acquire_service_lease(self, lease_name: str, holder: str, lease_seconds: int):
+        """Take or renew a named lease and return the current lease row."""
+        pass
+
+    @abstractmethod
+    def release_service_lease(self, lease_name: str, holder: str):
+        """Release a named lease if it is held by holder."""
+        pass
+
 class SQLService(ISQLService):
     """
     Concrete implementation of ISQLService that uses a provided ISqlClient to
     manage database operations related to an IoT system.
     """
 
-    def __init__(self, sql_client: ISqlClient):
+    def __init__(self, sql_client: ISqlClient, device_timestamps: bool = False):
         """
         Initialize SQLService with a SQL client and load configuration.
+        With device_timestamps, measurements are inserted with the device timestamp
+        (InsertMeasurementAt) instead of the database insert time (InsertMeasurement).
         """
         self.sql_client = sql_client
+        self.device_timestamps = device_timestamps
 
         # Read configuration
         with open(f"{configuration_path}sql_configuration.csv") as f:
@@ -124,7 +201,7 @@ class SQLService(ISQLService):
         Fetch and return IoT broker configurations using stored procedure.
         """
 
-        response = self.sql_client.execute_stored_procedure("GetIotConfiguration")
+        response = self.sql_client.execute_stored_procedure("GetIotConfiguration", read_only=True)
 
         configuration = []
         for conf in response:
@@ -145,12 +222,13 @@ class SQLService(ISQLService):
         """
 
         # Read device list
-        device_list = self.sql_client.execute_stored_procedure("GetDeviceList")
+        device_list = self.sql_client.execute_stored_procedure("GetDeviceList", read_only=True)
 
         # Get topics for each device
         configuration = []
         for dev in device_list:
-            topic = self.sql_client.execute_stored_procedure("GetTopicsForDevice", (dev["device_id"],))
+            topic = self.sql_client.execute_stored_procedure("GetTopicsForDevice", (dev["device_id"],),
+                                                             read_only=True)
             dev_configuration = DeviceConfiguration(
                 device_name=dev["device_name"],
                 device_id=dev["device_id"],
@@ -164,15 +242,67 @@ class SQLService(ISQLService):
         Fetch and return a list of topics from the database.
         """
         # Read device list
-        topic_list = self.sql_client.execute_stored_procedure("GetTopics")
+        topic_list = self.sql_client.execute_stored_procedure("GetTopics", read_only=True)
         return topic_list
 
-    def write_measurement_to_sql(self, measurement):
+    def read_service_configuration(self):
+        """
+        Fetch broker, device and topic configuration with a single stored procedure call
+        and return it as a ConfigurationSnapshot.
+        """
+        rows = self.sql_client.execute_stored_procedure("GetServiceConfiguration", read_only=True)
+        return ConfigurationSnapshot(rows)
+
+    def read_compression_configuration(self):
+        """
+        Fetch the compression settings of compressed measurement series. Raises when the read fails.
+        """
+        return self.sql_client.execute_stored_procedure("GetMeasurementCompression", read_only=True,
+                                                        raise_errors=True)
+
+    def write_measurement_to_sql(self, measurement: Measurement, raise_errors: bool = False):
         """
         Insert a measurement into the SQL database using a stored procedure.
+        With raise_errors a failed insert raises instead of being only printed.
+        """
+        if self.device_timestamps:
+            m = (measurement.topic_id, measurement.measurement_type_id, measurement.value, measurement.timestamp)
+            self.sql_client.execute_stored_procedure("InsertMeasurementAt", m, dictionary=False,
+                                                     raise_errors=raise_errors)
+        else:
+            m = (measurement.topic_id, measurement.measurement_type_id, measurement.value)
+            self.sql_client.execute_stored_procedure("InsertMeasurement", m, dictionary=False,
+                                                     raise_errors=raise_errors)
+
+    def write_measurements_to_sql(self, measurements: MeasurementBatch):
+        """
+        Insert a batch of measurements into the SQL database in a single transaction.
+        Returns whatever the SQL client returns (a Future for pooled clients).
+        """
+        if self.device_timestamps:
+            m = list(measurements.rows("topic_id", "measurement_type_id", "value", "timestamp"))
+            return self.sql_client.execute_stored_procedure_batch("InsertMeasurementAt", m)
+        m = list(measurements.rows("topic_id", "measurement_type_id", "value"))
+        return self.sql_client.execute_stored_procedure_batch("InsertMeasurement", m)
+
+    def write_spooled_measurements_to_sql(self, measurements: MeasurementBatch):
+        """
+        Insert a batch of spooled measurements in a single transaction, always with an explicit time:
+        the device timestamp with device_timestamps, else the time the service received them.
+        Written late, they would otherwise be stored with the time of the replay.
+        Returns whatever the SQL client returns (a Future for pooled clients).
+        """
+        time_column = "timestamp" if self.device_timestamps else "received"
+        m = list(measurements.rows("topic_id", "measurement_type_id", "value", time_column))
+        return self.sql_client.execute_stored_procedure_batch("InsertMeasurementAt", m)
+
+    def write_rollups_to_sql(self, rollups: list):
+        """
+        Insert (interval, window_start, topic_id, measurement_type_id, count, min, max, mean) rollup rows
+        in a single transaction. The stored procedure merges rows of windows that are already stored.
+        Returns whatever the SQL client returns (a Future for pooled clients).
         """
-        m = (measurement["topic_id"], measurement["measurement_type_id"], float(measurement["value"]))
-        self.sql_client.execute_stored_procedure("InsertMeasurement", m)
+        return self.sql_client.execute_stored_procedure_batch("InsertMeasurementRollup", rollups)
 
     def read_data_from_sql(self):
         """
@@ -183,19 +313,57 @@ class SQLService(ISQLService):
     def read_cmd_from_sql(self):
         """
         Fetch and return service commands using a stored procedure.
+        Raises on failure, so that a failed read is not mistaken for no commands.
         """
-        cmds = self.sql_client.execute_stored_procedure("GetServiceCommands")
+        cmds = self.sql_client.execute_stored_procedure("GetServiceCommands", read_only=True, raise_errors=True)
         return cmds
 
+    def read_cmd_version(self):
+        """
+        Fetch the version of the service command table, bumped by the database on every command change.
+        """
+        response = self.sql_client.execute_stored_procedure("GetServiceCommandVersion", read_only=True)
+        return response[0]["version"] if response else None
+
     def read_parameters_from_sql(self, dev_id):
         """
         Fetch parameters for a specific device ID using a stored procedure.
+        Raises on failure, so that a failed read is not mistaken for a device without parameters.
+        """
+        parameters = self.sql_client.execute_stored_procedure("GetParametersForDevice", (dev_id,), read_only=True,
+                                                             raise_errors=True)
+        return parameters
+
+    def read_parameter_version(self):
+        """
+        Fetch the version of the device parameters, bumped by the database on every parameter change.
         """
-        parameters = self.sql_client.execute_stored_procedure("GetParametersForDevice", (dev_id,))
+        response = self.sql_client.execute_stored_procedure("GetParameterVersion", read_only=True)
+        return response[0]["version"] if response else None
+
+    def read_device_group_parameters_from_sql(self, group_id=None):
+        """
+        Fetch parameters of all devices in a device group (all devices for None) using a stored procedure.
+        Raises on failure, so that a failed read is not mistaken for a group without parameters.
+        """
+        parameters = self.sql_client.execute_stored_procedure("GetParametersForDeviceGroup", (group_id,),
+                                                             read_only=True, raise_errors=True)
         return parameters
 
     def reset_cmd_flag(self, cmd_id):
         """
         Reset the command flag for a given command ID using a stored procedure.
         """
-        self.sql_client.execute_stored_procedure("ResetCmdFlagForDevice", (cmd_id,))
+        self.sql_client.execute_stored_procedure("ResetCmdFlagForDevice", (cmd_id,), dictionary=False)
+
+    def acquire_service_lease(self, lease_name: str, holder: str, lease_seconds: int):
+        """
+        Take or renew a named lease for holder and return the current lease row (holder, expires).
+        """
+        return self.sql_client.execute_stored_procedure("AcquireServiceLease", (lease_name, holder, lease_seconds))
+
+    def release_service_lease(self, lease_name: str, holder: str):
+        """
+        Release a named lease if it is held by holder.
+        """
+        self.sql_client.execute_stored_procedure("ReleaseServiceLease", (lease_name, holder), dictionary=False)
@@ -0,0 +1,65 @@
+"""
+===============================================================================
+Module: topic_router.py
+Description:
+    This module implements the `TopicRouter` class, a prebuilt routing index
+    that maps an MQTT topic string to the device and topic it belongs to.
+
+    The measurement hot path in `IOTService` performs one dictionary lookup
+    per incoming message instead of scanning the whole topic configuration.
+    The index is rebuilt off to the side and swapped in with a single
+    reference assignment, so readers never observe a half-built table.
+
+    `topic_shard` assigns topics to shards by a stable hash, so every
+    process of a sharded service agrees on who owns a topic.
+
+Dependencies:
+    - Standard libraries: `collections`, `zlib`
+
+Author: [Martin P]
+===============================================================================
+"""
+
+from collections import namedtuple
+import zlib
+
+TopicRoute = namedtuple("TopicRoute", ["device_id", "topic_id", "topic_type"])
+
+
+def topic_shard(topic: str, shard_count: int) -> int:
+    """
+    Return the shard index (0 .. shard_count - 1) owning the topic.
+    Uses CRC32, which unlike hash() is stable across processes and restarts.
+    """
+    return zlib.crc32(topic.encode()) % shard_count
+
+
+class TopicRouter:
+    """
+    Hash-indexed lookup table: topic string -> TopicRoute.
+    """
+
+    def __init__(self, topic_configuration=None):
+        self._routes = {}
+        if topic_configuration is not None:
+            self.rebuild(topic_configuration)
+
+    def rebuild(self, topic_configuration: list):
+        """
+        Build a new routing index from topic configuration rows and swap it in atomically.
+        """
+        routes = {}
+        for topic in topic_configuration:
+            routes[topic["topic"]] = TopicRoute(device_id=topic["device_id"],
+                                                topic_id=topic["topic_id"],
+                                                topic_type=topic["topic_type"])
+        self._routes = routes
+
+    def get_route(self, topic: str):
+        """
+        Return the TopicRoute for the given topic, or None if the topic is not configured.
+        """
+        return self._routes.get(topic)
+
+    def __len__(self):
+        return len(self._routes)
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from iot_collector_service import mqtt_client
-from time import sleep
+from iot_collector_service.payload_codecs import create_codec
+from time import sleep, time
 import json
 from threading import Thread
 import random
@@ -8,7 +9,8 @@ import random
 
 class SimDeviceConfiguration:
     def __init__(self, broker_usr: str, broker_password: str, broker_ip: str, broker_port: int, publish_topic: str,
-                 subscribe_topic: str, publish_interval: float, device_measurements: list):
+                 subscribe_topic: str, publish_interval: float, device_measurements: list,
+                 payload_format: str = "json", payload_layout: str = ""):
 
         self.measurements = device_measurements
         self.configuration = {
@@ -20,7 +22,9 @@ class SimDeviceConfiguration:
             },
             "data_publish_topic": publish_topic,
             "data_subscribe_topic": subscribe_topic,
-            "publish_interval": publish_interval
+            "publish_interval": publish_interval,
+            "payload_format": payload_format,
+            "payload_layout": payload_layout
         }
 
 
@@ -51,6 +55,10 @@ class SimDevice(ISimDevice):
 
         self.publish_interval = self.sim_device_configuration.configuration["publish_interval"]
 
+        # Payload codec used for published measurements (json, msgpack, cbor, struct)
+        self.codec = create_codec(self.sim_device_configuration.configuration["payload_format"],
+                                  self.sim_device_configuration.configuration["payload_layout"])
+
         if status == 1:
             print(f"Device connected to the broker {self.sim_device_configuration.configuration['broker']['usr']}")
         else:
@@ -81,9 +89,10 @@ class SimDevice(ISimDevice):
                 else:
                     value = random.randint(int(mindex["min_value"]), int(mindex["max_value"]))
                 data[mindex["measurement_type"]] = value
+            data["timestamp"] = time()
 
             print(data)
-            mqtt_msg = json.dumps(data)
+            mqtt_msg = self.codec.encode(data)
             self.mqtt_client.mqtt_publish_data(topic=self.sim_device_configuration.configuration["data_publish_topic"],
                                                data=mqtt_msg)
             sleep(self.publish_interval)
@@ -31,7 +31,9 @@ if __name__ == '__main__':
                                               subscribe_topic=conf["subscribe_topic"],
                                               publish_topic=conf["publish_topic"],
                                               publish_interval=float(conf["publish_interval"]),
-                                              device_measurements=measurements)
+                                              device_measurements=measurements,
+                                              payload_format=conf.get("payload_format") or "json",
+                                              payload_layout=conf.get("payload_layout") or "")
 
         sim_dev = SimDevice(client=MqttClientPaho(),
                             device_configuration=sim_dev_conf)